@@ -3,22 +3,28 @@
 # --------------------------------------------------------
 # The classes will generates bunches for pyORBIT SNS linac
 # at the entrance of SNS MEBT accelerator line (by default)
-# It is parallel, but it is not efficient.
+# Each rank samples its own particles in NumPy blocks.
 # --------------------------------------------------------
 
 import math
 import sys
 import os
-import random
+from functools import partial
 
-from orbit.core.orbit_mpi import mpi_comm, mpi_datatype, mpi_op, MPI_Comm_rank, MPI_Comm_size, MPI_Bcast
+from orbit.core.orbit_mpi import mpi_comm, mpi_op, MPI_Comm_rank, MPI_Comm_size
 
 from orbit.bunch_generators import TwissContainer
-from orbit.bunch_generators import KVDist3D, GaussDist3D, WaterBagDist3D
 from orbit.bunch_generators import TwissAnalysis
 
 from orbit.core.bunch import Bunch
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../.."))
+from tools.pyorbit.bunch_gen import add_coords
+from tools.pyorbit.bunch_gen import gen_bunch_coords
+from tools.pyorbit.bunch_gen import sample_gauss_3d
+from tools.pyorbit.bunch_gen import sample_kv_3d
+from tools.pyorbit.bunch_gen import sample_waterbag_3d
+
 
 class SNS_Linac_BunchGenerator:
     """
@@ -30,6 +36,7 @@ class SNS_Linac_BunchGenerator:
 
     def __init__(self, twissX : tuple, twissY : tuple, twissZ : tuple, frequency : float = 402.5e6) -> None:
         self.twiss = (TwissContainer(*twissX), TwissContainer(*twissY), TwissContainer(*twissZ))
+        self.twiss_params = (tuple(twissX), tuple(twissY), tuple(twissZ))
         self.bunch_frequency = frequency
         self.bunch = Bunch()
         syncPart = self.bunch.getSyncParticle()
@@ -75,32 +82,31 @@ class SNS_Linac_BunchGenerator:
         """
         self.beam_current = current
 
-    def getBunch(self, nParticles=0, distribution="waterbag", cut_off=-1.0):
+    def getBunch(self, nParticles=0, distribution="waterbag", cut_off=-1.0, seed=12345, block_size=100_000):
         """
         Returns the pyORBIT bunch with particular number of particles.
+        Each rank samples its share of the particles from an independent
+        random stream spawned from `seed`, so the same seed and number of
+        ranks give the same bunch.
         """
         comm = mpi_comm.MPI_COMM_WORLD
         rank = MPI_Comm_rank(comm)
         size = MPI_Comm_size(comm)
-        data_type = mpi_datatype.MPI_DOUBLE
-        main_rank = 0
         bunch = Bunch()
         self.bunch.copyEmptyBunchTo(bunch)
         macrosize = self.beam_current * 1.0e-3 / self.bunch_frequency
         macrosize /= math.fabs(bunch.charge()) * self.si_e_charge
-        distributor = None
+        (twiss_x, twiss_y, twiss_z) = self.twiss_params
+        sample = None
         if distribution == "waterbag":
-            distributor = WaterBagDist3D(self.twiss[0], self.twiss[1], self.twiss[2])
+            sample = partial(sample_waterbag_3d, twiss_x=twiss_x, twiss_y=twiss_y, twiss_z=twiss_z)
         elif distribution == "gaussian":
-            distributor = GaussDist3D(self.twiss[0], self.twiss[1], self.twiss[2], cut_off)
+            sample = partial(sample_gauss_3d, twiss_x=twiss_x, twiss_y=twiss_y, twiss_z=twiss_z, cut_off=cut_off)
         elif distribution == "kv":
-            distributor = KVDist3D(self.twiss[0], self.twiss[1], self.twiss[2])
+            sample = partial(sample_kv_3d, twiss_x=twiss_x, twiss_y=twiss_y, twiss_z=twiss_z)
         bunch.getSyncParticle().time(0.0)
-        for i in range(nParticles):
-            (x, xp, y, yp, z, dE) = distributor.getCoordinates()
-            (x, xp, y, yp, z, dE) = MPI_Bcast((x, xp, y, yp, z, dE), data_type, main_rank, comm)
-            if i % size == rank:
-                bunch.addParticle(x, xp, y, yp, z, dE)
+        for coords in gen_bunch_coords(sample, nParticles, seed, rank, size, block_size):
+            add_coords(bunch, coords)
         nParticlesGlobal = bunch.getSizeGlobal()
         bunch.macroSize(macrosize / nParticlesGlobal)
         return bunch
@@ -1,50 +1,46 @@
-import pandas as pd
+import os
+import sys
+
 import numpy as np
 
-def pyorbit_to_impactx(filename : str,ekin: float = 2.5,mass: float = 939.294 ) -> dict:
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../.."))
+from tools.pyorbit.bunch_io import count_dat_rows
+from tools.pyorbit.bunch_io import iter_dat_chunks
+from tools.pyorbit.bunch_io import read_dat_header
+from tools.pyorbit.bunch_utils import pyorbit_to_impactx as convert
+
+
+def pyorbit_to_impactx(filename : str, ekin: float = None, mass: float = None, chunk_size: int = 1_000_000) -> dict:
     """
     units_in  = ['m','rad','m','rad','m','GeV'] # units for pyorbit
     units_out  = ['m','unitless momentum','m','unitless momentum','m','unitless momentum']
         
     ekin = kinetic energy in MeV
     mass = rest mass in MeV/c^2
-    (these arguments use for unit normalization)
+    (these arguments use for unit normalization; by default they are read
+    from the dumpBunch header)
+
+    The file is parsed and converted in blocks of `chunk_size` particles.
+    The returned arrays are column views of a single (n, 6) buffer.
     """
-    names=['x','xp','y','yp','z','de','id','phi']
-    skiprows = 15
-    
-
-    gamma0 = (mass + ekin)/mass
-    beta0 = np.sqrt(gamma0*gamma0 - 1.0)/gamma0
-    
-    thisbunch=pd.read_csv(filename, names=names,\
-                              delimiter='\s+',
-                              index_col=None,\
-                              skiprows=skiprows)      
-    
-    
-    # -- GeV to MeV
-    thisbunch.loc[:,'de'] *= 1e3 # 
-    
-    print("N particles in bunch: %i"%(len(thisbunch)))
-
-    # to impactx spatial units
-    dx = thisbunch['x'].values # meters
-    dy = thisbunch['y'].values # meters
-    dt = thisbunch['z'].values / beta0 # time of flight, ct
-    
-    # unitless momenta
-    dgamma = thisbunch['de'].values / mass
-    gamma = gamma0 + dgamma
-    dbetaz = 1/4*gamma0**(-3/2)*beta0**-1 * dgamma
-    
-    betax = beta0*thisbunch['xp'].values
-    gammax = 1/np.sqrt(1-betax**2) # basically 1
-    betay = beta0*thisbunch['yp'].values
-    gammay = 1/np.sqrt(1-betay**2) # basically 1
-    dpx = (betax*gammax)/(beta0*gamma0)
-    dpy = (betay*gammay)/(beta0*gamma0)
-    dpt = (dgamma)/(beta0*gamma0)
-
-    bunch = {'x':dx,'y':dy,'t':dt,'px':dpx,'py':dpy,'pt':dpt}
-    return bunch
\ No newline at end of file
+    attrs = read_dat_header(filename)
+    if mass is None:
+        mass = attrs["mass"] * 1e3
+    if ekin is None:
+        ekin = attrs["sync_kin_energy"] * 1e3
+
+    size = count_dat_rows(filename)
+    print("N particles in bunch: %i"%(size))
+
+    # -- MeV to GeV, the units of dE in the file
+    coords = np.zeros((size, 6))
+    start = 0
+    for chunk in iter_dat_chunks(filename, chunk_size):
+        stop = start + chunk.shape[0]
+        convert(chunk, kin_energy=ekin*1e-3, mass=mass*1e-3, out=coords[start:stop])
+        start = stop
+
+    bunch = {}
+    for i, key in enumerate(['x','px','y','py','t','pt']):
+        bunch[key] = coords[:, i]
+    return bunch
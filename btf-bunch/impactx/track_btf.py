@@ -4,12 +4,16 @@ import amrex.space3d as amr
 
 import numpy as np
 import os
+import sys
 import time
 
 import magnet_utilities
 import lattice_utilities
 import bunch_utilities
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../.."))
+from tools.impactx.bunch_utils import add_particles
+
 
 ###########
 # constants
@@ -86,29 +90,8 @@ bunch = bunch_utilities.pyorbit_to_impactx(bunch_file)
 pc = sim.particle_container()
 
 # no gpu option for placing particles on mesh
-dx_podv = amr.PODVector_real_std()
-dy_podv = amr.PODVector_real_std()
-dt_podv = amr.PODVector_real_std()
-dpx_podv = amr.PODVector_real_std()
-dpy_podv = amr.PODVector_real_std()
-dpt_podv = amr.PODVector_real_std()
-
-# place particles
-for p_dx in bunch['x']:
-    dx_podv.push_back(p_dx)
-for p_dy in bunch['y']:
-    dy_podv.push_back(p_dy)
-for p_dt in bunch['t']:
-    dt_podv.push_back(p_dt)
-for p_dpx in bunch['px']:
-    dpx_podv.push_back(p_dpx)
-for p_dpy in bunch['py']:
-    dpy_podv.push_back(p_dpy)
-for p_dpt in bunch['pt']:
-    dpt_podv.push_back(p_dpt)
-
-pc.add_n_particles(
-    dx_podv, dy_podv, dt_podv, dpx_podv, dpy_podv, dpt_podv, qm_eev, bunch_charge_C
+add_particles(
+    pc, bunch['x'], bunch['y'], bunch['t'], bunch['px'], bunch['py'], bunch['pt'], qm_eev, bunch_charge_C
 )
 
 
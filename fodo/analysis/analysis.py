@@ -1,258 +1,361 @@
+"""Compare PyORBIT and ImpactX FODO runs.
+
+Each figure is an independent task run on a process pool (see tools/pipeline.py).
+The final snapshots are loaded once and shared with the workers through shared
+memory; plotting libraries are only imported by the tasks that plot.
+
+Usage: python analysis.py [--nprocs N]
+"""
+import argparse
 import os
-import h5py
+import sys
+
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import scipy.ndimage
-import ultraplot as uplt
-from omegaconf import DictConfig
 from omegaconf import OmegaConf
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../.."))
+from tools.compare import compare_histories
+from tools.compare import format_table
+from tools.compare import load_impactx_history
+from tools.compare import load_pyorbit_history
+from tools.compare import unwrap_s
+from tools.hist import cached_projections
+from tools.hist import get_all_axes
+from tools.hist import get_edges
+from tools.pipeline import SharedArrays
+from tools.pipeline import Task
+from tools.pipeline import run_tasks
+from tools.pyorbit.history_io import find_history
+from tools.pyorbit.history_io import load_history
 
-uplt.rc["axes.linewidth"] = 1.25
-uplt.rc["cmap.discrete"] = False
-uplt.rc["cmap.sequential"] = "viridis"
-uplt.rc["figure.facecolor"] = "white"
-uplt.rc["grid"] = False
-uplt.rc["savefig.dpi"] = 300.0
 
+DIMS = ["x", "px", "y", "py", "t", "pt"]
+LABELS = DIMS
+BINS = 85
+AXES = get_all_axes(6)
+
+
+def setup_plotting():
+    import ultraplot as uplt
+
+    uplt.rc["axes.linewidth"] = 1.25
+    uplt.rc["cmap.discrete"] = False
+    uplt.rc["cmap.sequential"] = "viridis"
+    uplt.rc["figure.facecolor"] = "white"
+    uplt.rc["grid"] = False
+    uplt.rc["savefig.dpi"] = 300.0
+    return uplt
 
-# Setup
-# --------------------------------------------------------------------------------------
 
-output_dir = "outputs"
-os.makedirs(output_dir, exist_ok=True)
+def save_figure(filename: str) -> None:
+    import matplotlib.pyplot as plt
 
-cfg = OmegaConf.load("../config.yaml")
-print(cfg)
+    print(filename)
+    plt.savefig(filename)
 
 
-# Scalar history
+# Data
 # --------------------------------------------------------------------------------------
 
-# Collect data
-histories = {}
-
-history = pd.read_csv("../pyorbit/outputs/history.csv")
-histories["pyorbit"] = history.copy()
-
-history_ref = pd.read_csv("../impactx/diags/ref_particle.0.0", delimiter=" ")
-history_rms = pd.read_csv("../impactx/diags/reduced_beam_characteristics.0.0", delimiter=" ")
-history_rms["sig_z"] = history_rms["sig_t"] * history_ref["beta"]
-history_rms["emittance_z"] = history_rms["emittance_t"]
-histories["impactx"] = history_rms.copy()
-
-# Plot rms size vs. distance
-fig, axs = uplt.subplots(ncols=3, figheight=1.75)
-for ax, key in zip(axs, ["sig_x", "sig_y", "sig_z"]):
-    ax.plot(
-        histories["pyorbit"]["s"],
-        histories["pyorbit"][key] * 1000.0,
-        label="impactx",
-        color="blacK",
-        lw=2.0,
-    )
-    ax.plot(
-        histories["impactx"]["s"], histories["impactx"][key] * 1000.0, label="pyorbit", color="red"
-    )
-axs.format(xlabel="Distance [m]", ylabel="[mm]")
-axs[0].set_title(r"$\sqrt{\langle xx \rangle}$", fontsize="medium")
-axs[1].set_title(r"$\sqrt{\langle yy \rangle}$", fontsize="medium")
-axs[2].set_title(r"$\sqrt{\langle zz \rangle}$", fontsize="medium")
-axs[2].legend(fontsize="medium", ncols=1, loc="right", framealpha=0.0)
-
-filename = "fig_rms_sizes.png"
-filename = os.path.join(output_dir, filename)
-print(filename)
-plt.savefig(filename)
-
-
-# Plot rms emittance vs. distance
-fig, axs = uplt.subplots(ncols=2, figheight=1.75)
-for ax, key in zip(axs, ["emittance_x", "emittance_y"]):
-    ax.plot(
-        histories["pyorbit"]["s"],
-        histories["pyorbit"][key] * 1.0e06,
-        label="impactx",
-        color="blacK",
-        lw=2.0,
-    )
-    ax.plot(
-        histories["impactx"]["s"], histories["impactx"][key] * 1.0e06, label="pyorbit", color="red"
-    )
-axs.format(xlabel="Distance [m]", ylabel="[mm mrad]")
-axs[0].set_title(r"$\varepsilon_x$", fontsize="medium")
-axs[1].set_title(r"$\varepsilon_y$", fontsize="medium")
-axs[1].legend(fontsize="medium", ncols=1, loc="right", framealpha=0.0)
+# Coordinates are in ImpactX units x 1000.
 
-filename = "fig_rms_emittances.png"
-filename = os.path.join(output_dir, filename)
-print(filename)
-plt.savefig(filename)
 
+def load_pyorbit(filename: str, kin_energy: float, mass: float) -> np.ndarray:
+    from tools.pyorbit.bunch_io import load_bunch_coords
+    from tools.pyorbit.bunch_utils import pyorbit_to_impactx
 
-# Phase space distribution
-# --------------------------------------------------------------------------------------
+    x = load_bunch_coords(filename)
+    x = pyorbit_to_impactx(x, kin_energy=kin_energy, mass=mass)
+    return x * 1000.0
 
 
-def pyorbit_to_impactx(bunch: np.ndarray, kin_energy: float, mass: float) -> np.ndarray:
-    """Convert PyORBIT to ImpactX phase space coordinates.
+def load_impactx(filename: str, step: int) -> np.ndarray:
+    import h5py
+    from tools.impactx.monitor_io import read_monitor_step
 
-    Args:
-        kin_energy: kinetic energy [MeV]
-        mass: rest mass in [MeV / c^2]
-    """
-    gamma0 = (mass + kin_energy) / mass
-    beta0 = np.sqrt(gamma0**2 - 1.0) / gamma0
+    with h5py.File(filename, "r") as file:
+        return read_monitor_step(file, step) * 1000.0
 
-    # GeV to MeV
-    bunch[:, 5] *= 1.00e03
 
-    # x -> x
-    # y -> y
-    # z -> ct
-    dx = bunch[:, 0]
-    dy = bunch[:, 2]
-    dt = bunch[:, 4] / beta0
+def load_snapshot(snapshot: dict) -> np.ndarray:
+    if snapshot["code"] == "pyorbit":
+        return load_pyorbit(snapshot["filename"], **snapshot["params"])
+    return load_impactx(snapshot["filename"], **snapshot["params"])
 
-    # Unitless momentum
-    dgamma = bunch[:, 5] / mass
-    gamma = gamma0 + dgamma
 
-    betax = beta0 * bunch[:, 1]
-    betay = beta0 * bunch[:, 3]
-    gammax = 1.0 / np.sqrt(1.0 - betax**2)  # basically 1
-    gammay = 1.0 / np.sqrt(1.0 - betay**2)  # basically 1
-    dpx = (betax * gammax) / (beta0 * gamma0)
-    dpy = (betay * gammay) / (beta0 * gamma0)
-    dpt = (dgamma) / (beta0 * gamma0)
+# Tasks
+# --------------------------------------------------------------------------------------
 
-    return np.stack([dx, dpx, dy, dpy, dt, dpt], axis=-1)
 
+def compute_histograms(arrays: dict, snapshot: dict, limits: list) -> dict:
+    """Return cached projections of a snapshot (shared array if loaded, else file)."""
 
-particles = {}
-particles["pyorbit"] = []
-particles["impactx"] = []
+    def load() -> np.ndarray:
+        if snapshot["name"] in arrays:
+            return arrays[snapshot["name"]]
+        return load_snapshot(snapshot)
 
+    return cached_projections(snapshot["filename"], load, AXES, BINS, limits, snapshot["params"], nthreads=1)
 
-# Load PyORBIT
-filenames = [
-    "../pyorbit/outputs/bunch_00.dat",
-    "../pyorbit/outputs/bunch_01.dat",
-]
-for filename in filenames:
-    x = np.loadtxt(filename, usecols=range(6), comments="%")
-    x = pyorbit_to_impactx(
-        x, kin_energy=(cfg.bunch.kin_energy * 1000.0), mass=(cfg.bunch.mass * 1000.0)
-    )
-    particles["pyorbit"].append(x.copy())
-
-
-# Load ImpactX
-file = h5py.File("../impactx/diags/openPMD/monitor.h5", "r")
-data = file["data"]
-step_keys = list(data.keys())  # strings representing step number []"1", "102", ...]
-
-for step_key in step_keys:
-    x = [
-        data[step_key]["particles"]["beam"]["position"]["x"],
-        data[step_key]["particles"]["beam"]["momentum"]["x"],
-        data[step_key]["particles"]["beam"]["position"]["y"],
-        data[step_key]["particles"]["beam"]["momentum"]["y"],
-        data[step_key]["particles"]["beam"]["position"]["t"],
-        data[step_key]["particles"]["beam"]["momentum"]["t"],
-    ]
-    x = np.stack(x, axis=-1)
-    particles["impactx"].append(x.copy())
-
-
-# Plot 2D projections (x-px, y-py, t-pt)
-bins = 85
-
-xmax = np.std(particles["pyorbit"][-1], axis=0) * 5.0 * 1000.0
-limits = list(zip(-xmax, xmax))
-
-dims = ["x", "px", "y", "py", "t", "pt"]
-labels = dims
-
-for axis in [(0, 1), (2, 3), (4, 5)]:
-    for log in [False, True]:
-        fig, axs = uplt.subplots(ncols=2, nrows=2, figheight=4.0)
-        for j, key in enumerate(["pyorbit", "impactx"]):
-            for i, x in enumerate(particles[key]):
-                ax = axs[i, j]
-                values, edges = np.histogramdd(
-                    x[:, axis] * 1000.0, bins=bins, range=[limits[k] for k in axis]
-                )
-                values = values / np.max(values)
-
-                vmax = 1.0
-                vmin = 0.0
-                if log:
-                    values = np.log10(values + 1.00e-12)
-                    vmax = 0.0
-                    vmin = -4.0
-
-                ax.pcolormesh(
-                    edges[0],
-                    edges[1],
-                    values.T,
-                    cmap="plasma",
-                    vmax=vmax,
-                    vmin=vmin,
-                    N=14,
-                    colorbar=(j == 1),
-                    # colorbar_kw=dict(width=1.0),
-                )
 
-        axs.format(
-            xlabel=labels[axis[0]],
-            ylabel=labels[axis[1]],
-            toplabels=["PyORBIT", "ImpactX"],
-            leftlabels=["IN", "OUT"],
+def compute_distances(arrays: dict, nsamp: int, seed: int, output_dir: str) -> dict:
+    """Compute distances between the final snapshots (ImpactX is the reference)."""
+    from tools.metrics import compare_distributions
+
+    metrics = compare_distributions(
+        arrays["pyorbit_final"], arrays["impactx_final"], dims=DIMS, nsamp=nsamp, seed=seed
+    )
+    for key in ["histograms", "moments"]:
+        metrics[key].to_csv(os.path.join(output_dir, f"distances_{key}.csv"))
+    pd.Series(metrics["summary"]).to_csv(os.path.join(output_dir, "distances_summary.csv"))
+    return metrics["summary"]
+
+
+def plot_rms_sizes(arrays: dict, histories: dict, output_dir: str) -> None:
+    uplt = setup_plotting()
+
+    fig, axs = uplt.subplots(ncols=3, figheight=1.75)
+    for ax, key in zip(axs, ["sig_x", "sig_y", "sig_z"]):
+        ax.plot(
+            histories["pyorbit"]["s"],
+            histories["pyorbit"][key] * 1000.0,
+            label="impactx",
+            color="blacK",
+            lw=2.0,
+        )
+        ax.plot(
+            histories["impactx"]["s"], histories["impactx"][key] * 1000.0, label="pyorbit", color="red"
+        )
+    axs.format(xlabel="Distance [m]", ylabel="[mm]")
+    axs[0].set_title(r"$\sqrt{\langle xx \rangle}$", fontsize="medium")
+    axs[1].set_title(r"$\sqrt{\langle yy \rangle}$", fontsize="medium")
+    axs[2].set_title(r"$\sqrt{\langle zz \rangle}$", fontsize="medium")
+    axs[2].legend(fontsize="medium", ncols=1, loc="right", framealpha=0.0)
+
+    save_figure(os.path.join(output_dir, "fig_rms_sizes.png"))
+
+
+def plot_rms_emittances(arrays: dict, histories: dict, output_dir: str) -> None:
+    uplt = setup_plotting()
+
+    fig, axs = uplt.subplots(ncols=2, figheight=1.75)
+    for ax, key in zip(axs, ["emittance_x", "emittance_y"]):
+        ax.plot(
+            histories["pyorbit"]["s"],
+            histories["pyorbit"][key] * 1.0e06,
+            label="impactx",
+            color="blacK",
+            lw=2.0,
+        )
+        ax.plot(
+            histories["impactx"]["s"], histories["impactx"][key] * 1.0e06, label="pyorbit", color="red"
         )
+    axs.format(xlabel="Distance [m]", ylabel="[mm mrad]")
+    axs[0].set_title(r"$\varepsilon_x$", fontsize="medium")
+    axs[1].set_title(r"$\varepsilon_y$", fontsize="medium")
+    axs[1].legend(fontsize="medium", ncols=1, loc="right", framealpha=0.0)
+
+    save_figure(os.path.join(output_dir, "fig_rms_emittances.png"))
+
+
+def plot_halo(arrays: dict, history: pd.DataFrame, output_dir: str) -> None:
+    """Plot PyORBIT halo diagnostics (pyorbit/outputs/halo.csv) vs. distance."""
+    uplt = setup_plotting()
+
+    fig, axs = uplt.subplots(ncols=3, figheight=1.75, share=False)
+    for plane, color in zip(["x", "y"], ["black", "red"]):
+        axs[0].plot(history["s"], history[f"halo_{plane}"], label=plane, color=color)
+        axs[1].plot(history["s"], history[f"emittance_999_{plane}"] * 1.0e06, label=plane, color=color)
+        axs[2].plot(history["s"], history[f"amp_max_{plane}"], label=plane, color=color)
+    axs.format(xlabel="Distance [m]")
+    axs[0].format(ylabel="H")
+    axs[1].format(ylabel="[mm mrad]")
+    axs[2].format(ylabel=r"max $\sqrt{J / \varepsilon}$")
+    axs[0].set_title("Halo parameter", fontsize="medium")
+    axs[1].set_title(r"$\varepsilon_{99.9\%}$", fontsize="medium")
+    axs[2].set_title("Max amplitude", fontsize="medium")
+    axs[2].legend(fontsize="medium", ncols=1, loc="right", framealpha=0.0)
+
+    save_figure(os.path.join(output_dir, "fig_halo.png"))
+
+
+def plot_projection(arrays: dict, hists: dict, edges: list, axis: tuple, log: bool, output_dir: str) -> None:
+    """Plot a 2D projection of the first and last snapshot of both codes."""
+    uplt = setup_plotting()
+
+    fig, axs = uplt.subplots(ncols=2, nrows=2, figheight=4.0)
+    for j, key in enumerate(["pyorbit", "impactx"]):
+        for i, hist in enumerate(hists[key]):
+            ax = axs[i, j]
+            values = hist[axis] / np.max(hist[axis])
+
+            vmax = 1.0
+            vmin = 0.0
+            if log:
+                values = np.log10(values + 1.00e-12)
+                vmax = 0.0
+                vmin = -4.0
+
+            ax.pcolormesh(
+                edges[axis[0]],
+                edges[axis[1]],
+                values.T,
+                cmap="plasma",
+                vmax=vmax,
+                vmin=vmin,
+                N=14,
+                colorbar=(j == 1),
+                # colorbar_kw=dict(width=1.0),
+            )
+
+    axs.format(
+        xlabel=LABELS[axis[0]],
+        ylabel=LABELS[axis[1]],
+        toplabels=["PyORBIT", "ImpactX"],
+        leftlabels=["IN", "OUT"],
+    )
 
-        filename = f"fig_dist"
-        if log:
-            filename = f"{filename}_log"
-        filename = f"{filename}_{dims[axis[0]]}_{dims[axis[1]]}.png"
-        filename = os.path.join(output_dir, filename)
-        print(filename)
-        plt.savefig(filename)
-
-
-# Plot 6D corner plot
-import psdist.plot as psv
-
-for index in range(2):
-    print("index:", index)
-    for code_name in histories:
-        print(code_name)
-
-        x = particles[code_name][index].copy()
-        x = x * 1000.0
-        
-        grid = psv.CornerGrid(ndim=6, figwidth=7.0, diag_rspine=True, space=1.0)
-        grid.set_labels(labels)
-        grid.set_limits(limits)
-
-        plot_kws = {}
-
-        grid.plot(
-            x,
-            bins=64,
-            limits=limits,
-            process_kws=dict(scale="max"),
-            mask=False,
-            offset=1.00e-12,
-            offset_type="absolute",
-            cmap="viridis",
-            diag_kws=dict(lw=1.3),
-            **plot_kws,
+    filename = f"fig_dist"
+    if log:
+        filename = f"{filename}_log"
+    filename = f"{filename}_{DIMS[axis[0]]}_{DIMS[axis[1]]}.png"
+    save_figure(os.path.join(output_dir, filename))
+
+
+def plot_corner(arrays: dict, hist: dict, edges: list, limits: list, filename: str) -> None:
+    """Plot a 6D corner plot from cached projections."""
+    uplt = setup_plotting()
+
+    ndim = len(DIMS)
+    fig, axs = uplt.subplots(ncols=ndim, nrows=ndim, figwidth=7.0, space=1.0, share=False)
+    for i in range(ndim):
+        for j in range(ndim):
+            ax = axs[i, j]
+            if j > i:
+                ax.axis("off")
+                continue
+            if i == j:
+                values = hist[(i,)] / np.max(hist[(i,)])
+                ax.stairs(values, edges[i], color="black", lw=1.3)
+                ax.format(xlim=limits[i], ylim=(0.0, 1.05), yticks=[])
+            else:
+                values = hist[(j, i)] / np.max(hist[(j, i)])
+                ax.pcolormesh(edges[j], edges[i], values.T + 1.00e-12, cmap="viridis")
+                ax.format(xlim=limits[j], ylim=limits[i])
+            if i < ndim - 1:
+                ax.format(xticklabels=[])
+            else:
+                ax.format(xlabel=LABELS[j])
+            if j > 0 or i == 0:
+                ax.format(yticklabels=[])
+            else:
+                ax.format(ylabel=LABELS[i])
+
+    save_figure(filename)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nprocs", type=int, default=None, help="number of worker processes")
+    args = parser.parse_args()
+
+    # Setup
+    # ----------------------------------------------------------------------------------
+
+    output_dir = "outputs"
+    os.makedirs(output_dir, exist_ok=True)
+
+    cfg = OmegaConf.load("../config.yaml")
+    print(cfg)
+
+    # Scalar history
+    # ----------------------------------------------------------------------------------
+
+    histories = {}
+    histories["pyorbit"] = load_pyorbit_history(find_history("../pyorbit/outputs/history"))
+    histories["impactx"] = load_impactx_history("../impactx/diags")
+
+    # Compare histories on a common s grid
+    table = compare_histories(histories["pyorbit"], histories["impactx"], tol=cfg.compare.tol)
+    print(format_table(table))
+
+    filename = os.path.join(output_dir, "comparison.csv")
+    print(filename)
+    table.to_csv(filename)
+
+    # Phase space distribution
+    # ----------------------------------------------------------------------------------
+
+    from tools.impactx.monitor_io import get_monitor_steps
+
+    snapshots = {}
+    snapshots["pyorbit"] = []
+    snapshots["impactx"] = []
+
+    pyorbit_params = {"kin_energy": cfg.bunch.kin_energy, "mass": cfg.bunch.mass}
+    for index, filename in enumerate(["../pyorbit/outputs/bunch_00.h5", "../pyorbit/outputs/bunch_01.h5"]):
+        snapshot = {"code": "pyorbit", "name": f"pyorbit_{index:02d}", "filename": filename, "params": pyorbit_params}
+        snapshots["pyorbit"].append(snapshot)
+
+    filename = "../impactx/diags/openPMD/monitor.h5"
+    for step in get_monitor_steps(filename):
+        snapshot = {"code": "impactx", "name": f"impactx_{step}", "filename": filename, "params": {"step": step}}
+        snapshots["impactx"].append(snapshot)
+
+    # The final snapshots are needed for the limits and distances; they are loaded
+    # once and shared. Other snapshots are only loaded by workers on a cache miss.
+    with SharedArrays() as shared:
+        for code_name in snapshots:
+            snapshot = snapshots[code_name][-1]
+            snapshot["name"] = f"{code_name}_final"
+            shared.add(snapshot["name"], load_snapshot(snapshot))
+
+        # Limits: +/- 5 rms of the final PyORBIT snapshot
+        xmax = np.std(shared.arrays["pyorbit_final"], axis=0) * 5.0
+        limits = [(float(-value), float(value)) for value in xmax]
+        edges = get_edges(BINS, limits)
+
+        tasks = []
+        tasks.append(Task("rms_sizes", plot_rms_sizes, {"histories": histories, "output_dir": output_dir}))
+        tasks.append(Task("rms_emittances", plot_rms_emittances, {"histories": histories, "output_dir": output_dir}))
+        tasks.append(
+            Task(
+                "distances",
+                compute_distances,
+                {"nsamp": cfg.compare.nsamp, "seed": cfg.seed, "output_dir": output_dir},
+            )
         )
+        filename = find_history("../pyorbit/outputs/halo")
+        if os.path.exists(filename):
+            history_halo = load_history(filename)
+            history_halo["s"] = unwrap_s(history_halo["s"].values)
+            tasks.append(Task("halo", plot_halo, {"history": history_halo, "output_dir": output_dir}))
+        for code_name in snapshots:
+            for snapshot in snapshots[code_name]:
+                tasks.append(
+                    Task(f"hist_{snapshot['name']}", compute_histograms, {"snapshot": snapshot, "limits": limits})
+                )
+        results = run_tasks(tasks, shared, nprocs=args.nprocs)
+
+    print(pd.Series(results["distances"]).to_string())
+
+    hists = {}
+    for code_name in snapshots:
+        hists[code_name] = [results[f"hist_{snapshot['name']}"] for snapshot in snapshots[code_name]]
+
+    # Figures rendered from the cached histograms
+    tasks = []
+    for axis in [(0, 1), (2, 3), (4, 5)]:
+        for log in [False, True]:
+            name = "dist_{}_{}{}".format(DIMS[axis[0]], DIMS[axis[1]], "_log" if log else "")
+            kwargs = {"hists": hists, "edges": edges, "axis": axis, "log": log, "output_dir": output_dir}
+            tasks.append(Task(name, plot_projection, kwargs))
+
+    for index in range(2):
+        for code_name in hists:
+            filename = os.path.join(output_dir, f"fig_corner_{code_name}_{index:02.0f}.png")
+            kwargs = {"hist": hists[code_name][index], "edges": edges, "limits": limits, "filename": filename}
+            tasks.append(Task(f"corner_{code_name}_{index:02.0f}", plot_corner, kwargs))
 
-        filename = f"fig_corner_{code_name}"
-        filename = f"{filename}_{index:02.0f}.png"
-        filename = os.path.join(output_dir, filename)
-        print(filename)
-        plt.savefig(filename)
+    run_tasks(tasks, nprocs=args.nprocs)
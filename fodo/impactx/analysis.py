@@ -1,10 +1,14 @@
 import os
+import sys
+
 import numpy as np
 import pandas as pd
-import openpmd_api as io
-
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../.."))
+from tools.impactx.monitor_io import get_monitor_steps
+from tools.impactx.monitor_io import iter_monitor_steps
+
 plt.rcParams["axes.linewidth"] = 1.25
 plt.rcParams["xtick.minor.visible"] = True
 plt.rcParams["ytick.minor.visible"] = True
@@ -42,21 +46,10 @@ ax.plot(history["s"], history["emittance_z"] * 1.00e06)
 plt.savefig(os.path.join(output_dir, "fig_rms_emittances.png"), dpi=300)
 
 
-# Load phase space coordinates
-def beam_df_to_np(beam: pd.DataFrame) -> np.ndarray:
-    columns = ["position_x", "momentum_x", "position_y", "momentum_y", "position_t", "momentum_t"]
-    x = beam.loc[:, columns].values
-    x = x * 1000.0
-    return x
-
-
-series = io.Series("./diags/openPMD/monitor.h5", io.Access.read_only)
-last_step = list(series.iterations)[-1]
-initial_beam = series.iterations[1].particles["beam"].to_df()
-final_beam = series.iterations[last_step].particles["beam"].to_df()
-
-bunches = [initial_beam, final_beam]
-bunches = [beam_df_to_np(beam) for beam in bunches]
+# Load initial/final phase space coordinates
+filename = "./diags/openPMD/monitor.h5"
+steps = get_monitor_steps(filename)
+bunches = [x * 1000.0 for _, x in iter_monitor_steps(filename, steps=[steps[0], steps[-1]])]
 
 # Plot initial/final distributions
 bins = 75
@@ -1,14 +1,26 @@
+import os
+import pickle
+import time
+
 import numpy as np
 import scipy
 from omegaconf import DictConfig
 from omegaconf import OmegaConf
 from scipy.constants import speed_of_light
 
+import amrex.space3d as amr
 import impactx
 
 
 # Load config dict
-cfg = OmegaConf.load("../config.yaml")
+cfg = OmegaConf.merge(OmegaConf.load("../config.yaml"), OmegaConf.from_cli())
+
+# ImpactX writes its diagnostics to diags/ in the working directory. With an
+# output_dir, run there so that benchmark runs do not overwrite ./diags.
+if cfg.output_dir:
+    cfg.output_dir = os.path.abspath(cfg.output_dir)
+    os.makedirs(cfg.output_dir, exist_ok=True)
+    os.chdir(cfg.output_dir)
 
 
 # Initialize simulation
@@ -88,9 +100,25 @@ elements = [
     impactx.elements.Quad(ds=(length_frac * 0.5), k=+kq, nslice=(nslice * 1)),
 ]
 sim.lattice.append(monitor)
-sim.lattice.extend(elements * 3)
+sim.lattice.extend(elements * cfg.lattice.periods)
 sim.lattice.append(monitor)
 
 # Run simulation
+start_time = time.perf_counter()
 sim.track_particles()
+track_time = time.perf_counter() - start_time
+
+if amr.ParallelDescriptor.IOProcessor():
+    output_dir = cfg.output_dir or "diags"
+    os.makedirs(output_dir, exist_ok=True)
+    info = {}
+    info["code"] = "impactx"
+    info["bunch_size"] = nparts
+    info["nsteps"] = nslice * 8 * cfg.lattice.periods
+    info["nkicks"] = nslice * 8 * cfg.lattice.periods
+    info["mpi_size"] = amr.ParallelDescriptor.NProcs()
+    info["track_time"] = track_time
+    with open(os.path.join(output_dir, "info.pkl"), "wb") as file:
+        pickle.dump(info, file)
+
 sim.finalize()
@@ -1,8 +1,9 @@
+import argparse
 import os
+import pickle
 import time
 import sys
 
-import os
 import numpy as np
 import pandas as pd
 from omegaconf import DictConfig
@@ -10,10 +11,7 @@ from omegaconf import OmegaConf
 
 from orbit.core import orbit_mpi
 from orbit.core.bunch import Bunch
-from orbit.core.bunch import BunchTwissAnalysis
 from orbit.core.spacecharge import SpaceChargeCalc3D
-from orbit.bunch_generators import TwissContainer
-from orbit.bunch_generators import GaussDist2D
 from orbit.lattice import AccActionsContainer
 from orbit.lattice import AccLattice
 from orbit.lattice import AccNode
@@ -23,6 +21,19 @@ from orbit.teapot import TEAPOT_Lattice
 from orbit.teapot import DriftTEAPOT
 from orbit.teapot import QuadTEAPOT
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../.."))
+from tools.pyorbit.bunch_gen import add_coords
+from tools.pyorbit.bunch_gen import gen_bunch_coords
+from tools.pyorbit.bunch_gen import sample_gauss_2d
+from tools.pyorbit.bunch_io import dump_bunch_snapshot
+from tools.pyorbit.checkpoint import Checkpointer
+from tools.pyorbit.halo import HaloMonitor
+from tools.pyorbit.history_io import HistoryWriter
+from tools.pyorbit.memory import MemoryTracker
+from tools.pyorbit.monitor import Monitor
+from tools.pyorbit.profiler import TrackingProfiler
+from tools.pyorbit.progress import ProgressLogger
+
 
 # Setup
 # --------------------------------------------------------------------------------------
@@ -31,15 +42,20 @@ _mpi_comm = orbit_mpi.mpi_comm.MPI_COMM_WORLD
 _mpi_rank = orbit_mpi.MPI_Comm_rank(_mpi_comm)
 _mpi_size = orbit_mpi.MPI_Comm_size(_mpi_comm)
 
-cfg = OmegaConf.load("../config.yaml")
-if _mpi_rank == 0:
-    print(cfg)
+parser = argparse.ArgumentParser()
+parser.add_argument("--resume", action="store_true", help="continue from the latest checkpoint")
+args, cli_overrides = parser.parse_known_args()
 
-output_dir = "outputs"
+cfg = OmegaConf.merge(OmegaConf.load("../config.yaml"), OmegaConf.from_cli(cli_overrides))
+logger = ProgressLogger(rank=_mpi_rank, interval=cfg.log.interval, quiet=cfg.log.quiet)
+logger.log(str(cfg))
+
+output_dir = cfg.output_dir or "outputs"
 if _mpi_rank == 0:
     os.makedirs(output_dir, exist_ok=True)
 
-rng = np.random.default_rng(cfg.seed)
+memory_tracker = MemoryTracker(every=cfg.memory.every)
+memory_tracker.sample("start")
 
 
 # Lattice
@@ -77,6 +93,7 @@ for node in lattice.getNodes():
 sc_path_length_min = 1.00e-06
 sc_calc = SpaceChargeCalc3D(cfg.spacecharge.grid.x, cfg.spacecharge.grid.y, cfg.spacecharge.grid.z)
 sc_nodes = setSC3DAccNodes(lattice, sc_path_length_min, sc_calc)
+memory_tracker.sample("spacecharge")
 
 if not cfg.lattice.spacecharge:
     for sc_node in sc_nodes:
@@ -90,110 +107,158 @@ bunch = Bunch()
 bunch.mass(cfg.bunch.mass)
 bunch.getSyncParticle().kinEnergy(cfg.bunch.kin_energy)
 
-alpha_x = cfg.bunch.alpha_x
-alpha_y = cfg.bunch.alpha_y
-beta_x = cfg.bunch.beta_x
-beta_y = cfg.bunch.beta_y
-eps_x = cfg.bunch.eps_x
-eps_y = cfg.bunch.eps_y
-twiss_x = TwissContainer(alpha_x, beta_x, eps_x)
-twiss_y = TwissContainer(alpha_y, beta_y, eps_y)
-dist = GaussDist2D(twiss_x, twiss_y)
-
-data_type = orbit_mpi.mpi_datatype.MPI_DOUBLE
-main_rank = 0
-
-for i in range(cfg.bunch.size):
-    x, xp, y, yp = dist.getCoordinates()
-    z = rng.normal(scale=cfg.bunch.sigma_z)
-    de = 0.0
-
-    (x, xp, y, yp, z, de) = orbit_mpi.MPI_Bcast(
-        (x, xp, y, yp, z, de), data_type, main_rank, _mpi_comm
-    )
-    if i % _mpi_size == _mpi_rank:
-        bunch.addParticle(x, xp, y, yp, z, de)
+twiss_x = (cfg.bunch.alpha_x, cfg.bunch.beta_x, cfg.bunch.eps_x)
+twiss_y = (cfg.bunch.alpha_y, cfg.bunch.beta_y, cfg.bunch.eps_y)
+
+
+def sample(size: int, rng: np.random.Generator) -> np.ndarray:
+    return sample_gauss_2d(size, rng, twiss_x, twiss_y, sigma_z=cfg.bunch.sigma_z)
+
+
+# A resumed run restores the particles from the checkpoint instead.
+if not args.resume:
+    for coords in gen_bunch_coords(sample, cfg.bunch.size, cfg.seed, _mpi_rank, _mpi_size):
+        add_coords(bunch, coords)
+
+    if cfg.bunch.intensity > 0:
+        bunch.macroSize(cfg.bunch.intensity / cfg.bunch.size)
 
-if cfg.bunch.intensity > 0:
-    bunch.macroSize(cfg.bunch.intensity / cfg.bunch.size)
+memory_tracker.sample("bunch")
 
 
 # Tracking
 # --------------------------------------------------------------------------------------
 
 
-def get_bunch_cov(bunch: Bunch) -> np.ndarray:
-    order = 2
-    dispersion_flag = 0
-    emit_norm_flag = 0
-
-    twiss_calc = BunchTwissAnalysis()
-    twiss_calc.computeBunchMoments(bunch, order, dispersion_flag, emit_norm_flag)
-
-    cov_matrix = np.zeros((6, 6))
-    for i in range(6):
-        for j in range(i + 1):
-            cov_matrix[i, j] = cov_matrix[j, i] = twiss_calc.getCorrelation(j, i)
-    return cov_matrix
-
-
-class Monitor:
-    def __init__(self) -> None:
-        self.history = {}
-        for key in [
-            "s",
-            "sig_x",
-            "sig_y",
-            "sig_z",
-            "emittance_x",
-            "emittance_y",
-            "emittance_z",
-        ]:
-            self.history[key] = []
-
-    def __call__(self, params_dict: dict) -> None:
-        bunch = params_dict["bunch"]
-        node = params_dict["node"]
-        distance = params_dict["path_length"]
-
-        cov_matrix = get_bunch_cov(bunch)
-        sigma_x = np.sqrt(cov_matrix[0, 0])
-        sigma_y = np.sqrt(cov_matrix[2, 2])
-        sigma_z = np.sqrt(cov_matrix[4, 4])
-
-        emittance_x = np.sqrt(np.linalg.det(cov_matrix[0:2, 0:2]))
-        emittance_y = np.sqrt(np.linalg.det(cov_matrix[2:4, 2:4]))
-        emittance_z = np.sqrt(np.linalg.det(cov_matrix[4:6, 4:6]))
-
-        self.history["s"].append(distance)
-        self.history["sig_x"].append(sigma_x)
-        self.history["sig_y"].append(sigma_y)
-        self.history["sig_z"].append(sigma_z)
-        self.history["emittance_x"].append(emittance_x)
-        self.history["emittance_y"].append(emittance_y)
-        self.history["emittance_z"].append(emittance_z)
-
-        if _mpi_rank == 0:
-            message = ""
-            message += "s={:0.3f} ".format(distance)
-            message += "xrms={:0.3f} ".format(sigma_x * 1000.0)
-            message += "yrms={:0.3f} ".format(sigma_y * 1000.0)
-            message += "zrms={:0.3f} ".format(sigma_z * 1000.0)
-            print(message)
-            sys.stdout.flush()
-
-
-monitor = Monitor()
-action_container = AccActionsContainer()
-action_container.addAction(monitor, AccActionsContainer.ENTRANCE)
-action_container.addAction(monitor, AccActionsContainer.EXIT)
+# With history.format=h5, rank 0 streams records to HDF5 files during tracking and
+# the monitors only keep the latest record in memory.
+stream_history = cfg.history.format == "h5"
+
+
+def make_history_writer(filename: str, keys: list[str]) -> HistoryWriter:
+    if not stream_history or _mpi_rank != 0:
+        return None
+    return HistoryWriter(
+        os.path.join(output_dir, filename),
+        keys,
+        block_size=cfg.history.block_size,
+        flush_interval=cfg.history.flush_interval,
+        resume=args.resume,
+    )
+
 
-bunch.dumpBunch(os.path.join(output_dir, "bunch_00.dat"))
+monitor = Monitor(
+    every=cfg.monitor.every,
+    ds=cfg.monitor.ds,
+    nodes=cfg.monitor.nodes,
+    logger=logger,
+    sink=make_history_writer("history.h5", Monitor.keys),
+    keep_history=(not stream_history),
+)
+halo_monitor = None
+if cfg.halo.enabled:
+    halo_monitor = HaloMonitor(
+        every=cfg.halo.every,
+        ds=cfg.halo.ds,
+        nodes=cfg.halo.nodes,
+        nbins=cfg.halo.nbins,
+        logger=logger,
+        sink=make_history_writer("halo.h5", HaloMonitor.keys),
+        keep_history=(not stream_history),
+    )
 
-for period in range(cfg.lattice.periods):
+action_container = AccActionsContainer()
+monitor_action = monitor
+memory_action = memory_tracker
+halo_action = halo_monitor
+
+# The profiler must be added first so that action time is excluded from node times.
+profiler = None
+if cfg.profile.enabled:
+    profiler = TrackingProfiler(length=lattice.getLength(), ds=cfg.profile.ds)
+    profiler.add_to(action_container)
+    monitor_action = profiler.wrap_action(monitor)
+    memory_action = profiler.wrap_action(memory_tracker)
+    if halo_monitor is not None:
+        halo_action = profiler.wrap_action(halo_monitor)
+
+action_container.addAction(monitor_action, AccActionsContainer.ENTRANCE)
+action_container.addAction(monitor_action, AccActionsContainer.EXIT)
+action_container.addAction(memory_action, AccActionsContainer.EXIT)
+if halo_monitor is not None:
+    action_container.addAction(halo_action, AccActionsContainer.EXIT)
+
+checkpointer = Checkpointer(
+    directory=(cfg.checkpoint.directory or os.path.join(output_dir, "checkpoints")),
+    every=cfg.checkpoint.every,
+    interval=cfg.checkpoint.interval,
+    keep=cfg.checkpoint.keep,
+)
+
+start_period = 0
+if args.resume:
+    checkpoint = checkpointer.load(bunch)
+    monitor.set_state(checkpoint["state"]["monitor"])
+    if halo_monitor is not None and "halo" in checkpoint["state"]:
+        halo_monitor.set_state(checkpoint["state"]["halo"])
+    start_period = checkpoint["period"]
+    logger.log(f"Resuming after period {start_period}", force=True)
+else:
+    bunch.dumpBunch(os.path.join(output_dir, "bunch_00.dat"))
+    dump_bunch_snapshot(bunch, os.path.join(output_dir, "bunch_00.h5"))
+
+save_checkpoints = (cfg.checkpoint.every is not None) or (cfg.checkpoint.interval is not None)
+
+orbit_mpi.MPI_Barrier(_mpi_comm)
+start_time = time.perf_counter()
+
+for period in range(start_period, cfg.lattice.periods):
     lattice.trackBunch(bunch, actionContainer=action_container)
 
+    if save_checkpoints and (period + 1) < cfg.lattice.periods and checkpointer.should_save(period + 1):
+        state = {"monitor": monitor.get_state()}
+        if halo_monitor is not None:
+            state["halo"] = halo_monitor.get_state()
+        checkpointer.save(period + 1, bunch, state=state)
+
+orbit_mpi.MPI_Barrier(_mpi_comm)
+track_time = time.perf_counter() - start_time
+
 bunch.dumpBunch(os.path.join(output_dir, "bunch_01.dat"))
+dump_bunch_snapshot(bunch, os.path.join(output_dir, "bunch_01.h5"))
+memory_tracker.sample("dump")
+memory = memory_tracker.reduce(bunch.getSize())
+
+if profiler is not None:
+    profile = profiler.reduce()
+    if _mpi_rank == 0:
+        for key, table in profile.items():
+            table.to_csv(os.path.join(output_dir, f"profile_{key}.csv"))
+        logger.log(profile["classes"].to_string(), force=True)
+        logger.log(profile["nodes"].head(20).to_string(), force=True)
+
+if stream_history:
+    for sink in [monitor.sink, halo_monitor.sink if halo_monitor is not None else None]:
+        if sink is not None:
+            sink.close()
+else:
+    history = pd.DataFrame(monitor.history)
+    history.to_csv(os.path.join(output_dir, "history.csv"))
+
+    if halo_monitor is not None and _mpi_rank == 0:
+        history_halo = pd.DataFrame(halo_monitor.history)
+        history_halo.to_csv(os.path.join(output_dir, "halo.csv"))
 
-history = pd.DataFrame(monitor.history)
-history.to_csv(os.path.join(output_dir, "history.csv"))
+if _mpi_rank == 0:
+    info = {}
+    info["code"] = "pyorbit"
+    info["bunch_size"] = cfg.bunch.size
+    info["nsteps"] = sum(node.getnParts() for node in lattice.getNodes()) * cfg.lattice.periods
+    info["nkicks"] = len(sc_nodes) * cfg.lattice.periods if cfg.lattice.spacecharge else 0
+    info["mpi_size"] = _mpi_size
+    info["track_time"] = track_time
+    info["memory"] = memory
+    with open(os.path.join(output_dir, "info.pkl"), "wb") as file:
+        pickle.dump(info, file)
+
+logger.close()
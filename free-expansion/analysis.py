@@ -1,164 +1,193 @@
+"""Compare PyORBIT and ImpactX free-expansion runs.
+
+Each figure is an independent task run on a process pool (see tools/pipeline.py).
+Snapshots are loaded once and shared with the workers through shared memory;
+plotting libraries are only imported by the tasks that plot.
+
+Usage: python analysis.py [--nprocs N]
+"""
+import argparse
 import os
-import h5py
+import sys
+
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from omegaconf import DictConfig
 from omegaconf import OmegaConf
 
-import psdist.plot as psv
-import ultraplot as uplt
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from tools.pipeline import SharedArrays
+from tools.pipeline import Task
+from tools.pipeline import run_tasks
+from tools.pyorbit.history_io import find_history
+from tools.pyorbit.history_io import load_history
+
+
+DIMS = ["x", "px", "y", "py", "t", "pt"]
+UNITS = ["mm", "", "mm", "", "mm", ""]
+LABELS = [f"{dim} [{unit}]" for dim, unit in zip(DIMS, UNITS)]
+
+
+def setup_plotting():
+    import ultraplot as uplt
+
+    uplt.rc["axes.linewidth"] = 1.25
+    uplt.rc["cmap.discrete"] = False
+    uplt.rc["cmap.sequential"] = "viridis"
+    uplt.rc["figure.facecolor"] = "white"
+    uplt.rc["grid"] = False
+    uplt.rc["savefig.dpi"] = 300.0
+    return uplt
+
 
-from utils import pyorbit_to_impactx
+def plot_rms_sizes(arrays: dict, histories: dict, output_dir: str) -> None:
+    import matplotlib.pyplot as plt
 
+    uplt = setup_plotting()
+    fig, axs = uplt.subplots(ncols=3, figheight=1.75)
+    for ax, key in zip(axs, ["sig_x", "sig_y", "sig_z_rest"]):
+        ax.plot(histories["pyorbit"]["s"], histories["pyorbit"][key] * 1000.0, label="impactx", color="blacK", lw=2.0)
+        ax.plot(histories["impactx"]["s"], histories["impactx"][key] * 1000.0, label="pyorbit", color="red")
+    axs.format(xlabel="Distance [m]", ylabel="[mm]")
+    axs[0].set_title(r"$\sqrt{\langle xx \rangle}$", fontsize="medium")
+    axs[1].set_title(r"$\sqrt{\langle yy \rangle}$", fontsize="medium")
+    axs[2].set_title(r"$\sqrt{\langle zz \rangle}$", fontsize="medium")
+    axs[2].legend(fontsize="medium", ncols=1, loc="right", framealpha=0.0)
+    plt.savefig(os.path.join(output_dir, "fig_rms_sizes.png"))
 
-uplt.rc["axes.linewidth"] = 1.25
-uplt.rc["cmap.discrete"] = False
-uplt.rc["cmap.sequential"] = "viridis"
-uplt.rc["figure.facecolor"] = "white"
-uplt.rc["grid"] = False
-uplt.rc["savefig.dpi"] = 300.0
 
+def plot_rms_emittances(arrays: dict, histories: dict, output_dir: str) -> None:
+    import matplotlib.pyplot as plt
 
-# Setup
-# --------------------------------------------------------------------------------------
+    uplt = setup_plotting()
+    fig, axs = uplt.subplots(ncols=2, figheight=1.75)
+    for ax, key in zip(axs, ["emittance_x", "emittance_y"]):
+        ax.plot(histories["pyorbit"]["s"], histories["pyorbit"][key] * 1.0e+06, label="impactx", color="blacK", lw=2.0)
+        ax.plot(histories["impactx"]["s"], histories["impactx"][key] * 1.0e+06, label="pyorbit", color="red")
+    axs.format(xlabel="Distance [m]", ylabel="[mm mrad]")
+    axs[0].set_title(r"$\varepsilon_x$", fontsize="medium")
+    axs[1].set_title(r"$\varepsilon_y$", fontsize="medium")
+    axs[1].legend(fontsize="medium", ncols=1, loc="right", framealpha=0.0)
+    plt.savefig(os.path.join(output_dir, "fig_rms_emittances.png"))
 
-output_dir = "outputs/analysis"
-os.makedirs(output_dir, exist_ok=True)
-
-cfg = OmegaConf.load("./config.yaml")
-
-
-# Load scalar history
-# --------------------------------------------------------------------------------------
-
-histories = {}
-
-# PyORBIT
-history = pd.read_csv("./pyorbit/outputs/history.csv")
-histories["pyorbit"] = history.copy()
-
-# ImpactX
-history_ref = pd.read_csv("./impactx/diags/ref_particle.0.0", delimiter=" ")
-history = pd.read_csv("./impactx/diags/reduced_beam_characteristics.0.0", delimiter=" ")
-history["sig_z"] = history["sig_t"] * history_ref["beta"]
-history["sig_z_rest"] = history["sig_z"] * history_ref["gamma"]
-histories["impactx"] = history.copy()
-
-
-# Plot scalar history
-# --------------------------------------------------------------------------------------
-
-fig, axs = uplt.subplots(ncols=3, figheight=1.75)
-for ax, key in zip(axs, ["sig_x", "sig_y", "sig_z_rest"]):
-    ax.plot(histories["pyorbit"]["s"], histories["pyorbit"][key] * 1000.0, label="impactx", color="blacK", lw=2.0)
-    ax.plot(histories["impactx"]["s"], histories["impactx"][key] * 1000.0, label="pyorbit", color="red")
-axs.format(xlabel="Distance [m]", ylabel="[mm]")
-axs[0].set_title(r"$\sqrt{\langle xx \rangle}$", fontsize="medium")
-axs[1].set_title(r"$\sqrt{\langle yy \rangle}$", fontsize="medium")
-axs[2].set_title(r"$\sqrt{\langle zz \rangle}$", fontsize="medium")
-axs[2].legend(fontsize="medium", ncols=1, loc="right", framealpha=0.0)
-plt.savefig(os.path.join(output_dir, "fig_rms_sizes.png"))
-
-
-fig, axs = uplt.subplots(ncols=2, figheight=1.75)
-for ax, key in zip(axs, ["emittance_x", "emittance_y"]):
-    ax.plot(histories["pyorbit"]["s"], histories["pyorbit"][key] * 1.0e+06, label="impactx", color="blacK", lw=2.0)
-    ax.plot(histories["impactx"]["s"], histories["impactx"][key] * 1.0e+06, label="pyorbit", color="red")
-axs.format(xlabel="Distance [m]", ylabel="[mm mrad]")
-axs[0].set_title(r"$\varepsilon_x$", fontsize="medium")
-axs[1].set_title(r"$\varepsilon_y$", fontsize="medium")
-axs[1].legend(fontsize="medium", ncols=1, loc="right", framealpha=0.0)
-plt.savefig(os.path.join(output_dir, "fig_rms_emittances.png"))
-
-
-# Load phase space distribution
-# --------------------------------------------------------------------------------------
-
-# We convert all units to ImpactX units.
-
-particles = {}
-particles["pyorbit"] = []
-particles["impactx"] = []
-
-# PyORBIT
-filenames = [
-    "pyorbit/outputs/bunch_00.dat",
-    "pyorbit/outputs/bunch_01.dat",
-]
-for filename in filenames:
-    x = np.loadtxt(filename, usecols=range(6), comments="%")
-    x = pyorbit_to_impactx(x, mass=cfg.mass, kin_energy=cfg.kin_energy)
-    particles["pyorbit"].append(x.copy())
-
-
-# ImpactX
-file = h5py.File("./impactx/diags/openPMD/monitor.h5", "r")
-data = file["data"]
-step_keys = list(data.keys())  # strings representing step number []"1", "102", ...]
-for step_key in step_keys:
-    x = [
-        data[step_key]["particles"]["beam"]["position"]["x"],
-        data[step_key]["particles"]["beam"]["momentum"]["x"],
-        data[step_key]["particles"]["beam"]["position"]["y"],
-        data[step_key]["particles"]["beam"]["momentum"]["y"],
-        data[step_key]["particles"]["beam"]["position"]["t"],
-        data[step_key]["particles"]["beam"]["momentum"]["t"],
-    ]
-    x = np.stack(x, axis=-1)
-    particles["impactx"].append(x.copy())
-
-# Scale units
-for key in particles:
-    for x in particles[key]:
-        x[:, 0] *= 1000.0  # [m] --> [mm]
-        x[:, 1] *= 1000.0
-        x[:, 2] *= 1000.0  # [m] --> [mm]
-        x[:, 3] *= 1000.0
-        x[:, 4] *= 1000.0  # [m] --> [mm]
-        x[:, 5] *= 1000.0
-
-
-# Plot phase space distribution
-# --------------------------------------------------------------------------------------
-
-for axis in [(0, 1), (2, 3), (0, 2)]:
-    bins = 64
-    xmax = np.std(particles["pyorbit"][-1], axis=0) * 3.0
-    limits = list(zip(-xmax, xmax))
-    
-    dims = ["x", "px", "y", "py", "t", "pt"]
-    units = ["mm", "", "mm", "", "mm", ""]
-    labels = [f"{dim} [{unit}]" for dim, unit in zip(dims, units)]
 
+def plot_projection(arrays: dict, names: dict, axis: tuple, bins: int, limits: list, output_dir: str) -> None:
+    """Plot a 2D projection of the first and last snapshot of both codes."""
+    import matplotlib.pyplot as plt
+
+    uplt = setup_plotting()
     fig, axs = uplt.subplots(ncols=2, nrows=2, figheight=4.0)
     for j, key in enumerate(["pyorbit", "impactx"]):
-        for i, x in enumerate(particles[key]):
+        for i, name in enumerate(names[key]):
             ax = axs[i, j]
+            x = arrays[name]
             values, edges = np.histogramdd(x[:, axis], bins=bins, range=[limits[k] for k in axis])
             ax.pcolormesh(edges[0], edges[1], values.T, cmap="viridis")
     axs.format(
-        xlabel=labels[axis[0]],
-        ylabel=labels[axis[1]],
+        xlabel=LABELS[axis[0]],
+        ylabel=LABELS[axis[1]],
         toplabels=["PyORBIT", "ImpactX"],
         leftlabels=["IN", "OUT"],
     )
-    filename = f"fig_dist_{dims[axis[0]]}_{dims[axis[1]]}.png"
+    filename = f"fig_dist_{DIMS[axis[0]]}_{DIMS[axis[1]]}.png"
     filename = os.path.join(output_dir, filename)
     plt.savefig(filename)
-    plt.close()
-
-cmap = uplt.Colormap("Blues", left=0.1)
-
-for index in range(2):
-    for key in histories:
-        grid = psv.CornerGrid(ndim=4, figwidth=5.0)
-        grid.set_labels(labels)
-        grid.set_limits(limits)
-        grid.plot(particles[key][index], bins=64, limits=limits, cmap=cmap, diag_kws=dict(lw=1.3))
-    
-        filename = f"fig_corner_{key}_{i}.png"
-        filename = os.path.join(output_dir, filename)
-        plt.savefig(filename)
-        plt.close()
 
+
+def plot_corner(arrays: dict, name: str, limits: list, filename: str) -> None:
+    import matplotlib.pyplot as plt
+    import psdist.plot as psv
+
+    uplt = setup_plotting()
+    cmap = uplt.Colormap("Blues", left=0.1)
+
+    grid = psv.CornerGrid(ndim=4, figwidth=5.0)
+    grid.set_labels(LABELS)
+    grid.set_limits(limits)
+    grid.plot(arrays[name], bins=64, limits=limits, cmap=cmap, diag_kws=dict(lw=1.3))
+    plt.savefig(filename)
+
+
+if __name__ == "__main__":
+    from tools.impactx.monitor_io import iter_monitor_steps
+    from tools.pyorbit.bunch_io import load_bunch_coords
+    from tools.pyorbit.bunch_utils import pyorbit_to_impactx
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nprocs", type=int, default=None, help="number of worker processes")
+    args = parser.parse_args()
+
+    # Setup
+    # ----------------------------------------------------------------------------------
+
+    output_dir = "outputs/analysis"
+    os.makedirs(output_dir, exist_ok=True)
+
+    cfg = OmegaConf.load("./config.yaml")
+
+    # Load scalar history
+    # ----------------------------------------------------------------------------------
+
+    histories = {}
+
+    # PyORBIT
+    history = load_history(find_history("./pyorbit/outputs/history"))
+    histories["pyorbit"] = history.copy()
+
+    # ImpactX
+    history_ref = pd.read_csv("./impactx/diags/ref_particle.0.0", delimiter=" ")
+    history = pd.read_csv("./impactx/diags/reduced_beam_characteristics.0.0", delimiter=" ")
+    history["sig_z"] = history["sig_t"] * history_ref["beta"]
+    history["sig_z_rest"] = history["sig_z"] * history_ref["gamma"]
+    histories["impactx"] = history.copy()
+
+    # Load phase space distribution
+    # ----------------------------------------------------------------------------------
+
+    # We convert all units to ImpactX units and scale by 1000 ([m] --> [mm]). The
+    # snapshots are copied into shared memory once and read by all plotting tasks.
+
+    with SharedArrays() as shared:
+        names = {}
+        names["pyorbit"] = []
+        names["impactx"] = []
+
+        # PyORBIT
+        filenames = [
+            "pyorbit/outputs/bunch_00.h5",
+            "pyorbit/outputs/bunch_01.h5",
+        ]
+        for index, filename in enumerate(filenames):
+            x = load_bunch_coords(filename)
+            x = pyorbit_to_impactx(x, mass=cfg.mass, kin_energy=cfg.kin_energy)
+            x *= 1000.0
+            names["pyorbit"].append(f"pyorbit_{index}")
+            shared.add(names["pyorbit"][-1], x)
+
+        # ImpactX
+        for index, (step, x) in enumerate(iter_monitor_steps("./impactx/diags/openPMD/monitor.h5")):
+            x *= 1000.0
+            names["impactx"].append(f"impactx_{index}")
+            shared.add(names["impactx"][-1], x)
+
+        # Plot
+        # ------------------------------------------------------------------------------
+
+        bins = 64
+        xmax = np.std(shared.arrays[names["pyorbit"][-1]], axis=0) * 3.0
+        limits = list(zip(-xmax, xmax))
+
+        tasks = []
+        tasks.append(Task("rms_sizes", plot_rms_sizes, {"histories": histories, "output_dir": output_dir}))
+        tasks.append(Task("rms_emittances", plot_rms_emittances, {"histories": histories, "output_dir": output_dir}))
+
+        for axis in [(0, 1), (2, 3), (0, 2)]:
+            kwargs = {"names": names, "axis": axis, "bins": bins, "limits": limits, "output_dir": output_dir}
+            tasks.append(Task(f"dist_{DIMS[axis[0]]}_{DIMS[axis[1]]}", plot_projection, kwargs))
+
+        for index in range(2):
+            for key in histories:
+                filename = os.path.join(output_dir, f"fig_corner_{key}_{index}.png")
+                kwargs = {"name": names[key][index], "limits": limits, "filename": filename}
+                tasks.append(Task(f"corner_{key}_{index}", plot_corner, kwargs))
+
+        run_tasks(tasks, shared, nprocs=args.nprocs)
@@ -1,13 +1,16 @@
 import os
 import math
 import pathlib
+import sys
 
 import numpy as np
 import pandas as pd
-import openpmd_api as io
-
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../.."))
+from tools.impactx.monitor_io import get_monitor_steps
+from tools.impactx.monitor_io import iter_monitor_steps
+
 
 plt.rcParams["axes.linewidth"] = 1.25
 plt.rcParams["xtick.minor.visible"] = True
@@ -43,20 +46,9 @@ plt.savefig(os.path.join(output_dir, "fig_emittance.png"))
 
 
 # Load initial/final bunches
-def beam_df_to_np(beam: pd.DataFrame) -> np.ndarray:
-    columns = ["position_x", "momentum_x", "position_y", "momentum_y", "position_t", "momentum_t"]
-    x = beam.loc[:, columns].values
-    x = x * 1000.0
-    return x 
-
-series = io.Series("./diags/openPMD/monitor.h5", io.Access.read_only)
-last_step = list(series.iterations)[-1]
-initial_beam = series.iterations[1].particles["beam"].to_df()
-final_beam = series.iterations[last_step].particles["beam"].to_df()
-
-# Extract phase space coordinate arrays
-bunches = [initial_beam, final_beam]
-bunches = [beam_df_to_np(beam) for beam in bunches]
+filename = "./diags/openPMD/monitor.h5"
+steps = get_monitor_steps(filename)
+bunches = [x * 1000.0 for _, x in iter_monitor_steps(filename, steps=[steps[0], steps[-1]])]
 
 # Plot initial/final x-y distribution
 xmax = np.std(bunches[1], axis=0) * 3.0
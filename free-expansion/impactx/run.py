@@ -1,12 +1,30 @@
+import os
+import pickle
+import sys
+import time
+
 from omegaconf import DictConfig
 from omegaconf import OmegaConf
 from scipy.constants import speed_of_light
 
+import amrex.space3d as amr
 import impactx
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../.."))
+from tools.impactx.bunch_utils import add_particles_from_pyorbit
+
 
 # Load config dict
-cfg = OmegaConf.load("../config.yaml")
+cfg = OmegaConf.merge(OmegaConf.load("../config.yaml"), OmegaConf.from_cli())
+
+# ImpactX writes its diagnostics to diags/ in the working directory. With an
+# output_dir, run there so that benchmark runs do not overwrite ./diags.
+if cfg.output_dir:
+    if cfg.get("bunch_file"):
+        cfg.bunch_file = os.path.abspath(cfg.bunch_file)
+    cfg.output_dir = os.path.abspath(cfg.output_dir)
+    os.makedirs(cfg.output_dir, exist_ok=True)
+    os.chdir(cfg.output_dir)
 
 # Initialize simulation
 sim = impactx.ImpactX()
@@ -44,19 +62,24 @@ ref_particle.set_mass_MeV(mass)
 ref_particle.set_kin_energy_MeV(kin_energy)
 
 # Load particles
-xrms = cfg.xrms  # rest frame [m]
-yrms = cfg.yrms  # rest frame [m]
-zrms = cfg.zrms / ref_particle.gamma  # rest frame [m]
-trms = zrms / ref_particle.beta
-dist = impactx.distribution.Gaussian(
-    lambdaX=xrms,
-    lambdaY=yrms,
-    lambdaT=trms,
-    lambdaPx=0.0,
-    lambdaPy=0.0,
-    lambdaPt=0.0,
-)
-sim.add_particles(total_charge, dist, nparts)
+if cfg.get("bunch_file"):
+    # Start from a PyORBIT snapshot (.h5) or dumpBunch file (.dat)
+    qm_eev = cfg.charge / mass / 1.00e+06  # charge/mass in e / eV
+    add_particles_from_pyorbit(sim.particle_container(), cfg.bunch_file, qm_eev, total_charge)
+else:
+    xrms = cfg.xrms  # rest frame [m]
+    yrms = cfg.yrms  # rest frame [m]
+    zrms = cfg.zrms / ref_particle.gamma  # rest frame [m]
+    trms = zrms / ref_particle.beta
+    dist = impactx.distribution.Gaussian(
+        lambdaX=xrms,
+        lambdaY=yrms,
+        lambdaT=trms,
+        lambdaPx=0.0,
+        lambdaPy=0.0,
+        lambdaPt=0.0,
+    )
+    sim.add_particles(total_charge, dist, nparts)
 
 # Diagnostics
 monitor = impactx.elements.BeamMonitor("monitor", backend="h5")
@@ -69,7 +92,22 @@ sim.lattice.extend([
 ])
 
 # Run simulation
+start_time = time.perf_counter()
 sim.track_particles()
+track_time = time.perf_counter() - start_time
+
+if amr.ParallelDescriptor.IOProcessor():
+    output_dir = cfg.output_dir or "diags"
+    os.makedirs(output_dir, exist_ok=True)
+    info = {}
+    info["code"] = "impactx"
+    info["bunch_size"] = nparts
+    info["nsteps"] = cfg.nsteps
+    info["nkicks"] = cfg.nsteps
+    info["mpi_size"] = amr.ParallelDescriptor.NProcs()
+    info["track_time"] = track_time
+    with open(os.path.join(output_dir, "info.pkl"), "wb") as file:
+        pickle.dump(info, file)
 
 # Clean shutdown
 sim.finalize()
@@ -1,11 +1,15 @@
 import os
 import math
 import pathlib
+import sys
 
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../.."))
+from tools.pyorbit.bunch_io import load_bunch_coords
+
 
 plt.rcParams["axes.linewidth"] = 1.25
 plt.rcParams["xtick.minor.visible"] = True
@@ -38,15 +42,15 @@ plt.savefig(os.path.join(output_dir, "fig_emittance.png"))
 
 # Plot phase space distribution
 def load_bunch(filename: str) -> np.ndarray:
-    x = np.loadtxt(filename, usecols=range(6), comments="%")
+    x = load_bunch_coords(filename)
     x = x * 1000.0
     return x
 
 
 # Load initial/final beams
 bunch_filenames = [
-    "outputs/bunch_00.dat",
-    "outputs/bunch_01.dat",
+    "outputs/bunch_00.h5",
+    "outputs/bunch_01.h5",
 ]
 bunches = [load_bunch(filename) for filename in bunch_filenames]
 
@@ -1,4 +1,8 @@
 import os
+import pickle
+import sys
+import time
+
 import numpy as np
 import pandas as pd
 from omegaconf import DictConfig
@@ -6,24 +10,42 @@ from omegaconf import OmegaConf
 
 from orbit.core import orbit_mpi
 from orbit.core.bunch import Bunch
-from orbit.core.bunch import BunchTwissAnalysis
 from orbit.core.spacecharge import SpaceChargeCalc3D
 from orbit.lattice import AccActionsContainer
 from orbit.space_charge.sc3d import setSC3DAccNodes
 from orbit.teapot import TEAPOT_Lattice
 from orbit.teapot import DriftTEAPOT
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../.."))
+from tools.pyorbit.bunch_gen import add_coords
+from tools.pyorbit.bunch_gen import gen_bunch_coords
+from tools.pyorbit.bunch_io import dump_bunch_snapshot
+from tools.pyorbit.history_io import HistoryWriter
+from tools.pyorbit.memory import MemoryTracker
+from tools.pyorbit.monitor import Monitor
+from tools.pyorbit.profiler import TrackingProfiler
+from tools.pyorbit.progress import ProgressLogger
+
 
 # Setup
 # --------------------------------------------------------------------------------------
 
+_mpi_comm = orbit_mpi.mpi_comm.MPI_COMM_WORLD
+_mpi_rank = orbit_mpi.MPI_Comm_rank(_mpi_comm)
+_mpi_size = orbit_mpi.MPI_Comm_size(_mpi_comm)
+
 # Load config dict
-cfg = OmegaConf.load("../config.yaml")
+cfg = OmegaConf.merge(OmegaConf.load("../config.yaml"), OmegaConf.from_cli())
+
+logger = ProgressLogger(rank=_mpi_rank, interval=cfg.log.interval, quiet=cfg.log.quiet)
 
 # Create output directory
-output_dir = "outputs"
+output_dir = cfg.output_dir or "outputs"
 os.makedirs(output_dir, exist_ok=True)
-        
+
+memory_tracker = MemoryTracker(every=cfg.memory.every)
+memory_tracker.sample("start")
+
 
 # Lattice
 # --------------------------------------------------------------------------------------
@@ -40,6 +62,7 @@ lattice.initialize()
 
 sc_calc = SpaceChargeCalc3D(cfg.grid.x, cfg.grid.y, cfg.grid.z)
 sc_nodes = setSC3DAccNodes(lattice, delta_s, sc_calc)
+memory_tracker.sample("spacecharge")
 
 
 # Bunch
@@ -50,103 +73,103 @@ bunch.mass(cfg.mass)
 
 sync_part = bunch.getSyncParticle()
 sync_part.kinEnergy(cfg.kin_energy)
-    
-rng = np.random.default_rng(cfg.seed)
-for index in range(cfg.nparts):    
-    x = rng.normal(scale=cfg.xrms)
-    y = rng.normal(scale=cfg.yrms)
-    z = rng.normal(scale=cfg.zrms / sync_part.gamma())
-    xp = 0.0
-    yp = 0.0
-    de = 0.0
-    bunch.addParticle(x, xp, y, yp, z, de)
-    
+
+scale = np.array([cfg.xrms, 0.0, cfg.yrms, 0.0, cfg.zrms / sync_part.gamma(), 0.0])
+
+
+def sample(size: int, rng: np.random.Generator) -> np.ndarray:
+    return rng.normal(size=(size, 6)) * scale
+
+
+for coords in gen_bunch_coords(sample, cfg.nparts, cfg.seed, _mpi_rank, _mpi_size):
+    add_coords(bunch, coords)
+
 size_global = bunch.getSizeGlobal()
 macro_size = cfg.intensity / size_global
 bunch.macroSize(macro_size)
 
+memory_tracker.sample("bunch")
+
 
 # Tracking
 # --------------------------------------------------------------------------------------
 
-def get_bunch_cov(bunch: Bunch) -> np.ndarray:
-    order = 2
-    dispersion_flag = 0
-    emit_norm_flag = 0
-
-    twiss_calc = BunchTwissAnalysis()
-    twiss_calc.computeBunchMoments(bunch, order, dispersion_flag, emit_norm_flag)
-
-    cov_matrix = np.zeros((6, 6))
-    for i in range(6):
-        for j in range(i + 1):
-            cov_matrix[i, j] = cov_matrix[j, i] = twiss_calc.getCorrelation(j, i)
-    return cov_matrix
-
-
-class Monitor:
-    def __init__(self) -> None:
-        self.history = {}
-        for key in [
-            "s",
-            "sig_x",
-            "sig_y",
-            "sig_z",
-            "sig_z_rest",
-            "emittance_x",
-            "emittance_y",
-            "emittance_z",
-            "gamma",
-            "beta",
-        ]:
-            self.history[key] = []
-
-    def __call__(self, params_dict: dict) -> None:   
-        bunch = params_dict["bunch"]
-        node = params_dict["node"]
-        distance = params_dict["path_length"]
-
-        cov_matrix = get_bunch_cov(bunch)
-        sigma_x = np.sqrt(cov_matrix[0, 0])
-        sigma_y = np.sqrt(cov_matrix[2, 2])
-        sigma_z = np.sqrt(cov_matrix[4, 4])
-
-        emittance_x = np.sqrt(np.linalg.det(cov_matrix[0:2, 0:2]))
-        emittance_y = np.sqrt(np.linalg.det(cov_matrix[2:4, 2:4]))
-        emittance_z = np.sqrt(np.linalg.det(cov_matrix[4:6, 4:6]))
-
-        self.history["s"].append(distance)
-        self.history["sig_x"].append(sigma_x)
-        self.history["sig_y"].append(sigma_y)
-        self.history["sig_z"].append(sigma_z)
-        self.history["emittance_x"].append(emittance_x)
-        self.history["emittance_y"].append(emittance_y)
-        self.history["emittance_z"].append(emittance_z)
-
-        gamma = bunch.getSyncParticle().gamma()
-        beta = bunch.getSyncParticle().beta()
-        self.history["gamma"].append(gamma)
-        self.history["beta"].append(beta)
-        self.history["sig_z_rest"].append(gamma * sigma_z)
-
-        message = ""
-        message += "s={:0.3f} ".format(distance)
-        message += "xrms={:0.3f} ".format(sigma_x * 1000.0)
-        message += "yrms={:0.3f} ".format(sigma_y * 1000.0)
-        message += "zrms={:0.3f} ".format(sigma_z * 1000.0)
-        print(message)
-
-        
-monitor = Monitor()
+# With history.format=h5, rank 0 streams records to history.h5 during tracking and
+# the monitor only keeps the latest record in memory.
+stream_history = cfg.history.format == "h5"
+sink = None
+if stream_history and _mpi_rank == 0:
+    sink = HistoryWriter(
+        os.path.join(output_dir, "history.h5"),
+        Monitor.keys,
+        block_size=cfg.history.block_size,
+        flush_interval=cfg.history.flush_interval,
+    )
+
+monitor = Monitor(
+    every=cfg.monitor.every,
+    ds=cfg.monitor.ds,
+    nodes=cfg.monitor.nodes,
+    logger=logger,
+    sink=sink,
+    keep_history=(not stream_history),
+)
 action_container = AccActionsContainer()
-action_container.addAction(monitor, AccActionsContainer.ENTRANCE)
-action_container.addAction(monitor, AccActionsContainer.EXIT)
+monitor_action = monitor
+memory_action = memory_tracker
+
+# The profiler must be added first so that action time is excluded from node times.
+profiler = None
+if cfg.profile.enabled:
+    profiler = TrackingProfiler(length=lattice.getLength(), ds=cfg.profile.ds)
+    profiler.add_to(action_container)
+    monitor_action = profiler.wrap_action(monitor)
+    memory_action = profiler.wrap_action(memory_tracker)
+
+action_container.addAction(monitor_action, AccActionsContainer.ENTRANCE)
+action_container.addAction(monitor_action, AccActionsContainer.EXIT)
+action_container.addAction(memory_action, AccActionsContainer.EXIT)
 
 bunch.dumpBunch(os.path.join(output_dir, "bunch_00.dat"))
+dump_bunch_snapshot(bunch, os.path.join(output_dir, "bunch_00.h5"))
+
+orbit_mpi.MPI_Barrier(_mpi_comm)
+start_time = time.perf_counter()
 
 lattice.trackBunch(bunch, actionContainer=action_container)
 
-bunch.dumpBunch(os.path.join(output_dir, "bunch_01.dat"))
+orbit_mpi.MPI_Barrier(_mpi_comm)
+track_time = time.perf_counter() - start_time
 
-history = pd.DataFrame(monitor.history)
-history.to_csv(os.path.join(output_dir, "history.csv"))
\ No newline at end of file
+bunch.dumpBunch(os.path.join(output_dir, "bunch_01.dat"))
+dump_bunch_snapshot(bunch, os.path.join(output_dir, "bunch_01.h5"))
+memory_tracker.sample("dump")
+memory = memory_tracker.reduce(bunch.getSize())
+
+if profiler is not None:
+    profile = profiler.reduce()
+    if _mpi_rank == 0:
+        for key, table in profile.items():
+            table.to_csv(os.path.join(output_dir, f"profile_{key}.csv"))
+        logger.log(profile["classes"].to_string(), force=True)
+        logger.log(profile["nodes"].head(20).to_string(), force=True)
+
+if sink is not None:
+    sink.close()
+if not stream_history:
+    history = pd.DataFrame(monitor.history)
+    history.to_csv(os.path.join(output_dir, "history.csv"))
+
+if _mpi_rank == 0:
+    info = {}
+    info["code"] = "pyorbit"
+    info["bunch_size"] = cfg.nparts
+    info["nsteps"] = cfg.nsteps
+    info["nkicks"] = len(sc_nodes)
+    info["mpi_size"] = _mpi_size
+    info["track_time"] = track_time
+    info["memory"] = memory
+    with open(os.path.join(output_dir, "info.pkl"), "wb") as file:
+        pickle.dump(info, file)
+
+logger.close()
\ No newline at end of file
@@ -1,40 +1,130 @@
 import os
 import pickle
 import numpy as np
+import pandas as pd
+import matplotlib
+
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 
 
 plt.rcParams["axes.linewidth"] = 1.25
 plt.rcParams["xtick.minor.visible"] = True
 plt.rcParams["ytick.minor.visible"] = True
+plt.rcParams["figure.constrained_layout.use"] = True
+plt.rcParams["savefig.dpi"] = 300
 
 
-# Collect output folder names and sort by timestamp
+# Collect info dicts from all runs (outputs/<mode>/<run> or outputs/<timestamp>)
 input_dir = "outputs"
-folders = os.listdir(input_dir)
-folders = sorted(folders)
-folders = [os.path.join(input_dir, f) for f in folders]
-print(folders)
-
+output_dir = os.path.join("outputs", "analysis")
+os.makedirs(output_dir, exist_ok=True)
 
-# Collect info dicts
-infos = []
-for folder in folders:
-    filename = os.path.join(folder, "info.pkl")
+rows = []
+for root, dirs, files in sorted(os.walk(input_dir)):
+    if "info.pkl" not in files:
+        continue
+    filename = os.path.join(root, "info.pkl")
     with open(filename, "rb") as file:
         info = pickle.load(file)
-    infos.append(info)
-
     print(filename)
     print(info)
 
+    row = {}
+    row["mode"] = info.get("mode", "strong")
+    row["mpi_size"] = info["mpi_size"]
+    row["bunch_size"] = info.get("bunch_size")
+    row["run_time"] = info["run_time"]
+    for phase, stats in info.get("timings", {}).items():
+        for key, value in stats.items():
+            row[f"{phase}_{key}"] = value
+    if "memory" in info:
+        memory = info["memory"]
+        row["memory_peak_max"] = np.max(memory["peak"])
+        row["memory_peak_mean"] = np.mean(memory["peak"])
+        row["bytes_per_particle"] = np.mean(memory["bytes_per_particle"])
+    rows.append(row)
+
+table = pd.DataFrame(rows)
+table = table.sort_values(["mode", "mpi_size"]).drop_duplicates(["mode", "mpi_size"], keep="last")
+
+
+# Speedup and parallel efficiency relative to the smallest run of each mode.
+# Strong scaling: speedup = T(n0) / T(n); efficiency = speedup * n0 / n.
+# Weak scaling: efficiency = T(n0) / T(n); scaled speedup = efficiency * n / n0.
+tables = {}
+for mode, group in table.groupby("mode"):
+    group = group.copy()
+    n0 = group["mpi_size"].iloc[0]
+    t0 = group["run_time"].iloc[0]
+    if mode == "weak":
+        group["efficiency"] = t0 / group["run_time"]
+        group["speedup"] = group["efficiency"] * group["mpi_size"] / n0
+    else:
+        group["speedup"] = t0 / group["run_time"]
+        group["efficiency"] = group["speedup"] * n0 / group["mpi_size"]
+    tables[mode] = group
+
+table = pd.concat(tables.values())
+print(table)
+table.to_csv(os.path.join(output_dir, "scaling.csv"), index=False)
+
+
+# Plot run time per phase vs. number of MPI processes.
+phases = [column[: -len("_mean")] for column in table.columns if column.endswith("_mean")]
+
+for mode, group in tables.items():
+    fig, ax = plt.subplots(figsize=(4.0, 3.0))
+    for phase in phases:
+        ax.errorbar(
+            group["mpi_size"],
+            group[f"{phase}_mean"],
+            yerr=[
+                group[f"{phase}_mean"] - group[f"{phase}_min"],
+                group[f"{phase}_max"] - group[f"{phase}_mean"],
+            ],
+            lw=1.5,
+            marker=".",
+            label=phase,
+        )
+    ax.set_xscale("log", base=2)
+    ax.set_yscale("log")
+    ax.set_xlabel("MPI processes")
+    ax.set_ylabel("Time [s]")
+    ax.set_title(f"{mode} scaling")
+    ax.legend(loc="upper right", fontsize="small")
+    plt.savefig(os.path.join(output_dir, f"fig_times_{mode}.png"))
+    plt.close()
+
+
+# Plot speedup and parallel efficiency.
+fig, axs = plt.subplots(ncols=2, figsize=(7.0, 3.0))
+for mode, group in tables.items():
+    axs[0].plot(group["mpi_size"], group["speedup"], lw=1.5, marker=".", label=mode)
+    axs[1].plot(group["mpi_size"], group["efficiency"], lw=1.5, marker=".", label=mode)
+nmax = table["mpi_size"].max()
+axs[0].plot([1, nmax], [1, nmax], color="black", lw=0.75, ls=":", label="ideal")
+axs[1].axhline(1.0, color="black", lw=0.75, ls=":")
+axs[0].set_ylabel("Speedup")
+axs[1].set_ylabel("Parallel efficiency")
+for ax in axs:
+    ax.set_xlabel("MPI processes")
+axs[0].legend(loc="upper left", fontsize="small")
+plt.savefig(os.path.join(output_dir, "fig_speedup.png"))
+plt.close()
 
-# Plot number of MPI processes vs. execution time.
-mpi_nodes = [info["mpi_size"] for info in infos]
-run_times = [info["run_time"] for info in infos]
 
-fig, ax = plt.subplots()
-ax.plot(mpi_nodes, run_times, lw=1.5, marker=".")
-ax.set_xlabel("MPI processes")
-ax.set_ylabel("Run time")
-plt.show()
+# Plot peak memory per rank and bytes per macroparticle.
+if "memory_peak_max" in table:
+    fig, axs = plt.subplots(ncols=2, figsize=(7.0, 3.0))
+    for mode, group in tables.items():
+        axs[0].plot(group["mpi_size"], group["memory_peak_max"] / 1.00e+09, lw=1.5, marker=".", label=mode)
+        axs[1].plot(group["mpi_size"], group["bytes_per_particle"], lw=1.5, marker=".", label=mode)
+    axs[0].set_ylabel("Peak memory per rank (max) [GB]")
+    axs[1].set_ylabel("Bytes per macroparticle")
+    for ax in axs:
+        ax.set_xscale("log", base=2)
+        ax.set_xlabel("MPI processes")
+    axs[0].legend(loc="upper right", fontsize="small")
+    plt.savefig(os.path.join(output_dir, "fig_memory.png"))
+    plt.close()
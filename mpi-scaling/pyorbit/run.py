@@ -13,8 +13,6 @@ from orbit.core import orbit_mpi
 from orbit.core.bunch import Bunch
 from orbit.core.bunch import BunchTwissAnalysis
 from orbit.core.spacecharge import SpaceChargeCalc3D
-from orbit.bunch_generators import TwissContainer
-from orbit.bunch_generators import GaussDist2D
 from orbit.lattice import AccActionsContainer
 from orbit.lattice import AccLattice
 from orbit.lattice import AccNode
@@ -24,6 +22,14 @@ from orbit.teapot import TEAPOT_Lattice
 from orbit.teapot import DriftTEAPOT
 from orbit.teapot import QuadTEAPOT
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../.."))
+from tools.pyorbit.bunch_gen import add_coords
+from tools.pyorbit.bunch_gen import gen_bunch_coords
+from tools.pyorbit.bunch_gen import sample_gauss_2d
+from tools.pyorbit.memory import MemoryTracker
+from tools.pyorbit.progress import ProgressLogger
+from tools.pyorbit.timing import PhaseTimer
+
 
 # Setup
 # --------------------------------------------------------------------------------------
@@ -32,22 +38,28 @@ _mpi_comm = orbit_mpi.mpi_comm.MPI_COMM_WORLD
 _mpi_rank = orbit_mpi.MPI_Comm_rank(_mpi_comm)
 _mpi_size = orbit_mpi.MPI_Comm_size(_mpi_comm)
 
-cfg = OmegaConf.load("../config.yaml")
-if _mpi_rank == 0:
-    print(cfg)
+cfg = OmegaConf.merge(OmegaConf.load("../config.yaml"), OmegaConf.from_cli())
+logger = ProgressLogger(rank=_mpi_rank, interval=cfg.log.interval, quiet=cfg.log.quiet)
+logger.log(str(cfg))
 
-timestamp = time.strftime("%y%m%d%H%M%S")
-output_dir = os.path.join("outputs", timestamp)
+output_dir = cfg.output_dir
+if output_dir is None:
+    timestamp = time.strftime("%y%m%d%H%M%S")
+    output_dir = os.path.join("outputs", timestamp)
 
 if _mpi_rank == 0:
     os.makedirs(output_dir, exist_ok=True)
 
-rng = np.random.default_rng(cfg.seed)
+timer = PhaseTimer()
+memory_tracker = MemoryTracker(every=cfg.memory.every)
+memory_tracker.sample("start")
 
 
 # Lattice
 # --------------------------------------------------------------------------------------
 
+timer.start("lattice")
+
 length = cfg.lattice.length
 fill_fraction = cfg.lattice.fill_fraction
 
@@ -80,69 +92,81 @@ for node in lattice.getNodes():
 sc_path_length_min = 1.00e-06
 sc_calc = SpaceChargeCalc3D(cfg.spacecharge.grid.x, cfg.spacecharge.grid.y, cfg.spacecharge.grid.z)
 sc_nodes = setSC3DAccNodes(lattice, sc_path_length_min, sc_calc)
+memory_tracker.sample("spacecharge")
 
 if not cfg.lattice.spacecharge:
     for sc_node in sc_nodes:
         sc_node.switcher = False
 
+for sc_node in sc_nodes:
+    sc_node.track = timer.wrap("spacecharge", sc_node.track)
+
+timer.stop("lattice")
+
 
 # Bunch
 # --------------------------------------------------------------------------------------
 
+timer.start("bunch")
+
 bunch = Bunch()
 bunch.mass(cfg.bunch.mass)
 bunch.getSyncParticle().kinEnergy(cfg.bunch.kin_energy)
 
-alpha_x = cfg.bunch.alpha_x
-alpha_y = cfg.bunch.alpha_y
-beta_x = cfg.bunch.beta_x
-beta_y = cfg.bunch.beta_y
-eps_x = cfg.bunch.eps_x
-eps_y = cfg.bunch.eps_y
-twiss_x = TwissContainer(alpha_x, beta_x, eps_x)
-twiss_y = TwissContainer(alpha_y, beta_y, eps_y)
-dist = GaussDist2D(twiss_x, twiss_y)
-
-data_type = orbit_mpi.mpi_datatype.MPI_DOUBLE
-main_rank = 0
-
-for i in range(cfg.bunch.size):
-    x, xp, y, yp = dist.getCoordinates()
-    z = rng.normal(scale=cfg.bunch.sigma_z)
-    de = 0.0
-
-    (x, xp, y, yp, z, de) = orbit_mpi.MPI_Bcast(
-        (x, xp, y, yp, z, de), data_type, main_rank, _mpi_comm
-    )
-    if i % _mpi_size == _mpi_rank:
-        bunch.addParticle(x, xp, y, yp, z, de)
+twiss_x = (cfg.bunch.alpha_x, cfg.bunch.beta_x, cfg.bunch.eps_x)
+twiss_y = (cfg.bunch.alpha_y, cfg.bunch.beta_y, cfg.bunch.eps_y)
+
+
+def sample(size: int, rng: np.random.Generator) -> np.ndarray:
+    return sample_gauss_2d(size, rng, twiss_x, twiss_y, sigma_z=cfg.bunch.sigma_z)
+
+
+for coords in gen_bunch_coords(sample, cfg.bunch.size, cfg.seed, _mpi_rank, _mpi_size):
+    add_coords(bunch, coords)
 
 if cfg.bunch.intensity > 0:
     bunch.macroSize(cfg.bunch.intensity / cfg.bunch.size)
 
+timer.stop("bunch")
+memory_tracker.sample("bunch")
+
 
 # Tracking
 # --------------------------------------------------------------------------------------
 
 def action(params_dict: dict) -> None:
-    if _mpi_rank == 0:
-        print("s={:0.5f} node={}".format(params_dict["path_length"], params_dict["node"]))
+    logger.log(lambda: "s={:0.5f} node={}".format(params_dict["path_length"], params_dict["node"]))
 
 action_container = AccActionsContainer()
-action_container.addAction(action, AccActionsContainer.ENTRANCE)
-action_container.addAction(action, AccActionsContainer.EXIT)
-
+if not cfg.log.quiet:
+    action = timer.wrap("diagnostics", action)
+    action_container.addAction(action, AccActionsContainer.ENTRANCE)
+    action_container.addAction(action, AccActionsContainer.EXIT)
+action_container.addAction(timer.wrap("memory", memory_tracker), AccActionsContainer.EXIT)
 
-start_time = time.time()
+orbit_mpi.MPI_Barrier(_mpi_comm)
+timer.start("tracking")
 
 for period in range(cfg.lattice.periods):
     lattice.trackBunch(bunch, actionContainer=action_container)
 
+orbit_mpi.MPI_Barrier(_mpi_comm)
+run_time = timer.stop("tracking")
+timings = timer.reduce()
+memory_tracker.sample("end")
+memory = memory_tracker.reduce(bunch.getSize())
+
 if _mpi_rank == 0:
     info = {}
-    info["run_time"] = time.time() - start_time
+    info["run_time"] = run_time
     info["mpi_size"] = _mpi_size
-    
+    info["mode"] = cfg.mode
+    info["bunch_size"] = cfg.bunch.size
+    info["timings"] = timings
+    info["memory"] = memory
+
     filename = os.path.join(output_dir, "info.pkl")
     with open(filename, "wb") as file:
-        pickle.dump(info, file)
\ No newline at end of file
+        pickle.dump(info, file)
+
+logger.close()
@@ -1,7 +1,5 @@
 #!/bin/bash
 
-for ((i = 1 ; i < 10 ; i = i + 1)); 
-do 
-    echo "mpi n" "$i"; 
-    mpirun -n $i python run.py
-done
+# Strong and weak scaling sweeps; extra arguments are passed as config overrides,
+# e.g. ./run.sh scaling.nprocs=[1,2,4,8,16]
+python scaling.py "$@"
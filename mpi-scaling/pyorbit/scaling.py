@@ -0,0 +1,41 @@
+"""Run strong and weak scaling sweeps of run.py.
+
+Strong scaling keeps `bunch.size` fixed; weak scaling keeps the number of
+particles per rank fixed at `scaling.particles_per_rank`. Each run writes its
+info.pkl to outputs/<mode>/n<nprocs>. Config values can be overridden from the
+command line, e.g. `python scaling.py scaling.nprocs=[1,2,4] scaling.modes=[weak]`;
+overrides outside `scaling` (e.g. `lattice.periods=1`) are passed on to every run.
+"""
+import os
+import sys
+
+from omegaconf import OmegaConf
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../.."))
+from tools.runner import parse_overrides
+from tools.runner import run_script
+
+
+cfg = OmegaConf.merge(OmegaConf.load("../config.yaml"), OmegaConf.from_cli())
+run_overrides = parse_overrides(sys.argv[1:], exclude=["scaling"])
+
+for mode in cfg.scaling.modes:
+    for nprocs in cfg.scaling.nprocs:
+        if mode == "strong":
+            bunch_size = cfg.bunch.size
+        elif mode == "weak":
+            bunch_size = cfg.scaling.particles_per_rank * nprocs
+        else:
+            raise ValueError(f"Invalid scaling mode {mode}")
+
+        output_dir = os.path.join("outputs", mode, f"n{nprocs:03.0f}")
+        print(f"mode={mode} nprocs={nprocs} bunch.size={bunch_size}")
+        sys.stdout.flush()
+
+        run_script(
+            ".",
+            "run.py",
+            overrides={**run_overrides, "mode": mode, "bunch.size": bunch_size, "output_dir": output_dir},
+            nprocs=nprocs,
+            launcher=cfg.scaling.launcher,
+        )
@@ -1,3 +1,6 @@
+import os
+import sys
+
 import numpy as np
 from omegaconf import DictConfig
 from omegaconf import OmegaConf
@@ -6,9 +9,19 @@ from scipy.constants import speed_of_light
 import impactx
 import amrex.space3d as amr
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../.."))
+from tools.impactx.bunch_utils import add_particles
+
 
 # Load config dict
-cfg = OmegaConf.load("../config.yaml")
+cfg = OmegaConf.merge(OmegaConf.load("../config.yaml"), OmegaConf.from_cli())
+
+# ImpactX writes its diagnostics to diags/ in the working directory. With an
+# output_dir, run there so that benchmark runs do not overwrite ./diags.
+if cfg.output_dir:
+    cfg.output_dir = os.path.abspath(cfg.output_dir)
+    os.makedirs(cfg.output_dir, exist_ok=True)
+    os.chdir(cfg.output_dir)
 
 
 # Initialize simulation
@@ -36,33 +49,21 @@ ref_particle.z = 0
 # Add single particle.
 particle_container = sim.particle_container()
 
-dx_podv = amr.PODVector_real_std()
-dy_podv = amr.PODVector_real_std()
-dt_podv = amr.PODVector_real_std()
-dpx_podv = amr.PODVector_real_std()
-dpy_podv = amr.PODVector_real_std()
-dpt_podv = amr.PODVector_real_std()
-
 coords = np.zeros((2, 6))
 coords[0, :] = [cfg.x, cfg.xp, cfg.y, cfg.yp, 0.0, 0.0]
 
-for p_dx in coords[:, 0]:
-    dx_podv.push_back(p_dx)
-for p_dy in coords[:, 2]:
-    dy_podv.push_back(p_dy)
-for p_dt in coords[:, 4]:
-    dt_podv.push_back(p_dt)
-for p_dpx in coords[:, 1]:
-    dpx_podv.push_back(p_dpx)
-for p_dpy in coords[:, 3]:
-    dpy_podv.push_back(p_dpy)
-for p_dpt in coords[:, 5]:
-    dpt_podv.push_back(p_dpt)
-
 charge_to_mass_ratio = 1.0 / mass / 1.00e+06  # proton charge/mass in e / eV
 total_charge = 0.0
-particle_container.add_n_particles(
-    dx_podv, dy_podv, dt_podv, dpx_podv, dpy_podv, dpt_podv, charge_to_mass_ratio, total_charge
+add_particles(
+    particle_container,
+    coords[:, 0],
+    coords[:, 2],
+    coords[:, 4],
+    coords[:, 1],
+    coords[:, 3],
+    coords[:, 5],
+    charge_to_mass_ratio,
+    total_charge,
 )
 
 # Create accelerator lattice
@@ -15,12 +15,12 @@ from orbit.teapot import QuadTEAPOT
 # --------------------------------------------------------------------------------------
 
 # Load config dict
-cfg = OmegaConf.load("../config.yaml")
+cfg = OmegaConf.merge(OmegaConf.load("../config.yaml"), OmegaConf.from_cli())
 
 # Create output directory
-output_dir = "outputs"
+output_dir = cfg.output_dir or "outputs"
 os.makedirs(output_dir, exist_ok=True)
-        
+
 
 # Lattice
 # --------------------------------------------------------------------------------------
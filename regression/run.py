@@ -0,0 +1,195 @@
+"""Performance and physics regression suite.
+
+Reruns each benchmark at a reduced size and compares its wall time, tracking
+time, peak memory and physics outputs to stored baselines. Performance metrics
+fail only if they get worse by more than `tolerance.perf`; physics metrics fail
+if they deviate in either direction by more than `tolerance.physics`. The exit
+code is 0 if all checks pass, with bit 1 set for physics drift, bit 2 set for
+performance regressions and bit 4 set if a case or metric has no baseline (so a
+checkout without baselines never passes).
+"""
+import os
+import pickle
+import platform
+import sys
+
+import numpy as np
+import pandas as pd
+from omegaconf import OmegaConf
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from tools.runner import run_script
+
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def read_impactx_history(directory: str) -> pd.DataFrame:
+    history = pd.read_csv(os.path.join(directory, "reduced_beam_characteristics.0.0"), delimiter=" ")
+    history_ref = pd.read_csv(os.path.join(directory, "ref_particle.0.0"), delimiter=" ")
+    history["sig_z"] = history["sig_t"] * history_ref["beta"]
+    history["emittance_z"] = history["emittance_t"]
+    # Single-particle coordinates (see quad/analysis).
+    history["x"] = history["x_min"] + history["x_max"]
+    history["y"] = history["y_min"] + history["y_max"]
+    return history
+
+
+def get_physics_metrics(outputs: str, directory: str, output_dir: str) -> dict:
+    """Return scalar or array physics outputs of a run."""
+    if outputs is None:
+        return {}
+    if outputs.startswith("pyorbit"):
+        history = pd.read_csv(os.path.join(output_dir, "history.csv"))
+    else:
+        # ImpactX runs with an output_dir write their diagnostics to <output_dir>/diags.
+        history = read_impactx_history(os.path.join(output_dir, "diags"))
+
+    metrics = {}
+    if outputs.endswith("history"):
+        for key in ["sig_x", "sig_y", "sig_z", "emittance_x", "emittance_y", "emittance_z"]:
+            metrics[key] = float(history[key].iloc[-1])
+    elif outputs.endswith("trajectory"):
+        for key in ["x", "y"]:
+            metrics[key] = history[key].tolist()
+    return metrics
+
+
+def get_perf_metrics(output_dir: str, wall_time: float) -> dict:
+    """Return wall time and, if the run wrote an info.pkl, tracking time and peak memory."""
+    metrics = {"wall_time": wall_time}
+    filename = os.path.join(output_dir, "info.pkl")
+    if os.path.exists(filename):
+        with open(filename, "rb") as file:
+            info = pickle.load(file)
+        if "track_time" in info:
+            metrics["track_time"] = info["track_time"]
+        elif "run_time" in info:
+            metrics["track_time"] = info["run_time"]
+        if "memory" in info:
+            metrics["peak_memory"] = float(np.max(info["memory"]["peak"]))
+    return metrics
+
+
+def get_machine_info() -> dict:
+    """Return a description of this machine, stored with performance baselines."""
+    info = {}
+    info["hostname"] = platform.node()
+    info["platform"] = platform.platform()
+    info["processor"] = platform.processor() or platform.machine()
+    info["cpu_count"] = os.cpu_count()
+    return info
+
+
+def compare(kind: str, name: str, value, baseline, tol: float) -> dict:
+    value = np.asarray(value, dtype=float)
+    baseline = np.asarray(baseline, dtype=float)
+    if value.shape != baseline.shape:
+        return {"kind": kind, "metric": name, "deviation": np.inf, "tolerance": tol, "passed": False}
+
+    scale = max(np.max(np.abs(baseline)), 1.00e-300)
+    if kind == "perf":
+        deviation = float((value - baseline) / scale)
+    else:
+        deviation = float(np.max(np.abs(value - baseline)) / scale)
+
+    row = {}
+    row["kind"] = kind
+    row["metric"] = name
+    row["value"] = float(value) if value.ndim == 0 else np.nan
+    row["baseline"] = float(baseline) if baseline.ndim == 0 else np.nan
+    row["deviation"] = deviation
+    row["tolerance"] = tol
+    row["passed"] = deviation <= tol
+    return row
+
+
+cfg = OmegaConf.merge(OmegaConf.load("config.yaml"), OmegaConf.from_cli())
+
+machine = get_machine_info()
+output_dir = os.path.abspath(cfg.output_dir)
+baseline_dir = os.path.abspath(cfg.baseline_dir)
+os.makedirs(output_dir, exist_ok=True)
+os.makedirs(baseline_dir, exist_ok=True)
+
+rows = []
+missing = []
+for name, case in cfg.cases.items():
+    if cfg.only is not None:
+        if name not in cfg.only:
+            continue
+    elif not case.enabled:
+        continue
+
+    print(name)
+    sys.stdout.flush()
+
+    directory = os.path.join(ROOT, case.directory)
+    run_dir = os.path.join(output_dir, name)
+    overrides = dict(case.overrides)
+    overrides["output_dir"] = run_dir
+
+    wall_time = run_script(
+        directory,
+        "run.py",
+        overrides=overrides,
+        nprocs=case.nprocs,
+        launcher=cfg.launcher,
+        log_filename=os.path.join(run_dir, "log.txt"),
+    )
+
+    results = {}
+    results["machine"] = machine
+    results["perf"] = get_perf_metrics(run_dir, wall_time)
+    results["physics"] = get_physics_metrics(case.outputs, directory, run_dir)
+
+    baseline_filename = os.path.join(baseline_dir, f"{name}.yaml")
+    if cfg.update_baselines:
+        OmegaConf.save(OmegaConf.create(results), baseline_filename)
+        print(f"Wrote {baseline_filename}")
+        continue
+
+    if not os.path.exists(baseline_filename):
+        print(f"No baseline for {name}; run with update_baselines=true")
+        missing.append(name)
+        continue
+    baseline = OmegaConf.to_container(OmegaConf.load(baseline_filename))
+    if cfg.perf and baseline.get("machine") != machine:
+        print(f"Performance baseline for {name} was recorded on another machine: {baseline.get('machine')}")
+
+    for kind in ["perf", "physics"]:
+        if not cfg[kind]:
+            continue
+        for metric, value in results[kind].items():
+            if metric not in baseline.get(kind, {}):
+                print(f"No baseline for {name} {kind} metric {metric}; run with update_baselines=true")
+                missing.append(f"{name}/{metric}")
+                continue
+            row = compare(kind, metric, value, baseline[kind][metric], cfg.tolerance[kind])
+            row["case"] = name
+            rows.append(row)
+
+if cfg.update_baselines:
+    sys.exit(0)
+
+columns = ["case", "kind", "metric", "value", "baseline", "deviation", "tolerance", "passed"]
+table = pd.DataFrame(rows, columns=columns)
+table.to_csv(os.path.join(output_dir, "results.csv"), index=False)
+if len(table):
+    print(table.to_string(index=False))
+
+status = 0
+if missing:
+    print("MISSING BASELINES:")
+    print("\n".join(missing))
+    status |= 4
+failed = table[~table["passed"].astype(bool)]
+if len(failed[failed["kind"] == "physics"]):
+    print("PHYSICS DRIFT:")
+    print(failed[failed["kind"] == "physics"].to_string(index=False))
+    status |= 1
+if len(failed[failed["kind"] == "perf"]):
+    print("PERFORMANCE REGRESSION:")
+    print(failed[failed["kind"] == "perf"].to_string(index=False))
+    status |= 2
+sys.exit(status)
@@ -0,0 +1,138 @@
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+from omegaconf import OmegaConf
+
+
+plt.rcParams["axes.linewidth"] = 1.25
+plt.rcParams["xtick.minor.visible"] = True
+plt.rcParams["ytick.minor.visible"] = True
+plt.rcParams["figure.constrained_layout.use"] = True
+plt.rcParams["savefig.dpi"] = 300
+
+
+cfg = OmegaConf.merge(OmegaConf.load("../config.yaml"), OmegaConf.from_cli())
+
+input_dir = os.path.join("outputs", "scan")
+output_dir = os.path.join("outputs", "analysis")
+os.makedirs(output_dir, exist_ok=True)
+
+
+# Load results
+# --------------------------------------------------------------------------------------
+
+rows = []
+histories = {}
+for name in sorted(os.listdir(input_dir)):
+    filename = os.path.join(input_dir, name, "info.pkl")
+    if not os.path.exists(filename):
+        continue
+    with open(filename, "rb") as file:
+        info = pickle.load(file)
+
+    (nx, ny, nz) = info["grid"]
+    row = {}
+    row["name"] = name
+    row["grid"] = f"{nx}x{ny}x{nz}"
+    row["cells"] = nx * ny * nz
+    row["bunch_size"] = info["bunch_size"]
+    row["mpi_size"] = info["mpi_size"]
+    row["time_per_kick"] = info["time_per_kick"]
+    row["peak_memory"] = info["peak_memory"]
+    rows.append(row)
+
+    histories[name] = pd.read_csv(os.path.join(input_dir, name, "history.csv"))
+
+table = pd.DataFrame(rows)
+
+
+# Fit cost model
+# --------------------------------------------------------------------------------------
+
+# t = a * N / P + b * M * log2(M) + c * M * log2(P) + d. Terms without variation
+# in the data (e.g. log2(P) if all runs are serial) are left out of the fit.
+features = {
+    "particles": table["bunch_size"] / table["mpi_size"],
+    "solve": table["cells"] * np.log2(table["cells"]),
+    "reduce": table["cells"] * np.log2(table["mpi_size"]),
+    "const": np.ones(len(table)),
+}
+features = {key: np.array(value, dtype=float) for key, value in features.items()}
+features = {key: value for key, value in features.items() if key == "const" or np.ptp(value) > 0}
+
+A = np.stack(list(features.values()), axis=-1)
+coeffs, *_ = np.linalg.lstsq(A, table["time_per_kick"].values, rcond=None)
+coeffs = dict(zip(features, coeffs))
+
+print("Cost model coefficients:")
+for key, value in coeffs.items():
+    print(f"  {key}: {value:0.4e}")
+
+for key in features:
+    table[f"time_{key}"] = coeffs[key] * features[key]
+table["time_model"] = A @ np.array(list(coeffs.values()))
+table["bytes_per_particle"] = table["peak_memory"] / (table["bunch_size"] / table["mpi_size"])
+
+
+# Compare rms history to finest grid
+# --------------------------------------------------------------------------------------
+
+deviations = []
+for (bunch_size, mpi_size), group in table.groupby(["bunch_size", "mpi_size"]):
+    reference = histories[group.loc[group["cells"].idxmax(), "name"]]
+    for index, row in group.iterrows():
+        history = histories[row["name"]]
+        deviation = 0.0
+        for key in ["sig_x", "sig_y", "sig_z"]:
+            ref = reference[key].values
+            deviation = max(deviation, np.max(np.abs(history[key].values - ref) / ref))
+        deviations.append((index, deviation))
+
+for index, deviation in deviations:
+    table.loc[index, "rms_deviation"] = deviation
+table["rms_pass"] = table["rms_deviation"] <= cfg.analysis.rms_tol
+
+table = table.sort_values(["mpi_size", "bunch_size", "time_per_kick"])
+print(table.to_string())
+table.to_csv(os.path.join(output_dir, "cost.csv"), index=False)
+pd.Series(coeffs).to_csv(os.path.join(output_dir, "cost_model.csv"), header=["coefficient"])
+
+cheapest = table[table["rms_pass"]].groupby(["mpi_size", "bunch_size"]).first()
+print("Cheapest grid within rms tolerance {}:".format(cfg.analysis.rms_tol))
+print(cheapest[["grid", "time_per_kick", "rms_deviation"]].to_string())
+
+
+# Plot
+# --------------------------------------------------------------------------------------
+
+for mpi_size, group in table.groupby("mpi_size"):
+    fig, axs = plt.subplots(ncols=2, figsize=(8.0, 3.0))
+    for grid, subgroup in group.groupby("grid"):
+        subgroup = subgroup.sort_values("bunch_size")
+        lines = axs[0].plot(subgroup["bunch_size"], subgroup["time_per_kick"], marker=".", lw=0, label=grid)
+        axs[0].plot(subgroup["bunch_size"], subgroup["time_model"], color=lines[0].get_color(), lw=0.75)
+        axs[1].plot(subgroup["bunch_size"], subgroup["peak_memory"] / 1.00e+09, marker=".", lw=1.5, label=grid)
+    for ax in axs:
+        ax.set_xscale("log")
+        ax.set_yscale("log")
+        ax.set_xlabel("Macroparticles")
+    axs[0].set_ylabel("Time per kick [s]")
+    axs[1].set_ylabel("Peak memory per rank [GB]")
+    axs[0].set_title(f"nprocs = {mpi_size}")
+    axs[1].legend(loc="upper left", fontsize="small")
+    plt.savefig(os.path.join(output_dir, f"fig_cost_p{mpi_size}.png"))
+    plt.close()
+
+fig, ax = plt.subplots(figsize=(3.5, 3.0))
+ax.plot(table["time_model"], table["time_per_kick"], marker=".", lw=0, color="black")
+limits = [table["time_per_kick"].min(), table["time_per_kick"].max()]
+ax.plot(limits, limits, color="black", lw=0.75, ls=":")
+ax.set_xscale("log")
+ax.set_yscale("log")
+ax.set_xlabel("Model [s]")
+ax.set_ylabel("Measured [s]")
+plt.savefig(os.path.join(output_dir, "fig_cost_model.png"))
+plt.close()
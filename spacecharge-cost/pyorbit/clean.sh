@@ -0,0 +1 @@
+rm -rf outputs
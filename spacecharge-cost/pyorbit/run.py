@@ -0,0 +1,130 @@
+import os
+import pickle
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from omegaconf import OmegaConf
+
+from orbit.core import orbit_mpi
+from orbit.core.bunch import Bunch
+from orbit.core.spacecharge import SpaceChargeCalc3D
+from orbit.lattice import AccActionsContainer
+from orbit.space_charge.sc3d import setSC3DAccNodes
+from orbit.teapot import TEAPOT_Lattice
+from orbit.teapot import DriftTEAPOT
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../.."))
+from tools.pyorbit.bunch_gen import add_coords
+from tools.pyorbit.bunch_gen import gen_bunch_coords
+from tools.pyorbit.memory import get_memory_usage
+from tools.pyorbit.monitor import Monitor
+from tools.pyorbit.progress import ProgressLogger
+from tools.pyorbit.timing import PhaseTimer
+
+
+# Setup
+# --------------------------------------------------------------------------------------
+
+_mpi_comm = orbit_mpi.mpi_comm.MPI_COMM_WORLD
+_mpi_rank = orbit_mpi.MPI_Comm_rank(_mpi_comm)
+_mpi_size = orbit_mpi.MPI_Comm_size(_mpi_comm)
+
+cfg = OmegaConf.merge(OmegaConf.load("../config.yaml"), OmegaConf.from_cli())
+logger = ProgressLogger(rank=_mpi_rank, interval=cfg.log.interval, quiet=cfg.log.quiet)
+logger.log(str(cfg))
+
+output_dir = cfg.output_dir
+if output_dir is None:
+    timestamp = time.strftime("%y%m%d%H%M%S")
+    output_dir = os.path.join("outputs", timestamp)
+
+if _mpi_rank == 0:
+    os.makedirs(output_dir, exist_ok=True)
+
+timer = PhaseTimer()
+
+
+# Lattice
+# --------------------------------------------------------------------------------------
+
+delta_s = cfg.lattice.distance / cfg.lattice.nsteps
+
+lattice = TEAPOT_Lattice()
+for index in range(cfg.lattice.nsteps):
+    node = DriftTEAPOT("d{}".format(index))
+    node.setLength(delta_s)
+    lattice.addNode(node)
+
+lattice.initialize()
+
+timer.start("grid")
+sc_calc = SpaceChargeCalc3D(cfg.grid.x, cfg.grid.y, cfg.grid.z)
+sc_nodes = setSC3DAccNodes(lattice, delta_s, sc_calc)
+timer.stop("grid")
+
+for sc_node in sc_nodes:
+    sc_node.track = timer.wrap("spacecharge", sc_node.track)
+
+
+# Bunch
+# --------------------------------------------------------------------------------------
+
+bunch = Bunch()
+bunch.mass(cfg.bunch.mass)
+bunch.getSyncParticle().kinEnergy(cfg.bunch.kin_energy)
+
+gamma = bunch.getSyncParticle().gamma()
+scale = np.array([cfg.bunch.xrms, 0.0, cfg.bunch.yrms, 0.0, cfg.bunch.zrms / gamma, 0.0])
+
+
+def sample(size: int, rng: np.random.Generator) -> np.ndarray:
+    return rng.normal(size=(size, 6)) * scale
+
+
+for coords in gen_bunch_coords(sample, cfg.bunch.size, cfg.seed, _mpi_rank, _mpi_size):
+    add_coords(bunch, coords)
+
+bunch.macroSize(cfg.bunch.intensity / cfg.bunch.size)
+
+
+# Tracking
+# --------------------------------------------------------------------------------------
+
+monitor = Monitor(logger=logger)
+action_container = AccActionsContainer()
+action_container.addAction(timer.wrap("diagnostics", monitor), AccActionsContainer.EXIT)
+
+orbit_mpi.MPI_Barrier(_mpi_comm)
+timer.start("tracking")
+
+lattice.trackBunch(bunch, actionContainer=action_container)
+
+orbit_mpi.MPI_Barrier(_mpi_comm)
+timer.stop("tracking")
+timings = timer.reduce()
+
+# Peak memory is the process high-water mark; take the largest rank.
+peak_memory = orbit_mpi.MPI_Allreduce(
+    (get_memory_usage()["peak"],), orbit_mpi.mpi_datatype.MPI_DOUBLE, orbit_mpi.mpi_op.MPI_MAX, _mpi_comm
+)[0]
+
+if _mpi_rank == 0:
+    info = {}
+    info["mpi_size"] = _mpi_size
+    info["bunch_size"] = cfg.bunch.size
+    info["grid"] = (cfg.grid.x, cfg.grid.y, cfg.grid.z)
+    info["nkicks"] = len(sc_nodes)
+    info["time_per_kick"] = timings["spacecharge"]["max"] / len(sc_nodes)
+    info["peak_memory"] = peak_memory
+    info["timings"] = timings
+
+    filename = os.path.join(output_dir, "info.pkl")
+    with open(filename, "wb") as file:
+        pickle.dump(info, file)
+
+    history = pd.DataFrame(monitor.history)
+    history.to_csv(os.path.join(output_dir, "history.csv"))
+
+logger.close()
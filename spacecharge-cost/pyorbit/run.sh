@@ -0,0 +1,5 @@
+#!/bin/bash
+
+# Grid / bunch size / rank sweep; extra arguments are passed as config overrides,
+# e.g. ./run.sh scan.sizes=[100000] scan.nprocs=[1]
+python scan.py "$@"
@@ -0,0 +1,42 @@
+"""Run run.py for every combination of grid, bunch size and number of MPI processes.
+
+Each run writes to outputs/scan/<grid>_n<size>_p<nprocs>. Config values can be
+overridden from the command line, e.g. `python scan.py scan.nprocs=[1]`; overrides
+outside `scan` (e.g. `lattice.periods=2`) are passed on to every run.
+"""
+import os
+import sys
+
+from omegaconf import OmegaConf
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../.."))
+from tools.runner import parse_overrides
+from tools.runner import run_script
+
+
+cfg = OmegaConf.merge(OmegaConf.load("../config.yaml"), OmegaConf.from_cli())
+run_overrides = parse_overrides(sys.argv[1:], exclude=["scan"])
+
+for nprocs in cfg.scan.nprocs:
+    for size in cfg.scan.sizes:
+        for (nx, ny, nz) in cfg.scan.grids:
+            name = f"{nx}x{ny}x{nz}_n{size}_p{nprocs}"
+            output_dir = os.path.join("outputs", "scan", name)
+            print(name)
+            sys.stdout.flush()
+
+            run_script(
+                ".",
+                "run.py",
+                overrides={
+                    **run_overrides,
+                    "grid.x": nx,
+                    "grid.y": ny,
+                    "grid.z": nz,
+                    "bunch.size": size,
+                    "output_dir": output_dir,
+                    "log.quiet": True,
+                },
+                nprocs=nprocs,
+                launcher=cfg.scan.launcher,
+            )
@@ -0,0 +1,54 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from tools.pyorbit.bunch_utils import get_beta_gamma
+from tools.pyorbit.bunch_utils import impactx_to_pyorbit
+from tools.pyorbit.bunch_utils import pyorbit_to_impactx
+
+
+KIN_ENERGY = 0.0025  # [GeV]
+MASS = 0.938272029  # [GeV / c^2]
+
+
+def get_particles(size: int = 1_000) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return rng.normal(scale=[1.00e-03, 1.00e-03, 1.00e-03, 1.00e-03, 5.00e-03, 1.00e-05], size=(size, 6))
+
+
+def test_pyorbit_to_impactx():
+    particles = get_particles()
+    beta0, gamma0 = get_beta_gamma(KIN_ENERGY, MASS)
+
+    # Transverse momenta from the velocity, pt from the energy deviation.
+    xp = particles[:, 1]
+    px = beta0 * xp / np.sqrt(1.0 - (beta0 * xp) ** 2) / (beta0 * gamma0)
+    pt = particles[:, 5] / (MASS * beta0 * gamma0)
+
+    coords = pyorbit_to_impactx(particles, KIN_ENERGY, MASS)
+    assert np.allclose(coords[:, 1], px, rtol=1.00e-12, atol=0.0)
+    assert np.allclose(coords[:, 4], particles[:, 4] / beta0, rtol=1.00e-12, atol=0.0)
+    assert np.allclose(coords[:, 5], pt, rtol=1.00e-12, atol=0.0)
+    assert np.array_equal(particles, get_particles())
+
+
+def test_round_trip():
+    particles = get_particles()
+
+    coords = pyorbit_to_impactx(particles, KIN_ENERGY, MASS)
+    assert np.allclose(impactx_to_pyorbit(coords, KIN_ENERGY, MASS), particles, rtol=1.00e-12, atol=0.0)
+
+    # In place and in blocks.
+    coords = particles.copy()
+    pyorbit_to_impactx(coords, KIN_ENERGY, MASS, out=coords, chunk_size=300)
+    assert np.allclose(coords, pyorbit_to_impactx(particles, KIN_ENERGY, MASS), rtol=1.00e-12, atol=0.0)
+    impactx_to_pyorbit(coords, KIN_ENERGY, MASS, out=coords, chunk_size=300)
+    assert np.allclose(coords, particles, rtol=1.00e-12, atol=0.0)
+
+    # Single precision.
+    coords = pyorbit_to_impactx(particles, KIN_ENERGY, MASS, dtype=np.float32)
+    assert coords.dtype == np.float32
+    coords = impactx_to_pyorbit(coords, KIN_ENERGY, MASS)
+    assert np.allclose(coords, particles, rtol=1.00e-05, atol=0.0)
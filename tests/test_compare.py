@@ -0,0 +1,48 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from tools.compare import compare_histories
+from tools.compare import normalize_history
+from tools.compare import unwrap_s
+
+
+def test_unwrap_s():
+    s = [0.0, 1.0, 2.0, 0.0, 1.0, 2.0, 0.5]
+    assert np.allclose(unwrap_s(s), [0.0, 1.0, 2.0, 2.0, 3.0, 4.0, 4.0])
+
+
+def test_normalize_history():
+    # Two periods of length 2 with node exit/entrance pairs at the same s.
+    s = [0.0, 1.0, 1.0, 2.0, 0.0, 1.0, 1.0, 2.0]
+    history = pd.DataFrame({"s": s, "sig_x": np.arange(8.0), "other": 0.0})
+    history = normalize_history(history, keys=["sig_x"])
+    assert list(history.columns) == ["s", "sig_x"]
+    assert np.allclose(history["s"], [0.0, 1.0, 2.0, 3.0, 4.0])
+    assert np.allclose(history["sig_x"], [0.0, 2.0, 4.0, 6.0, 7.0])
+
+
+def test_compare_histories():
+    # The same linear quantities sampled on different s grids.
+    s = np.linspace(0.0, 10.0, 101)
+    s_ref = np.linspace(-1.0, 11.0, 37)
+    history = pd.DataFrame({"s": s, "sig_x": 1.0 + s, "sig_y": 1.05 * (1.0 + s)})
+    history_ref = pd.DataFrame({"s": s_ref, "sig_x": 1.0 + s_ref, "sig_y": 1.0 + s_ref})
+
+    table = compare_histories(history, history_ref, tol={"sig_x": 1.00e-12, "sig_y": 0.04})
+    assert list(table.index) == ["sig_x", "sig_y"]
+    assert table.loc["sig_x", "max_dev"] < 1.00e-12
+    # sig_y is off by 5% everywhere, relative to the maximum of the reference.
+    assert table.loc["sig_y", "max_dev"] == pytest.approx(0.05)
+    assert list(table["passed"]) == [True, False]
+
+
+def test_compare_histories_no_overlap():
+    history = pd.DataFrame({"s": [0.0, 1.0], "sig_x": [1.0, 1.0]})
+    history_ref = pd.DataFrame({"s": [2.0, 3.0], "sig_x": [1.0, 1.0]})
+    with pytest.raises(ValueError):
+        compare_histories(history, history_ref)
@@ -0,0 +1,46 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from tools.hist import get_all_axes
+from tools.hist import get_edges
+from tools.hist import histogram_projections
+from tools.hist import load_cached
+
+
+def test_histogram_projections():
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(10_000, 4))
+    # Points on the upper edge are counted, points outside the limits are not.
+    x[0] = 3.0
+    x[1] = 3.5
+    bins = 10
+    limits = [(-3.0, 3.0)] * 4
+    edges = get_edges(bins, limits)
+
+    axes = get_all_axes(4)
+    hists = histogram_projections(x, axes, bins, limits, nthreads=2, chunk_size=1234)
+    for axis in axes:
+        expected, _ = np.histogramdd(x[:, axis], bins=[edges[k] for k in axis])
+        assert hists[axis].shape == (bins,) * len(axis)
+        assert np.array_equal(hists[axis], expected)
+
+
+def test_load_cached(tmp_path):
+    filename = tmp_path / "data.txt"
+    filename.write_text("data")
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"values": np.arange(3)}
+
+    for _ in range(2):
+        arrays = load_cached(str(filename), {"bins": 10}, compute)
+        assert np.array_equal(arrays["values"], np.arange(3))
+    assert len(calls) == 1
+
+    load_cached(str(filename), {"bins": 20}, compute)
+    assert len(calls) == 2
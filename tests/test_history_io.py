@@ -0,0 +1,79 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from tools.pyorbit.history_io import HistoryWriter
+from tools.pyorbit.history_io import load_history
+
+
+KEYS = ["s", "value"]
+
+# Writes 10 rows, flushes them as a checkpoint would, writes one more block of 4
+# rows and dies without closing the file.
+CRASH_SCRIPT = """
+import os
+import sys
+
+sys.path.append({root!r})
+from tools.pyorbit.history_io import HistoryWriter
+
+writer = HistoryWriter({filename!r}, ["s", "value"], block_size=4, flush_interval=None)
+for i in range(10):
+    writer.append([i, 2.0 * i])
+writer.flush()
+for i in range(10, 14):
+    writer.append([i, 2.0 * i])
+os._exit(1)
+"""
+
+
+def crash_writer(filename: str) -> None:
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+    script = CRASH_SCRIPT.format(root=root, filename=filename)
+    result = subprocess.run([sys.executable, "-c", script])
+    assert result.returncode == 1
+
+
+def test_resume_after_crash(tmp_path):
+    filename = str(tmp_path / "history.h5")
+    crash_writer(filename)
+    assert len(load_history(filename)) == 14
+
+    with HistoryWriter(filename, KEYS, block_size=4, flush_interval=None, resume=True) as writer:
+        assert writer.size == 14
+        writer.truncate(10)
+        for i in range(10, 15):
+            writer.append([i, 2.0 * i])
+
+    history = load_history(filename)
+    assert np.array_equal(history["s"], np.arange(15))
+    assert np.array_equal(history["value"], 2.0 * np.arange(15))
+    assert not os.path.exists(filename + ".tmp")
+
+
+def test_resume_twice(tmp_path):
+    filename = str(tmp_path / "history.h5")
+    crash_writer(filename)
+    for _ in range(2):
+        with HistoryWriter(filename, KEYS, block_size=4, resume=True) as writer:
+            writer.truncate(10)
+    assert len(load_history(filename)) == 10
+
+
+def test_resume_after_close(tmp_path):
+    filename = str(tmp_path / "history.h5")
+    with HistoryWriter(filename, KEYS, block_size=4) as writer:
+        for i in range(6):
+            writer.append([i, 2.0 * i])
+    inode = os.stat(filename).st_ino
+
+    with HistoryWriter(filename, KEYS, block_size=4, resume=True) as writer:
+        assert writer.size == 6
+        writer.append([6, 12.0])
+
+    # A cleanly closed file is appended to in place, not copied.
+    assert os.stat(filename).st_ino == inode
+    assert np.array_equal(load_history(filename)["s"], np.arange(7))
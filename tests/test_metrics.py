@@ -0,0 +1,38 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from tools.metrics import histogram_divergences
+from tools.metrics import moment_differences
+from tools.metrics import sliced_wasserstein
+
+
+def test_identical_sets():
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(5_000, 4))
+
+    assert sliced_wasserstein(x, x, nproj=20, seed=1) == 0.0
+    assert sliced_wasserstein(x, x.copy(), nproj=20, nbins=None, seed=1) == 0.0
+
+    table = histogram_divergences(x, x, bins=16)
+    assert np.allclose(table[["tv", "hellinger", "js"]].values, 0.0)
+
+    table = moment_differences(x, x)
+    assert np.allclose(table["diff"], 0.0)
+
+
+def test_disjoint_sets():
+    rng = np.random.default_rng(0)
+    x = rng.uniform(-2.0, -1.0, size=(5_000, 2))
+    y = rng.uniform(1.0, 2.0, size=(3_000, 2))
+
+    table = histogram_divergences(x, y, bins=16, limits=[(-2.0, 2.0)] * 2, dims=["x", "y"])
+    assert list(table.index) == ["x", "y", "x-y"]
+    assert np.allclose(table[["tv", "hellinger", "js"]].values, 1.0)
+
+    # For a shift, every projected quantile moves by the projected shift, which
+    # is at most its length in units of the rms size.
+    distance = sliced_wasserstein(x, x + 3.0, nproj=50, nbins=None, seed=1)
+    assert 0.0 < distance <= 3.0 * np.sqrt(2.0) / np.std(x, axis=0).min()
@@ -0,0 +1,45 @@
+import os
+
+import pandas as pd
+import matplotlib.pyplot as plt
+
+
+plt.rcParams["axes.linewidth"] = 1.25
+plt.rcParams["xtick.minor.visible"] = True
+plt.rcParams["ytick.minor.visible"] = True
+plt.rcParams["figure.constrained_layout.use"] = True
+plt.rcParams["savefig.dpi"] = 300
+
+
+output_dir = "outputs"
+
+# Keep the latest result for each configuration.
+table = pd.read_csv(os.path.join(output_dir, "results.csv"))
+keys = ["benchmark", "code", "bunch_size", "slices", "mpi_size", "threads"]
+table = table.drop_duplicates(keys, keep="last")
+
+# Fastest code per workload
+best = table.loc[table.groupby(["benchmark", "bunch_size", "slices"])["particle_steps_per_sec"].idxmax()]
+print(best[keys + ["particle_steps_per_sec", "kicks_per_sec"]].to_string(index=False))
+best.to_csv(os.path.join(output_dir, "best.csv"), index=False)
+
+# Throughput vs. bunch size
+for benchmark, group in table.groupby("benchmark"):
+    fig, ax = plt.subplots(figsize=(4.5, 3.0))
+    for (code, slices, mpi_size, threads), subgroup in group.groupby(["code", "slices", "mpi_size", "threads"]):
+        subgroup = subgroup.sort_values("bunch_size")
+        ax.plot(
+            subgroup["bunch_size"],
+            subgroup["particle_steps_per_sec"],
+            marker=".",
+            ls=("-" if code == "pyorbit" else "--"),
+            label=f"{code} s={slices} p={mpi_size} t={threads}",
+        )
+    ax.set_xscale("log")
+    ax.set_yscale("log")
+    ax.set_xlabel("Macroparticles")
+    ax.set_ylabel("Particle-steps / s")
+    ax.set_title(benchmark)
+    ax.legend(fontsize="xx-small")
+    plt.savefig(os.path.join(output_dir, f"fig_throughput_{benchmark}.png"))
+    plt.close()
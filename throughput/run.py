@@ -0,0 +1,71 @@
+"""Run PyORBIT and ImpactX on identical benchmark configurations and record throughput.
+
+Config values can be overridden from the command line, e.g.
+`python run.py codes=[impactx] sizes=[100000]`.
+"""
+import os
+import pickle
+import sys
+
+import pandas as pd
+from omegaconf import OmegaConf
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from tools.runner import run_script
+
+
+cfg = OmegaConf.merge(OmegaConf.load("config.yaml"), OmegaConf.from_cli())
+
+output_dir = os.path.abspath(cfg.output_dir)
+os.makedirs(output_dir, exist_ok=True)
+results_filename = os.path.join(output_dir, "results.csv")
+
+for benchmark, bench_cfg in cfg.benchmarks.items():
+    for code in cfg.codes:
+        for size in cfg.sizes:
+            for slices in bench_cfg.slices:
+                for parallel in cfg.parallel:
+                    if code == "pyorbit" and parallel.threads > 1:
+                        continue
+
+                    name = f"{benchmark}_{code}_n{size}_s{slices}_p{parallel.nprocs}_t{parallel.threads}"
+                    run_dir = os.path.join(output_dir, "runs", name)
+                    print(name)
+                    sys.stdout.flush()
+
+                    overrides = {}
+                    overrides.update(bench_cfg.overrides)
+                    overrides.update(cfg.code_overrides[code])
+                    overrides[bench_cfg.size_key] = size
+                    overrides[bench_cfg.slice_key] = slices
+                    overrides["output_dir"] = run_dir
+
+                    wall_time = run_script(
+                        os.path.join("..", benchmark, code),
+                        "run.py",
+                        overrides=overrides,
+                        nprocs=parallel.nprocs,
+                        launcher=cfg.launcher,
+                        env={"OMP_NUM_THREADS": str(parallel.threads)},
+                        log_filename=os.path.join(run_dir, "log.txt"),
+                    )
+
+                    with open(os.path.join(run_dir, "info.pkl"), "rb") as file:
+                        info = pickle.load(file)
+
+                    row = {}
+                    row["benchmark"] = benchmark
+                    row["code"] = code
+                    row["bunch_size"] = info["bunch_size"]
+                    row["slices"] = slices
+                    row["nsteps"] = info["nsteps"]
+                    row["nkicks"] = info["nkicks"]
+                    row["mpi_size"] = info["mpi_size"]
+                    row["threads"] = parallel.threads
+                    row["track_time"] = info["track_time"]
+                    row["wall_time"] = wall_time
+                    row["particle_steps_per_sec"] = info["bunch_size"] * info["nsteps"] / info["track_time"]
+                    row["kicks_per_sec"] = info["nkicks"] / info["track_time"]
+
+                    table = pd.DataFrame([row])
+                    table.to_csv(results_filename, mode="a", index=False, header=not os.path.exists(results_filename))
@@ -0,0 +1,321 @@
+"""Content-addressed cache of benchmark results.
+
+A run is identified by the SHA-256 hash of
+    - the resolved config (`../config.yaml` of the script plus overrides), without
+      keys that do not affect results (output directory, logging),
+    - the contents of its input files (lattice files, mstate, bunch files; files
+      named in the config are found automatically),
+    - the script source, its directory, the number of MPI ranks and the
+      launcher (sampled particles depend on the number of ranks),
+    - the installed versions of the simulation codes, and the git HEAD and
+      uncommitted diff of this repository.
+
+Results are written to a temporary directory through the script's `output_dir`
+override and moved to `<cache_dir>/<key[:2]>/<key>` when the run succeeds, so a
+crashed run never leaves a partial entry. A second run with the same key returns
+the stored directory without running anything. `ResultCache.evict` removes
+entries by age and keeps the cache under a size limit (least recently used first).
+
+Only scripts that write all their outputs to `output_dir` can be cached; the
+ImpactX scripts run in `output_dir`, so their `diags/` are cached too.
+
+Run from the repository root:
+
+    python -m tools.cache run fodo/pyorbit bunch.size=100000 --nprocs 4
+    python -m tools.cache list
+    python -m tools.cache evict --max-age 30 --max-size 100
+"""
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import time
+from importlib import metadata
+
+from omegaconf import DictConfig
+from omegaconf import OmegaConf
+
+from .runner import format_overrides
+from .runner import run_script
+
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+DEFAULT_CACHE_DIR = os.path.join(ROOT, ".cache", "results")
+EXCLUDE_KEYS = ["output_dir", "log"]
+PACKAGES = ["pyorbit", "impactx", "pyamrex", "numpy", "scipy", "h5py", "pandas", "omegaconf"]
+
+
+def hash_file(filename: str, block_size: int = 1 << 20) -> str:
+    sha = hashlib.sha256()
+    with open(filename, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def get_code_versions() -> dict:
+    """Return installed package versions and the git state of this repository."""
+    versions = {}
+    for package in PACKAGES:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            pass
+
+    try:
+        head = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True)
+        diff = subprocess.run(["git", "diff", "HEAD"], cwd=ROOT, capture_output=True, check=True)
+        versions["git_head"] = head.stdout.strip()
+        versions["git_diff"] = hashlib.sha256(diff.stdout).hexdigest()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    return versions
+
+
+def find_input_files(cfg: DictConfig, directory: str) -> list[str]:
+    """Return config string values that name existing files (relative to `directory`)."""
+    filenames = []
+
+    def visit(node) -> None:
+        if isinstance(node, dict):
+            for value in node.values():
+                visit(value)
+        elif isinstance(node, list):
+            for value in node:
+                visit(value)
+        elif isinstance(node, str):
+            filename = os.path.join(directory, node)
+            if os.path.isfile(filename):
+                filenames.append(os.path.normpath(filename))
+
+    visit(OmegaConf.to_container(cfg, resolve=True))
+    return sorted(set(filenames))
+
+
+def load_config(directory: str, overrides: dict = None) -> DictConfig:
+    """Return the config a script in `directory` would run with."""
+    cfg = OmegaConf.load(os.path.join(directory, "..", "config.yaml"))
+    return OmegaConf.merge(cfg, OmegaConf.from_dotlist(format_overrides(overrides or {})))
+
+
+def get_cache_key(
+    cfg: DictConfig,
+    input_files: list[str] = None,
+    script: str = None,
+    exclude: list[str] = None,
+    directory: str = None,
+    nprocs: int = 1,
+    launcher: str = None,
+) -> tuple[str, dict]:
+    """Return the cache key of a run and the record it was computed from."""
+    exclude = EXCLUDE_KEYS if exclude is None else exclude
+    config = OmegaConf.to_container(cfg, resolve=True)
+    for key in exclude:
+        config.pop(key, None)
+
+    record = {}
+    record["config"] = config
+    record["inputs"] = {os.path.basename(filename): hash_file(filename) for filename in (input_files or [])}
+    record["script"] = hash_file(script) if script else None
+    record["directory"] = os.path.relpath(os.path.abspath(directory), ROOT) if directory else None
+    record["nprocs"] = nprocs
+    record["launcher"] = launcher
+    record["versions"] = get_code_versions()
+
+    text = json.dumps(record, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest(), record
+
+
+class ResultCache:
+    """Directory of cached run outputs keyed by content hash.
+
+    Args:
+        directory: cache root.
+        max_age: evict entries not used for this many days (None: no limit).
+        max_size: keep the total size below this many GB (None: no limit).
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_age: float = None, max_size: float = None) -> None:
+        self.directory = directory
+        self.max_age = max_age
+        self.max_size = max_size
+
+    def get_path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def lookup(self, key: str) -> str:
+        """Return the entry directory for `key` or None. Marks the entry as used."""
+        path = self.get_path(key)
+        filename = os.path.join(path, "cache.json")
+        if not os.path.exists(filename):
+            return None
+        os.utime(filename)
+        return path
+
+    def get_temp_path(self, key: str) -> str:
+        path = os.path.join(self.directory, "tmp", f"{key}.{os.getpid()}")
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        return path
+
+    def commit(self, key: str, temp_path: str, record: dict) -> str:
+        """Move a finished run into the cache and return its entry directory."""
+        with open(os.path.join(temp_path, "cache.json"), "w") as file:
+            json.dump({"key": key, "created": time.time(), **record}, file, indent=2, default=str)
+
+        path = self.get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            # Another process stored the same run first.
+            shutil.rmtree(temp_path)
+            return path
+        os.rename(temp_path, path)
+        return path
+
+    def entries(self) -> list[dict]:
+        """Return {"key", "path", "last_used", "size"} for all entries."""
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for prefix in sorted(os.listdir(self.directory)):
+            if prefix == "tmp":
+                continue
+            for key in sorted(os.listdir(os.path.join(self.directory, prefix))):
+                path = os.path.join(self.directory, prefix, key)
+                filename = os.path.join(path, "cache.json")
+                if not os.path.exists(filename):
+                    continue
+                size = 0
+                for root, dirs, files in os.walk(path):
+                    size += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+                entries.append({"key": key, "path": path, "last_used": os.path.getmtime(filename), "size": size})
+        return entries
+
+    def evict(self, max_age: float = None, max_size: float = None, keep: list[str] = None) -> list[str]:
+        """Remove old entries, then least recently used ones above the size limit.
+
+        Entries whose keys are in `keep` are never removed (they still count
+        toward the size limit). Returns the removed keys. Limits default to those
+        given at construction.
+        """
+        max_age = self.max_age if max_age is None else max_age
+        max_size = self.max_size if max_size is None else max_size
+        keep = set(keep or [])
+
+        entries = sorted(self.entries(), key=lambda entry: entry["last_used"])
+        removed = []
+        if max_age is not None:
+            cutoff = time.time() - max_age * 86400.0
+            for entry in entries:
+                if entry["last_used"] < cutoff and entry["key"] not in keep:
+                    removed.append(entry)
+        if max_size is not None:
+            kept = [entry for entry in entries if entry not in removed]
+            total = sum(entry["size"] for entry in kept)
+            for entry in kept:
+                if total <= max_size * 1.00e+09:
+                    break
+                if entry["key"] in keep:
+                    continue
+                removed.append(entry)
+                total -= entry["size"]
+
+        for entry in removed:
+            shutil.rmtree(entry["path"])
+            if not os.listdir(os.path.dirname(entry["path"])):
+                os.rmdir(os.path.dirname(entry["path"]))
+        return [entry["key"] for entry in removed]
+
+
+def run_cached(
+    directory: str,
+    script: str = "run.py",
+    overrides: dict = None,
+    nprocs: int = 1,
+    launcher: str = None,
+    input_files: list[str] = None,
+    cache: ResultCache = None,
+) -> tuple[str, bool]:
+    """Run a benchmark script unless an identical run is cached.
+
+    Returns the directory holding the run outputs and whether it was a cache hit.
+    """
+    cache = cache or ResultCache()
+    overrides = dict(overrides or {})
+    overrides.pop("output_dir", None)
+
+    cfg = load_config(directory, overrides)
+    input_files = sorted(set(find_input_files(cfg, directory) + list(input_files or [])))
+    key, record = get_cache_key(
+        cfg,
+        input_files,
+        script=os.path.join(directory, script),
+        directory=directory,
+        nprocs=nprocs,
+        launcher=launcher,
+    )
+
+    path = cache.lookup(key)
+    if path is not None:
+        return path, True
+
+    temp_path = cache.get_temp_path(key)
+    try:
+        record["wall_time"] = run_script(
+            directory,
+            script,
+            overrides={**overrides, "output_dir": temp_path},
+            nprocs=nprocs,
+            launcher=launcher,
+            log_filename=os.path.join(temp_path, "log.txt"),
+        )
+    except BaseException:
+        shutil.rmtree(temp_path, ignore_errors=True)
+        raise
+    path = cache.commit(key, temp_path, record)
+    # The new entry is returned to the caller, so it must survive eviction.
+    cache.evict(keep=[key])
+    return path, False
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Content-addressed cache of benchmark results.")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--max-age", type=float, default=None, help="evict entries unused for this many days")
+    parser.add_argument("--max-size", type=float, default=None, help="evict down to this many GB")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parser_run = subparsers.add_parser("run", help="run a benchmark script through the cache")
+    parser_run.add_argument("directory", help="script directory, e.g. fodo/pyorbit")
+    parser_run.add_argument("--script", default="run.py")
+    parser_run.add_argument("--nprocs", type=int, default=1)
+    parser_run.add_argument("--launcher", default=None)
+    parser_run.add_argument("--input", action="append", default=[], help="additional input file")
+    subparsers.add_parser("list", help="list cache entries")
+    subparsers.add_parser("evict", help="evict entries by age and size")
+    args, cli_overrides = parser.parse_known_args()
+
+    cache = ResultCache(args.cache_dir, max_age=args.max_age, max_size=args.max_size)
+
+    if args.command == "run":
+        overrides = dict(arg.split("=", 1) for arg in cli_overrides)
+        path, hit = run_cached(
+            args.directory,
+            args.script,
+            overrides=overrides,
+            nprocs=args.nprocs,
+            launcher=args.launcher,
+            input_files=args.input,
+            cache=cache,
+        )
+        print("{} {}".format("hit" if hit else "stored", path))
+    elif args.command == "list":
+        for entry in cache.entries():
+            last_used = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["last_used"]))
+            print("{}  {}  {:10.1f} MB".format(entry["key"], last_used, entry["size"] / 1.00e+06))
+    elif args.command == "evict":
+        for key in cache.evict():
+            print(f"evicted {key}")
@@ -0,0 +1,166 @@
+"""Code-to-code comparison of rms histories.
+
+PyORBIT records `history.csv` at node entrances and exits (restarting `s` at
+each lattice period), while ImpactX writes `reduced_beam_characteristics.0.0`
+once per slice. Both are loaded into a common schema (`KEYS`, SI units), `s` is
+unwrapped across periods and duplicate samples are dropped, and the histories
+are interpolated onto a shared `s` grid over their overlap. For each quantity,
+the deviation from the reference is normalized by the maximum absolute value of
+the reference, and its maximum and rms are compared to a tolerance.
+
+Run from the repository root:
+
+    python -m tools.compare fodo/pyorbit/outputs/history.csv fodo/impactx/diags --tol 0.05
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from .pyorbit.history_io import load_history
+
+
+KEYS = ["sig_x", "sig_y", "sig_z", "emittance_x", "emittance_y", "emittance_z"]
+
+
+def unwrap_s(s: np.ndarray) -> np.ndarray:
+    """Make path length monotonic when it restarts (e.g. at each lattice period).
+
+    At each decrease, later values are shifted so the restart coincides with the
+    previous sample.
+    """
+    s = np.asarray(s, dtype=float)
+    jumps = np.zeros_like(s)
+    jumps[1:] = np.where(np.diff(s) < 0.0, s[:-1] - s[1:], 0.0)
+    return s + np.cumsum(jumps)
+
+
+def normalize_history(history: pd.DataFrame, keys: list[str] = None) -> pd.DataFrame:
+    """Return the common schema: unwrapped, sorted, unique `s` and the given keys."""
+    keys = KEYS if keys is None else keys
+    history = history[["s"] + [key for key in keys if key in history]].copy()
+    history["s"] = unwrap_s(history["s"].values)
+    # The exit of one node and the entrance of the next are recorded at the same s.
+    history = history.drop_duplicates(subset="s", keep="last")
+    history = history.sort_values("s", kind="stable")
+    return history.reset_index(drop=True)
+
+
+def load_pyorbit_history(filename: str, keys: list[str] = None) -> pd.DataFrame:
+    """Load a PyORBIT `history.csv` or `history.h5` into the common schema."""
+    history = load_history(filename)
+    return normalize_history(history, keys)
+
+
+def load_impactx_history(directory: str, keys: list[str] = None) -> pd.DataFrame:
+    """Load ImpactX reduced diagnostics from `directory` (e.g. `diags`) into the common schema."""
+    history = pd.read_csv(os.path.join(directory, "reduced_beam_characteristics.0.0"), delimiter=" ")
+    history_ref = pd.read_csv(os.path.join(directory, "ref_particle.0.0"), delimiter=" ")
+    history["sig_z"] = history["sig_t"] * history_ref["beta"]
+    history["emittance_z"] = history["emittance_t"]
+    return normalize_history(history, keys)
+
+
+def get_common_grid(histories: list[pd.DataFrame], npoints: int = None) -> np.ndarray:
+    """Return a uniform `s` grid over the overlap of all histories.
+
+    The default number of points is the largest number of samples in the overlap.
+    """
+    smin = max(history["s"].min() for history in histories)
+    smax = min(history["s"].max() for history in histories)
+    if smax <= smin:
+        raise ValueError(f"Histories do not overlap in s (overlap [{smin}, {smax}])")
+    if npoints is None:
+        npoints = max(np.count_nonzero(history["s"].between(smin, smax)) for history in histories)
+    return np.linspace(smin, smax, max(npoints, 2))
+
+
+def resample(history: pd.DataFrame, s: np.ndarray, keys: list[str] = None) -> pd.DataFrame:
+    """Linearly interpolate a normalized history onto `s`."""
+    keys = [key for key in history.columns if key != "s"] if keys is None else keys
+    data = {"s": s}
+    for key in keys:
+        data[key] = np.interp(s, history["s"].values, history[key].values)
+    return pd.DataFrame(data)
+
+
+def compare_histories(
+    history: pd.DataFrame,
+    history_ref: pd.DataFrame,
+    keys: list[str] = None,
+    tol: float | dict = 0.05,
+    npoints: int = None,
+) -> pd.DataFrame:
+    """Compare two normalized histories on a common grid.
+
+    Args:
+        history: history to check.
+        history_ref: reference history.
+        keys: quantities to compare (default: all keys present in both).
+        tol: maximum allowed relative deviation, or {key: tolerance}.
+        npoints: number of grid points (see `get_common_grid`).
+
+    Returns:
+        Table indexed by key with columns "max_dev", "rms_dev", "tolerance",
+        "passed". Deviations are relative to the maximum absolute value of the
+        reference over the grid.
+    """
+    if keys is None:
+        keys = [key for key in KEYS if key in history and key in history_ref]
+
+    s = get_common_grid([history, history_ref], npoints)
+    values = resample(history, s, keys)
+    values_ref = resample(history_ref, s, keys)
+
+    rows = []
+    for key in keys:
+        scale = max(np.max(np.abs(values_ref[key])), 1.00e-300)
+        deviation = np.abs(values[key] - values_ref[key]) / scale
+        key_tol = tol.get(key, np.inf) if isinstance(tol, dict) else tol
+        row = {}
+        row["key"] = key
+        row["max_dev"] = float(np.max(deviation))
+        row["rms_dev"] = float(np.sqrt(np.mean(deviation**2)))
+        row["tolerance"] = key_tol
+        row["passed"] = row["max_dev"] <= key_tol
+        rows.append(row)
+    return pd.DataFrame(rows).set_index("key")
+
+
+def format_table(table: pd.DataFrame) -> str:
+    """Return a compact text version of a comparison table."""
+    lines = ["{:<14} {:>10} {:>10} {:>10}  {}".format("key", "max_dev", "rms_dev", "tol", "status")]
+    for key, row in table.iterrows():
+        status = "PASS" if row["passed"] else "FAIL"
+        lines.append(
+            "{:<14} {:>10.3e} {:>10.3e} {:>10.3e}  {}".format(
+                key, row["max_dev"], row["rms_dev"], row["tolerance"], status
+            )
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Compare PyORBIT and ImpactX rms histories.")
+    parser.add_argument("pyorbit", help="PyORBIT history.csv or history.h5")
+    parser.add_argument("impactx", help="ImpactX diagnostics directory")
+    parser.add_argument("--keys", nargs="+", default=None)
+    parser.add_argument("--tol", type=float, default=0.05)
+    parser.add_argument("--npoints", type=int, default=None)
+    parser.add_argument("--output", default=None, help="write the table to this CSV file")
+    args = parser.parse_args()
+
+    table = compare_histories(
+        load_pyorbit_history(args.pyorbit, args.keys),
+        load_impactx_history(args.impactx, args.keys),
+        keys=args.keys,
+        tol=args.tol,
+        npoints=args.npoints,
+    )
+    print(format_table(table))
+    if args.output:
+        table.to_csv(args.output)
+    sys.exit(0 if table["passed"].all() else 1)
@@ -0,0 +1,138 @@
+"""Single-pass projection histograms with an on-disk cache.
+
+`histogram_projections` bins all requested 1D and 2D projections of an (n, d)
+array on a uniform grid in one pass over the data: each chunk of particles is
+converted to per-axis bin indices once, and every projection is then a
+`np.bincount` of combined indices. Chunks are processed by a thread pool, since
+NumPy releases the GIL for large array operations.
+
+`load_cached` stores derived arrays (histograms, moments, ...) in an `.npz` file
+next to the source file, keyed on the computation parameters and the source
+file's size and modification time. On a cache hit the particles are never
+loaded, so analysis scripts only pay for binning once per snapshot.
+"""
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+import numpy as np
+
+
+def get_edges(bins: int, limits: list[tuple[float, float]]) -> list[np.ndarray]:
+    """Return the bin edges along each axis."""
+    return [np.linspace(lo, hi, bins + 1) for (lo, hi) in limits]
+
+
+def get_all_axes(ndim: int) -> list[tuple[int, ...]]:
+    """Return all 1D and 2D projection axes of an ndim-dimensional array."""
+    axes = [(i,) for i in range(ndim)]
+    axes += [(i, j) for i in range(ndim) for j in range(i + 1, ndim)]
+    return axes
+
+
+def _bin_indices(x: np.ndarray, bins: int, limits: list[tuple[float, float]]) -> tuple[np.ndarray, np.ndarray]:
+    # Uniform bins with the last edge included, as in np.histogramdd.
+    lo = np.array([limit[0] for limit in limits])
+    hi = np.array([limit[1] for limit in limits])
+    idx = np.floor((x - lo) * (bins / (hi - lo))).astype(np.int64)
+    idx[x == hi] = bins - 1
+    valid = (idx >= 0) & (idx < bins)
+    return idx, valid
+
+
+def _histogram_chunk(x: np.ndarray, axes: list[tuple[int, ...]], bins: int, limits: list) -> list[np.ndarray]:
+    idx, valid = _bin_indices(x, bins, limits)
+    counts = []
+    for axis in axes:
+        mask = np.all(valid[:, axis], axis=1)
+        flat = np.zeros(np.count_nonzero(mask), dtype=np.int64)
+        for k in axis:
+            flat = flat * bins + idx[mask, k]
+        counts.append(np.bincount(flat, minlength=bins ** len(axis)))
+    return counts
+
+
+def histogram_projections(
+    x: np.ndarray,
+    axes: list[tuple[int, ...]],
+    bins: int,
+    limits: list[tuple[float, float]],
+    nthreads: int = None,
+    chunk_size: int = 250_000,
+) -> dict[tuple[int, ...], np.ndarray]:
+    """Histogram several projections of `x` in one pass.
+
+    Args:
+        x: (n, d) array.
+        axes: projection axes, e.g. [(0,), (0, 1), (2, 3)].
+        bins: number of bins along each axis.
+        limits: (min, max) along each of the d axes.
+        nthreads: number of threads (default: number of CPUs).
+        chunk_size: number of particles binned at a time per thread.
+
+    Returns:
+        {axis: counts} with counts of shape (bins,) * len(axis).
+    """
+    axes = [tuple(axis) for axis in axes]
+    starts = range(0, max(x.shape[0], 1), chunk_size)
+
+    def run(start: int) -> list[np.ndarray]:
+        return _histogram_chunk(x[start : start + chunk_size], axes, bins, limits)
+
+    totals = [np.zeros(bins ** len(axis), dtype=np.int64) for axis in axes]
+    with ThreadPoolExecutor(max_workers=nthreads) as executor:
+        for counts in executor.map(run, starts):
+            for total, count in zip(totals, counts):
+                total += count
+    return {axis: total.reshape((bins,) * len(axis)) for axis, total in zip(axes, totals)}
+
+
+def load_cached(filename: str, params: dict, compute: Callable[[], dict]) -> dict[str, np.ndarray]:
+    """Return arrays derived from `filename`, computing and caching them if needed.
+
+    Args:
+        filename: source file; the cache is written next to it.
+        params: JSON-serializable parameters of the computation (part of the key).
+        compute: function returning {name: array}; called only on a cache miss.
+    """
+    stat = os.stat(filename)
+    key = json.dumps({"params": params, "size": stat.st_size, "mtime": stat.st_mtime_ns}, sort_keys=True)
+    key = hashlib.sha256(key.encode()).hexdigest()[:16]
+    cache_filename = f"{filename}.cache-{key}.npz"
+
+    if os.path.exists(cache_filename):
+        with np.load(cache_filename) as data:
+            return dict(data)
+
+    arrays = compute()
+    np.savez(cache_filename, **arrays)
+    return arrays
+
+
+def cached_projections(
+    filename: str,
+    load: Callable[[], np.ndarray],
+    axes: list[tuple[int, ...]],
+    bins: int,
+    limits: list[tuple[float, float]],
+    params: dict = None,
+    nthreads: int = None,
+) -> dict[tuple[int, ...], np.ndarray]:
+    """Return projection histograms of the particles stored in `filename`, cached on disk.
+
+    `load` returns the (n, d) array to bin (after any unit conversion) and is only
+    called on a cache miss. `params` must describe anything `load` does that
+    changes the data (e.g. the step of a monitor file, units).
+    """
+    axes = [tuple(int(k) for k in axis) for axis in axes]
+    limits = [(float(lo), float(hi)) for (lo, hi) in limits]
+
+    def compute() -> dict[str, np.ndarray]:
+        hists = histogram_projections(load(), axes, bins, limits, nthreads=nthreads)
+        return {"_".join(str(k) for k in axis): values for axis, values in hists.items()}
+
+    cache_params = {"kind": "projections", "axes": axes, "bins": bins, "limits": limits, **(params or {})}
+    arrays = load_cached(filename, cache_params, compute)
+    return {axis: arrays["_".join(str(k) for k in axis)] for axis in axes}
@@ -0,0 +1,88 @@
+import os
+
+import numpy as np
+import amrex.space3d as amr
+
+from tools.pyorbit.bunch_gen import get_local_size
+from tools.pyorbit.bunch_io import load_snapshot
+from tools.pyorbit.bunch_io import read_dat
+from tools.pyorbit.bunch_io import read_dat_header
+from tools.pyorbit.bunch_utils import pyorbit_to_impactx
+
+
+def to_podvector(values: np.ndarray) -> amr.PODVector_real_std:
+    """Copy a 1D array into a new PODVector in one shot (no per-element push_back)."""
+    podv = amr.PODVector_real_std()
+    podv.reserve(len(values))
+    podv.resize(len(values))
+    podv.to_numpy(copy=False)[:] = values
+    return podv
+
+
+def add_particles(
+    particle_container,
+    dx: np.ndarray,
+    dy: np.ndarray,
+    dt: np.ndarray,
+    dpx: np.ndarray,
+    dpy: np.ndarray,
+    dpt: np.ndarray,
+    qm_eev: float,
+    total_charge: float,
+) -> None:
+    """Add particles to an ImpactX particle container from coordinate arrays.
+
+    Args:
+        particle_container: `sim.particle_container()`.
+        dx, dy, dt, dpx, dpy, dpt: ImpactX coordinates relative to the reference particle.
+        qm_eev: charge/mass ratio [e / eV].
+        total_charge: total bunch charge [C].
+    """
+    particle_container.add_n_particles(
+        to_podvector(dx),
+        to_podvector(dy),
+        to_podvector(dt),
+        to_podvector(dpx),
+        to_podvector(dpy),
+        to_podvector(dpt),
+        qm_eev,
+        total_charge,
+    )
+
+
+def add_particles_from_pyorbit(particle_container, filename: str, qm_eev: float, total_charge: float) -> None:
+    """Add the particles of a PyORBIT snapshot (.h5) or dumpBunch (.dat) file.
+
+    Coordinates are converted using the mass and energy stored in the file. Each
+    MPI rank adds its own contiguous share of the particles (read from a memory
+    map for snapshots) with the same share of the total charge, as ImpactX does
+    when it samples a distribution.
+    """
+    if os.path.splitext(filename)[1] == ".dat":
+        coords = read_dat(filename)
+        attrs = read_dat_header(filename)
+    else:
+        snapshot = load_snapshot(filename)
+        coords = snapshot["coords"]
+        attrs = snapshot["attrs"]
+
+    rank = amr.ParallelDescriptor.MyProc()
+    nprocs = amr.ParallelDescriptor.NProcs()
+    size = coords.shape[0]
+    start = rank * (size // nprocs) + min(rank, size % nprocs)
+    stop = start + get_local_size(size, rank, nprocs)
+    coords = np.array(coords[start:stop])
+    local_charge = total_charge * (stop - start) / max(size, 1)
+
+    coords = pyorbit_to_impactx(coords, kin_energy=attrs["sync_kin_energy"], mass=attrs["mass"])
+    add_particles(
+        particle_container,
+        coords[:, 0],
+        coords[:, 2],
+        coords[:, 4],
+        coords[:, 1],
+        coords[:, 3],
+        coords[:, 5],
+        qm_eev,
+        local_charge,
+    )
@@ -0,0 +1,98 @@
+"""Lazy reader for ImpactX BeamMonitor output (openPMD, HDF5 backend).
+
+Steps are read one at a time, only the requested phase space components are
+loaded, and particle subsets are read through HDF5 hyperslab selections. Arrays
+are returned as (n, ndim) with columns in the order of the PyORBIT snapshots
+converted to ImpactX units: (x, px, y, py, t, pt).
+"""
+from typing import Iterator
+
+import h5py
+import numpy as np
+
+
+DIMS = ["x", "px", "y", "py", "t", "pt"]
+
+RECORDS = {
+    "x": ("position", "x"),
+    "px": ("momentum", "x"),
+    "y": ("position", "y"),
+    "py": ("momentum", "y"),
+    "t": ("position", "t"),
+    "pt": ("momentum", "t"),
+}
+
+
+def get_monitor_steps(filename: str) -> list[int]:
+    """Return the step numbers in a monitor file in increasing order."""
+    with h5py.File(filename, "r") as file:
+        return sorted(int(key) for key in file["data"].keys())
+
+
+def _get_selection(size: int, stride: int, nsamp: int, rng: np.random.Generator):
+    if nsamp is not None and nsamp < size:
+        return np.sort(rng.choice(size, nsamp, replace=False))
+    return slice(None, None, stride)
+
+
+def read_monitor_step(
+    file: h5py.File,
+    step: int,
+    dims: list[str] = None,
+    stride: int = 1,
+    nsamp: int = None,
+    rng: np.random.Generator = None,
+    species: str = "beam",
+) -> np.ndarray:
+    """Read particle coordinates of one step from an open monitor file.
+
+    Args:
+        file: open h5py file.
+        step: step number.
+        dims: components to load, a subset of `DIMS` (default: all, in `DIMS` order).
+        stride: read every `stride`-th particle.
+        nsamp: read a random subset of `nsamp` particles instead (overrides `stride`).
+        rng: random number generator for `nsamp`.
+        species: openPMD particle species name.
+    """
+    if dims is None:
+        dims = DIMS
+    if rng is None:
+        rng = np.random.default_rng()
+
+    group = file["data"][str(step)]["particles"][species]
+    size = group[RECORDS[dims[0]][0]][RECORDS[dims[0]][1]].shape[0]
+    selection = _get_selection(size, stride, nsamp, rng)
+
+    columns = []
+    for dim in dims:
+        record, component = RECORDS[dim]
+        dataset = group[record][component]
+        values = dataset[selection]
+        unit_si = dataset.attrs.get("unitSI", 1.0)
+        if unit_si != 1.0:
+            values = values * unit_si
+        columns.append(values)
+    return np.stack(columns, axis=-1)
+
+
+def iter_monitor_steps(
+    filename: str,
+    steps: list[int] = None,
+    dims: list[str] = None,
+    stride: int = 1,
+    nsamp: int = None,
+    seed: int = None,
+    species: str = "beam",
+) -> Iterator[tuple[int, np.ndarray]]:
+    """Yield (step, coords) for each step in a monitor file, one step at a time.
+
+    See `read_monitor_step` for arguments. `steps` selects a subset of steps
+    (default: all, in increasing order).
+    """
+    rng = np.random.default_rng(seed)
+    with h5py.File(filename, "r") as file:
+        if steps is None:
+            steps = sorted(int(key) for key in file["data"].keys())
+        for step in steps:
+            yield (step, read_monitor_step(file, step, dims, stride, nsamp, rng, species))
@@ -0,0 +1,302 @@
+"""Distances between two particle distributions.
+
+Three families of metrics compare an (n, d) particle array `x` to a reference `y`
+(the two may have different sizes):
+
+- `histogram_divergences`: total variation, Hellinger and Jensen-Shannon
+  distances between 1D/2D projection histograms on a shared grid (binned with
+  `tools.hist.histogram_projections`).
+- `sliced_wasserstein`: the p-Wasserstein distance between 1D projections onto
+  random directions, averaged over directions. Coordinates are scaled by the rms
+  sizes of the reference so that all dimensions contribute.
+- `moment_differences`: differences of all central moments up to 4th order, in
+  units of the reference rms sizes.
+
+All metrics process particles in chunks; histograms and projections are spread
+over threads. `compare_distributions` optionally subsamples both sets for the
+sliced Wasserstein distance and moments, whose cost grows with the number of
+particles times the number of directions or moments; a few 1e5 particles are
+usually enough, since the statistical noise of 1e6-particle sets is of the same
+order as the subsampling error.
+"""
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .hist import get_all_axes
+from .hist import histogram_projections
+
+
+def subsample(x: np.ndarray, size: int, rng: np.random.Generator = None) -> np.ndarray:
+    """Return `size` randomly selected rows of x (or x if it has no more rows)."""
+    if size is None or size >= x.shape[0]:
+        return x
+    if rng is None:
+        rng = np.random.default_rng()
+    return x[np.sort(rng.choice(x.shape[0], size, replace=False))]
+
+
+def get_limits(x: np.ndarray, y: np.ndarray, nsig: float = 5.0) -> list[tuple[float, float]]:
+    """Return limits covering +/- nsig rms of both distributions around the reference mean."""
+    center = np.mean(y, axis=0)
+    width = nsig * np.maximum(np.std(x, axis=0), np.std(y, axis=0))
+    return list(zip(center - width, center + width))
+
+
+def histogram_divergences(
+    x: np.ndarray,
+    y: np.ndarray,
+    axes: list[tuple[int, ...]] = None,
+    bins: int = 64,
+    limits: list[tuple[float, float]] = None,
+    dims: list[str] = None,
+    nthreads: int = None,
+) -> pd.DataFrame:
+    """Return histogram distances for each projection.
+
+    Args:
+        x, y: (n, d) and (m, d) arrays.
+        axes: projection axes (default: all 1D and 2D projections).
+        bins: number of bins along each axis.
+        limits: (min, max) along each axis (default: `get_limits`).
+        dims: dimension names used to label the rows.
+        nthreads: number of threads for binning.
+
+    Returns:
+        Table indexed by projection with columns "tv" (total variation distance),
+        "hellinger" (Hellinger distance) and "js" (Jensen-Shannon divergence,
+        base 2). All are 0 for identical and 1 for disjoint histograms.
+    """
+    ndim = x.shape[1]
+    axes = get_all_axes(ndim) if axes is None else [tuple(axis) for axis in axes]
+    limits = get_limits(x, y) if limits is None else limits
+    dims = [str(k) for k in range(ndim)] if dims is None else dims
+
+    hists_x = histogram_projections(x, axes, bins, limits, nthreads=nthreads)
+    hists_y = histogram_projections(y, axes, bins, limits, nthreads=nthreads)
+
+    rows = []
+    for axis in axes:
+        p = hists_x[axis].ravel() / max(np.sum(hists_x[axis]), 1)
+        q = hists_y[axis].ravel() / max(np.sum(hists_y[axis]), 1)
+        m = 0.5 * (p + q)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            kl_p = np.where(p > 0.0, p * np.log2(p / m), 0.0)
+            kl_q = np.where(q > 0.0, q * np.log2(q / m), 0.0)
+
+        row = {}
+        row["axis"] = "-".join(dims[k] for k in axis)
+        row["tv"] = 0.5 * np.sum(np.abs(p - q))
+        row["hellinger"] = np.sqrt(max(0.0, 1.0 - np.sum(np.sqrt(p * q))))
+        row["js"] = 0.5 * (np.sum(kl_p) + np.sum(kl_q))
+        rows.append(row)
+    return pd.DataFrame(rows).set_index("axis")
+
+
+def _get_quantiles(values: np.ndarray, levels: np.ndarray, nbins: int = None) -> np.ndarray:
+    # Quantile functions of the columns of `values` at `levels` in (0, 1). With
+    # `nbins`, the CDF is binned on a fine grid between the column min and max
+    # (one bincount for all columns) instead of sorting.
+    n, ncols = values.shape
+    if nbins is None:
+        values = np.sort(values, axis=0)
+        index = levels * n - 0.5
+        return np.stack([np.interp(index, np.arange(n), values[:, j]) for j in range(ncols)], axis=-1)
+
+    vmin = np.min(values, axis=0)
+    vmax = np.max(values, axis=0)
+    width = np.where(vmax > vmin, (vmax - vmin) / nbins, 1.0)
+    idx = np.minimum(((values - vmin) / width).astype(np.int64), nbins - 1)
+    idx += nbins * np.arange(ncols)
+    counts = np.bincount(idx.ravel(), minlength=nbins * ncols).reshape(ncols, nbins)
+    cdf = np.zeros((ncols, nbins + 1))
+    cdf[:, 1:] = np.cumsum(counts, axis=1) / n
+
+    quantiles = np.zeros((levels.size, ncols))
+    for j in range(ncols):
+        edges = vmin[j] + width[j] * np.arange(nbins + 1)
+        # Skip empty bins so the CDF is strictly increasing where it is inverted.
+        keep = np.concatenate([[True], counts[j] > 0])
+        quantiles[:, j] = np.interp(levels, cdf[j, keep], edges[keep])
+    return quantiles
+
+
+def sliced_wasserstein(
+    x: np.ndarray,
+    y: np.ndarray,
+    nproj: int = 100,
+    p: int = 2,
+    scale: bool = True,
+    nbins: int = 8192,
+    nlevels: int = 1000,
+    seed: int = None,
+    chunk_size: int = 16,
+    nthreads: int = None,
+) -> float:
+    """Return the sliced p-Wasserstein distance between two particle sets.
+
+    Args:
+        x, y: (n, d) and (m, d) arrays.
+        nproj: number of random projection directions.
+        p: order of the Wasserstein distance.
+        scale: divide coordinates by the rms sizes of `y` (result in units of
+            the rms size); otherwise use the raw coordinates.
+        nbins: number of bins used to approximate the 1D quantile functions
+            (None to sort the projections, which is exact but slower).
+        nlevels: number of quantile levels at which the 1D distributions are compared.
+        seed: seed for the random directions.
+        chunk_size: number of directions projected at a time.
+        nthreads: number of threads processing chunks of directions.
+    """
+    if scale:
+        sigma = np.std(y, axis=0)
+        sigma[sigma == 0.0] = 1.0
+    else:
+        sigma = np.ones(y.shape[1])
+
+    rng = np.random.default_rng(seed)
+    directions = rng.normal(size=(nproj, x.shape[1]))
+    directions /= np.linalg.norm(directions, axis=1)[:, None]
+    directions /= sigma[None, :]
+
+    levels = (np.arange(nlevels) + 0.5) / nlevels
+
+    def run(start: int) -> float:
+        block = directions[start : start + chunk_size].T
+        qx = _get_quantiles(np.dot(x, block), levels, nbins)
+        qy = _get_quantiles(np.dot(y, block), levels, nbins)
+        return np.sum(np.mean(np.abs(qx - qy) ** p, axis=0))
+
+    with ThreadPoolExecutor(max_workers=nthreads) as executor:
+        total = sum(executor.map(run, range(0, nproj, chunk_size)))
+    return float((total / nproj) ** (1.0 / p))
+
+
+def get_moment_indices(ndim: int, order: int = 4) -> list[tuple[int, ...]]:
+    """Return the multi-indices of all moments of order 1 to `order`."""
+    indices = []
+    for k in range(1, order + 1):
+        indices += list(itertools.combinations_with_replacement(range(ndim), k))
+    return indices
+
+
+def get_central_moments(
+    x: np.ndarray,
+    order: int = 4,
+    mean: np.ndarray = None,
+    scale: np.ndarray = None,
+    chunk_size: int = 100_000,
+) -> np.ndarray:
+    """Return all central moments up to `order`, ordered as in `get_moment_indices`.
+
+    Coordinates are centered on `mean` (default: the mean of x) and divided by
+    `scale` (default: 1). First-order moments are the means relative to `mean`.
+    """
+    ndim = x.shape[1]
+    mean = np.mean(x, axis=0) if mean is None else mean
+    scale = np.ones(ndim) if scale is None else scale
+
+    indices = get_moment_indices(ndim, order)
+    sums = np.zeros(len(indices))
+    for start in range(0, x.shape[0], chunk_size):
+        block = (x[start : start + chunk_size] - mean) / scale
+        # Build order-k monomials from order-(k-1) ones: {index: column}.
+        monomials = {(i,): block[:, i] for i in range(ndim)}
+        products = dict(monomials)
+        for k in range(2, order + 1):
+            monomials = {
+                index + (i,): column * block[:, i]
+                for index, column in monomials.items()
+                for i in range(index[-1], ndim)
+            }
+            products.update(monomials)
+        sums += [np.sum(products[index]) for index in indices]
+    return sums / max(x.shape[0], 1)
+
+
+def moment_differences(
+    x: np.ndarray,
+    y: np.ndarray,
+    order: int = 4,
+    dims: list[str] = None,
+    chunk_size: int = 100_000,
+) -> pd.DataFrame:
+    """Return central moments of x and y up to `order` and their difference.
+
+    Both sets are centered on their own means (first-order moments are the
+    difference of means) and scaled by the rms sizes of `y`, so all values are
+    dimensionless.
+
+    Returns:
+        Table indexed by moment (e.g. "x*px*px") with columns "order", "value",
+        "value_ref" and "diff".
+    """
+    ndim = x.shape[1]
+    dims = [str(k) for k in range(ndim)] if dims is None else dims
+    mean_ref = np.mean(y, axis=0)
+    scale = np.std(y, axis=0)
+    scale[scale == 0.0] = 1.0
+
+    values = get_central_moments(x, order, mean=np.mean(x, axis=0), scale=scale, chunk_size=chunk_size)
+    values_ref = get_central_moments(y, order, mean=mean_ref, scale=scale, chunk_size=chunk_size)
+
+    indices = get_moment_indices(ndim, order)
+    first = [len(index) == 1 for index in indices]
+    values[first] = (np.mean(x, axis=0) - mean_ref) / scale
+
+    table = pd.DataFrame(
+        {
+            "moment": ["*".join(dims[k] for k in index) for index in indices],
+            "order": [len(index) for index in indices],
+            "value": values,
+            "value_ref": values_ref,
+            "diff": values - values_ref,
+        }
+    )
+    return table.set_index("moment")
+
+
+def compare_distributions(
+    x: np.ndarray,
+    y: np.ndarray,
+    dims: list[str] = None,
+    nsamp: int = None,
+    bins: int = 64,
+    nproj: int = 100,
+    order: int = 4,
+    seed: int = None,
+) -> dict:
+    """Compute all metrics between x and its reference y.
+
+    Args:
+        x, y: (n, d) and (m, d) arrays.
+        dims: dimension names.
+        nsamp: if given, subsample both sets to at most this many particles for
+            the sliced Wasserstein distance and moments (histograms use all).
+        bins: number of histogram bins along each axis.
+        nproj: number of sliced Wasserstein directions.
+        order: maximum moment order.
+        seed: random seed for subsampling and directions.
+
+    Returns:
+        {"histograms": table, "moments": table, "summary": {name: value}}
+    """
+    rng = np.random.default_rng(seed)
+    x_samp = subsample(x, nsamp, rng)
+    y_samp = subsample(y, nsamp, rng)
+
+    results = {}
+    results["histograms"] = histogram_divergences(x, y, bins=bins, dims=dims)
+    results["moments"] = moment_differences(x_samp, y_samp, order=order, dims=dims)
+
+    summary = {}
+    summary["sliced_wasserstein"] = sliced_wasserstein(x_samp, y_samp, nproj=nproj, seed=seed)
+    for key in ["tv", "hellinger", "js"]:
+        summary[f"max_{key}"] = float(results["histograms"][key].max())
+    moments = results["moments"]
+    for k in range(1, order + 1):
+        summary[f"max_moment_diff_{k}"] = float(np.max(np.abs(moments.loc[moments["order"] == k, "diff"])))
+    results["summary"] = summary
+    return results
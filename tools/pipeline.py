@@ -0,0 +1,171 @@
+"""Process-parallel, headless analysis tasks.
+
+An analysis script builds a list of `Task`s (typically one per figure) and runs
+them with `run_tasks`. Large arrays (particle snapshots) are copied once into
+shared memory by `SharedArrays`; the worker processes attach to them by name
+and receive read-only views instead of pickled copies. Workers are started with
+the "spawn" method and `MPLBACKEND=Agg`, so they never open a display and only
+import the plotting libraries that their tasks import.
+
+Task functions must be defined at module level in a module the workers can
+import; the calling script must guard its main code with
+`if __name__ == "__main__":`. Each task is called as `func(arrays, **kwargs)`,
+where `arrays` is the dict of shared arrays.
+"""
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from dataclasses import field
+from multiprocessing import shared_memory
+from typing import Any
+from typing import Callable
+
+import numpy as np
+
+
+@dataclass
+class Task:
+    name: str
+    func: Callable
+    kwargs: dict = field(default_factory=dict)
+
+
+class SharedArrays:
+    """Named NumPy arrays in shared memory.
+
+    Use as a context manager in the parent process; the memory is released on
+    exit. `specs` is a small picklable description that `attach` turns back into
+    arrays in another process.
+    """
+
+    def __init__(self, arrays: dict[str, np.ndarray] = None) -> None:
+        self.blocks = {}
+        self.specs = {}
+        self.arrays = {}
+        for name, array in (arrays or {}).items():
+            self.add(name, array)
+
+    def add(self, name: str, array: np.ndarray) -> np.ndarray:
+        """Copy an array into shared memory and return the shared copy."""
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        shared = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+        shared[...] = array
+        self.blocks[name] = block
+        self.specs[name] = (block.name, array.shape, array.dtype.str)
+        self.arrays[name] = shared
+        return shared
+
+    def close(self) -> None:
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.blocks = {}
+        self.specs = {}
+        self.arrays = {}
+
+    def __enter__(self) -> "SharedArrays":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+_blocks = []
+_arrays = {}
+
+
+def attach(specs: dict) -> dict[str, np.ndarray]:
+    """Return read-only views of shared arrays described by `SharedArrays.specs`."""
+    arrays = {}
+    for name, (block_name, shape, dtype) in specs.items():
+        # Workers started by `run_tasks` share the parent's resource tracker, so
+        # the block stays registered once and is unlinked only by its creator.
+        block = shared_memory.SharedMemory(name=block_name)
+        _blocks.append(block)
+        array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        array.flags.writeable = False
+        arrays[name] = array
+    return arrays
+
+
+def _init_worker(specs: dict, path: list[str]) -> None:
+    os.environ["MPLBACKEND"] = "Agg"
+    sys.path[:] = path
+    _arrays.update(attach(specs))
+
+
+def _run_task(task: Task, arrays: dict) -> tuple[str, Any, float, str]:
+    start_time = time.perf_counter()
+    try:
+        result = task.func(arrays, **task.kwargs)
+        error = None
+    except Exception:
+        result = None
+        error = traceback.format_exc()
+    finally:
+        if "matplotlib.pyplot" in sys.modules:
+            sys.modules["matplotlib.pyplot"].close("all")
+    return (task.name, result, time.perf_counter() - start_time, error)
+
+
+def _run_task_in_worker(task: Task) -> tuple[str, Any, float, str]:
+    return _run_task(task, _arrays)
+
+
+def run_tasks(
+    tasks: list[Task],
+    shared: SharedArrays = None,
+    nprocs: int = None,
+    verbose: bool = True,
+) -> dict[str, Any]:
+    """Run tasks on a process pool and return {name: result}.
+
+    Args:
+        tasks: tasks to run; results are returned in the same order.
+        shared: shared arrays passed to every task.
+        nprocs: number of worker processes (default: number of CPUs, at most the
+            number of tasks). With 1, tasks run in this process.
+        verbose: print the name and run time of each finished task.
+
+    Failed tasks are reported with their traceback; a RuntimeError listing them is
+    raised after all other tasks finish.
+    """
+    os.environ["MPLBACKEND"] = "Agg"
+    specs = shared.specs if shared is not None else {}
+    nprocs = min(nprocs or os.cpu_count() or 1, max(len(tasks), 1))
+
+    if nprocs == 1:
+        arrays = {}
+        for name, array in (shared.arrays if shared is not None else {}).items():
+            arrays[name] = array.view()
+            arrays[name].flags.writeable = False
+        outputs = [_run_task(task, arrays) for task in tasks]
+    else:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(
+            max_workers=nprocs, mp_context=context, initializer=_init_worker, initargs=(specs, list(sys.path))
+        ) as executor:
+            outputs = []
+            for output in executor.map(_run_task_in_worker, tasks):
+                outputs.append(output)
+                if verbose:
+                    print("{} ({:0.2f} s)".format(output[0], output[2]))
+                    sys.stdout.flush()
+
+    results = {}
+    failed = []
+    for name, result, run_time, error in outputs:
+        if verbose and nprocs == 1:
+            print("{} ({:0.2f} s)".format(name, run_time))
+        if error is not None:
+            print(f"Task {name} failed:\n{error}")
+            failed.append(name)
+        results[name] = result
+    if failed:
+        raise RuntimeError("Failed tasks: {}".format(", ".join(failed)))
+    return results
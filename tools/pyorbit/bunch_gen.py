@@ -0,0 +1,156 @@
+"""Vectorized, rank-local bunch generation.
+
+The PyORBIT generators in `orbit.bunch_generators` return one particle per call,
+and the benchmarks broadcast every particle from rank 0. Here each rank draws its
+own share of the distribution from an independent random stream in NumPy blocks,
+so loading the bunch needs no communication at all. Inserting the particles into
+the `Bunch` (`add_coords`) is still one Python call per particle.
+
+Coordinates are (x, xp, y, yp, z, dE) in PyORBIT units. Twiss parameters are
+(alpha, beta, emittance) tuples, with the same meaning as `TwissContainer`.
+"""
+from typing import Callable
+from typing import Iterator
+
+import numpy as np
+
+
+def get_local_size(size: int, rank: int = 0, nprocs: int = 1) -> int:
+    """Return the number of particles owned by `rank` when `size` are split over `nprocs`."""
+    return size // nprocs + int(rank < size % nprocs)
+
+
+def get_local_rng(seed: int, rank: int = 0, nprocs: int = 1) -> np.random.Generator:
+    """Return a random number generator independent from those of the other ranks."""
+    seed_seq = np.random.SeedSequence(seed)
+    return np.random.default_rng(seed_seq.spawn(nprocs)[rank])
+
+
+def normalized_to_twiss(u: np.ndarray, up: np.ndarray, twiss: tuple) -> None:
+    """Map normalized coordinates to physical coordinates in place.
+
+    Follows `TwissContainer.getU_UP`: u -> sqrt(beta * eps) * u and
+    up -> sqrt(eps / beta) * (up - alpha * u).
+    """
+    alpha, beta, emittance = twiss
+    up -= alpha * u
+    up *= np.sqrt(emittance / beta)
+    u *= np.sqrt(beta * emittance)
+
+
+def sample_gauss_2d(
+    size: int,
+    rng: np.random.Generator,
+    twiss_x: tuple,
+    twiss_y: tuple,
+    sigma_z: float = 0.0,
+) -> np.ndarray:
+    """Sample the transverse Gaussian of `GaussDist2D` with Gaussian z and zero dE."""
+    coords = np.zeros((size, 6))
+    coords[:, 0:4] = rng.standard_normal((size, 4))
+    normalized_to_twiss(coords[:, 0], coords[:, 1], twiss_x)
+    normalized_to_twiss(coords[:, 2], coords[:, 3], twiss_y)
+    coords[:, 4] = rng.normal(scale=sigma_z, size=size)
+    return coords
+
+
+def _normalized_to_twiss_3d(coords: np.ndarray, twiss_x: tuple, twiss_y: tuple, twiss_z: tuple) -> None:
+    normalized_to_twiss(coords[:, 0], coords[:, 1], twiss_x)
+    normalized_to_twiss(coords[:, 2], coords[:, 3], twiss_y)
+    normalized_to_twiss(coords[:, 4], coords[:, 5], twiss_z)
+
+
+def _sample_unit_sphere(size: int, rng: np.random.Generator, ndim: int) -> np.ndarray:
+    coords = rng.standard_normal((size, ndim))
+    coords /= np.linalg.norm(coords, axis=1)[:, None]
+    return coords
+
+
+def sample_gauss_3d(
+    size: int,
+    rng: np.random.Generator,
+    twiss_x: tuple,
+    twiss_y: tuple,
+    twiss_z: tuple,
+    cut_off: float = -1.0,
+) -> np.ndarray:
+    """Sample the 6D Gaussian of `GaussDist3D`.
+
+    If `cut_off` > 0, each plane is truncated at `cut_off` rms in normalized
+    phase space; rejected particles are redrawn.
+    """
+    coords = rng.standard_normal((size, 6))
+    if cut_off > 0.0:
+        for i in range(0, 6, 2):
+            plane = coords[:, i : i + 2]
+            reject = np.sum(plane**2, axis=1) > cut_off**2
+            while np.any(reject):
+                plane[reject] = rng.standard_normal((np.count_nonzero(reject), 2))
+                reject = np.sum(plane**2, axis=1) > cut_off**2
+    _normalized_to_twiss_3d(coords, twiss_x, twiss_y, twiss_z)
+    return coords
+
+
+def sample_waterbag_3d(
+    size: int,
+    rng: np.random.Generator,
+    twiss_x: tuple,
+    twiss_y: tuple,
+    twiss_z: tuple,
+) -> np.ndarray:
+    """Sample the 6D waterbag of `WaterBagDist3D` (uniform in a 6D ellipsoid)."""
+    coords = _sample_unit_sphere(size, rng, 6)
+    coords *= rng.uniform(size=(size, 1)) ** (1.0 / 6.0)
+    coords *= np.sqrt(8.0)  # unit rms emittance
+    _normalized_to_twiss_3d(coords, twiss_x, twiss_y, twiss_z)
+    return coords
+
+
+def sample_kv_3d(
+    size: int,
+    rng: np.random.Generator,
+    twiss_x: tuple,
+    twiss_y: tuple,
+    twiss_z: tuple,
+) -> np.ndarray:
+    """Sample the 6D KV distribution of `KVDist3D` (uniform on a 6D ellipsoid shell)."""
+    coords = _sample_unit_sphere(size, rng, 6)
+    coords *= np.sqrt(6.0)  # unit rms emittance
+    _normalized_to_twiss_3d(coords, twiss_x, twiss_y, twiss_z)
+    return coords
+
+
+def gen_bunch_coords(
+    sample: Callable[[int, np.random.Generator], np.ndarray],
+    size: int,
+    seed: int,
+    rank: int = 0,
+    nprocs: int = 1,
+    block_size: int = 100_000,
+) -> Iterator[np.ndarray]:
+    """Yield this rank's share of a `size`-particle bunch in blocks.
+
+    Args:
+        sample: function (n, rng) -> (n, 6) coordinate array.
+        size: global number of particles.
+        seed: global random seed; each rank spawns its own stream from it.
+        rank: MPI rank.
+        nprocs: MPI size.
+        block_size: maximum number of particles per block.
+    """
+    rng = get_local_rng(seed, rank, nprocs)
+    local_size = get_local_size(size, rank, nprocs)
+    for start in range(0, local_size, block_size):
+        yield sample(min(block_size, local_size - start), rng)
+
+
+def add_coords(bunch, coords: np.ndarray) -> None:
+    """Add the rows of an (n, 6) coordinate array to a PyORBIT bunch.
+
+    `Bunch` has no bulk insertion method, so this still makes one `addParticle`
+    call per particle; for large bunches it takes several times longer than
+    generating the coordinates.
+    """
+    add_particle = bunch.addParticle
+    for x, xp, y, yp, z, de in coords.tolist():
+        add_particle(x, xp, y, yp, z, de)
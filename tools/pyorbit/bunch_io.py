@@ -0,0 +1,260 @@
+"""Bunch file I/O.
+
+`dumpBunch` text files are read with a header parser and a chunked C-level body
+parser, so large dumps can be processed in bounded memory.
+
+Binary bunch snapshots:
+
+A snapshot is an HDF5 file with two contiguous, uncompressed datasets:
+
+    coords: (n, 6) float64 array of (x, xp, y, yp, z, dE) in PyORBIT units
+    ids:    (n,) int64 array of particle ids
+
+Bunch and synchronous particle attributes are stored as file attributes. Because
+the datasets are contiguous, `load_snapshot` can memory-map them directly, so
+analysis scripts can slice columns or particle ranges without reading the file.
+"""
+import os
+
+from typing import Iterator
+
+import h5py
+import numpy as np
+import pandas as pd
+
+
+def get_bunch_coords(bunch, out: np.ndarray = None) -> np.ndarray:
+    """Return the rank-local (n, 6) coordinate array of a PyORBIT bunch.
+
+    `Bunch` only exposes per-particle accessors, so each column is filled by
+    mapping one accessor over the particle indices; this keeps the loop in C
+    and avoids building a tuple per particle.
+    """
+    size = bunch.getSize()
+    if out is None:
+        out = np.zeros((size, 6))
+    getters = [bunch.x, bunch.xp, bunch.y, bunch.yp, bunch.z, bunch.dE]
+    for j, getter in enumerate(getters):
+        out[:, j] = np.fromiter(map(getter, range(size)), dtype=np.float64, count=size)
+    return out
+
+
+def get_bunch_attrs(bunch) -> dict:
+    """Return bunch and synchronous particle attributes of a PyORBIT bunch."""
+    sync_part = bunch.getSyncParticle()
+    attrs = {}
+    attrs["mass"] = bunch.mass()
+    attrs["charge"] = bunch.charge()
+    attrs["classical_radius"] = bunch.classicalRadius()
+    attrs["macro_size"] = bunch.macroSize()
+    attrs["sync_coords"] = [sync_part.x(), sync_part.y(), sync_part.z()]
+    attrs["sync_momentum"] = [sync_part.px(), sync_part.py(), sync_part.pz()]
+    attrs["sync_time"] = sync_part.time()
+    attrs["sync_kin_energy"] = sync_part.kinEnergy()
+    return attrs
+
+
+def read_dat_header(filename: str) -> dict:
+    """Read bunch and synchronous particle attributes from a `dumpBunch` header."""
+    attrs = {}
+    with open(filename, "r") as file:
+        for line in file:
+            if not line.startswith("%"):
+                break
+            tokens = line[1:].split()
+            if not tokens:
+                continue
+            key = tokens[0]
+            if key in ["BUNCH_ATTRIBUTE_DOUBLE", "BUNCH_ATTRIBUTE_INT"]:
+                attrs[tokens[1]] = float(tokens[2])
+            elif key == "SYNC_PART_COORDS":
+                attrs["sync_coords"] = [float(token) for token in tokens[1:4]]
+            elif key == "SYNC_PART_MOMENTUM":
+                attrs["sync_momentum"] = [float(token) for token in tokens[1:4]]
+            elif key == "SYNC_PART_TIME":
+                attrs["sync_time"] = float(tokens[1])
+            elif key == "PARTICLE_ATTRIBUTES_CONTROLLERS_NAMES" and len(tokens) > 1:
+                attrs["particle_attributes"] = tokens[1:]
+    if "mass" in attrs and "sync_momentum" in attrs:
+        mass = attrs["mass"]
+        momentum = np.linalg.norm(attrs["sync_momentum"])
+        attrs["sync_kin_energy"] = np.sqrt(momentum**2 + mass**2) - mass
+    return attrs
+
+
+def count_dat_rows(filename: str) -> int:
+    """Return the number of particles in a `dumpBunch` file without parsing it.
+
+    Like `iter_dat_chunks`, blank lines and lines starting with "%" are skipped.
+    """
+    nrows = 0
+    with open(filename, "rb") as file:
+        for line in file:
+            line = line.strip()
+            if line and not line.startswith(b"%"):
+                nrows += 1
+    return nrows
+
+
+def iter_dat_chunks(filename: str, chunk_size: int = 1_000_000, usecols=range(6)) -> Iterator[np.ndarray]:
+    """Yield the particle coordinates of a `dumpBunch` file in (n, ncols) blocks.
+
+    The header is skipped and each block of at most `chunk_size` rows is parsed
+    by the pandas C parser, so memory use is bounded by the block size.
+    """
+    reader = pd.read_csv(
+        filename,
+        sep=r"\s+",
+        comment="%",
+        header=None,
+        usecols=usecols,
+        dtype=np.float64,
+        engine="c",
+        chunksize=chunk_size,
+    )
+    with reader:
+        for chunk in reader:
+            yield chunk.to_numpy()
+
+
+def read_dat(filename: str, chunk_size: int = 1_000_000, usecols=range(6)) -> np.ndarray:
+    """Read the particle coordinates of a `dumpBunch` file into one array."""
+    usecols = list(usecols)
+    data = np.zeros((count_dat_rows(filename), len(usecols)))
+    start = 0
+    for chunk in iter_dat_chunks(filename, chunk_size, usecols):
+        data[start : start + chunk.shape[0]] = chunk
+        start += chunk.shape[0]
+    return data[:start]
+
+
+def write_snapshot(filename: str, coords: np.ndarray, ids: np.ndarray = None, attrs: dict = None) -> None:
+    """Write particle coordinates, ids and attributes to a snapshot file."""
+    if ids is None:
+        ids = np.arange(coords.shape[0])
+    with h5py.File(filename, "w") as file:
+        file.create_dataset("coords", data=np.asarray(coords, dtype=np.float64))
+        file.create_dataset("ids", data=np.asarray(ids, dtype=np.int64))
+        for key, value in (attrs or {}).items():
+            file.attrs[key] = value
+
+
+def dump_bunch_snapshot(bunch, filename: str) -> None:
+    """Write a distributed PyORBIT bunch to a snapshot file.
+
+    Must be called on all ranks. Rank 0 creates the file and the ranks then write
+    their particles in rank order, so the file holds the same particle order as
+    `dumpBunch`.
+    """
+    from orbit.core import orbit_mpi
+
+    comm = orbit_mpi.mpi_comm.MPI_COMM_WORLD
+    rank = orbit_mpi.MPI_Comm_rank(comm)
+    nprocs = orbit_mpi.MPI_Comm_size(comm)
+
+    local_sizes = [0] * nprocs
+    local_sizes[rank] = bunch.getSize()
+    local_sizes = orbit_mpi.MPI_Allreduce(
+        tuple(local_sizes), orbit_mpi.mpi_datatype.MPI_INT, orbit_mpi.mpi_op.MPI_SUM, comm
+    )
+    size = sum(local_sizes)
+    start = sum(local_sizes[:rank])
+    stop = start + local_sizes[rank]
+
+    coords = get_bunch_coords(bunch)
+    if bunch.hasPartAttr("ParticleIdNumber"):
+        ids = [bunch.partAttrValue("ParticleIdNumber", i, 0) for i in range(bunch.getSize())]
+        ids = np.array(ids, dtype=np.int64)
+    else:
+        ids = np.arange(start, stop)
+
+    if rank == 0:
+        with h5py.File(filename, "w") as file:
+            file.create_dataset("coords", shape=(size, 6), dtype=np.float64)
+            file.create_dataset("ids", shape=(size,), dtype=np.int64)
+            for key, value in get_bunch_attrs(bunch).items():
+                file.attrs[key] = value
+
+    for i in range(nprocs):
+        orbit_mpi.MPI_Barrier(comm)
+        if i == rank and stop > start:
+            with h5py.File(filename, "r+") as file:
+                file["coords"][start:stop] = coords
+                file["ids"][start:stop] = ids
+    orbit_mpi.MPI_Barrier(comm)
+
+
+def _memmap_dataset(filename: str, dataset: h5py.Dataset) -> np.ndarray:
+    offset = dataset.id.get_offset()
+    if offset is None:
+        # Not contiguous on disk (or empty); fall back to reading it.
+        return dataset[...]
+    return np.memmap(filename, mode="r", dtype=dataset.dtype, offset=offset, shape=dataset.shape)
+
+
+def load_snapshot(filename: str, mmap: bool = True) -> dict:
+    """Load a snapshot file.
+
+    Returns a dict with keys "coords", "ids" and "attrs". If `mmap`, the arrays
+    are read-only memory maps of the file.
+    """
+    with h5py.File(filename, "r") as file:
+        if mmap:
+            coords = _memmap_dataset(filename, file["coords"])
+            ids = _memmap_dataset(filename, file["ids"])
+        else:
+            coords = file["coords"][...]
+            ids = file["ids"][...]
+        attrs = dict(file.attrs)
+    return {"coords": coords, "ids": ids, "attrs": attrs}
+
+
+def load_bunch_coords(filename: str) -> np.ndarray:
+    """Load the (n, 6) coordinate array from a snapshot or a `dumpBunch` file."""
+    if os.path.splitext(filename)[1] == ".dat":
+        return read_dat(filename)
+    return load_snapshot(filename)["coords"]
+
+
+def convert_dat_to_snapshot(filename: str, output_filename: str = None, chunk_size: int = 1_000_000) -> str:
+    """Convert a `dumpBunch` text file to a snapshot file. Returns the new filename.
+
+    The body is streamed in blocks of `chunk_size` particles.
+    """
+    if output_filename is None:
+        output_filename = os.path.splitext(filename)[0] + ".h5"
+    attrs = read_dat_header(filename)
+    usecols = range(6)
+    if attrs.get("particle_attributes", [None])[0] == "ParticleIdNumber":
+        usecols = range(7)
+    size = count_dat_rows(filename)
+
+    with h5py.File(output_filename, "w") as file:
+        coords = file.create_dataset("coords", shape=(size, 6), dtype=np.float64)
+        ids = file.create_dataset("ids", shape=(size,), dtype=np.int64)
+        for key, value in attrs.items():
+            file.attrs[key] = value
+
+        start = 0
+        for chunk in iter_dat_chunks(filename, chunk_size, usecols):
+            stop = start + chunk.shape[0]
+            coords[start:stop] = chunk[:, :6]
+            if chunk.shape[1] > 6:
+                ids[start:stop] = chunk[:, 6]
+            else:
+                ids[start:stop] = np.arange(start, stop)
+            start = stop
+        if start != size:
+            raise ValueError(f"Expected {size} particles in {filename}, found {start}")
+    return output_filename
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert dumpBunch files to snapshot files.")
+    parser.add_argument("filenames", nargs="+")
+    args = parser.parse_args()
+
+    for filename in args.filenames:
+        print(convert_dat_to_snapshot(filename))
@@ -1,26 +1,126 @@
+"""Conversion between PyORBIT and ImpactX phase space coordinates.
+
+PyORBIT: (x [m], xp [rad], y [m], yp [rad], z [m], dE)
+ImpactX: (x [m], px, y [m], py, t = ct [m], pt), momenta normalized by the
+reference momentum.
+
+`kin_energy`, `mass` and dE must share the same units (e.g. GeV). Both directions
+can write into a caller-supplied buffer, including the input array itself, and
+can work through the particles in row blocks. Only one scratch column of at most
+`chunk_size` rows is allocated, so converting large bunches does not multiply
+peak memory.
+"""
 import math
+
 import numpy as np
 
 
-def pyorbit_to_impactx(particles: np.ndarray, kin_energy: float, mass: float) -> np.nndarray:
+def get_beta_gamma(kin_energy: float, mass: float) -> tuple[float, float]:
+    """Return the reference particle (beta, gamma)."""
     gamma0 = (mass + kin_energy) / mass
-    beta0 = np.sqrt(gamma0 * gamma0 - 1.0) / gamma0
-    
-    # Convert spatial coordinates
-    dx = particles[:, 0]  # [m]
-    dy = particles[:, 2]  # [m]
-    dt = particles[:, 4] / beta0  # ct [m]
-    
-    # Convert momentum coordinates
-    dgamma = particles[:, 5] / mass
-    gamma = gamma0 + dgamma
-    dbetaz = 0.25 * gamma0**(-1.5) * beta0**(-1.0) * dgamma
-    betax = beta0 * particles[:, 1]
-    betay = beta0 * particles[:, 3]
-    gammax = 1.0 / np.sqrt(1.0 - betax**2)  # ~1
-    gammay = 1.0 / np.sqrt(1.0 - betay**2)  # ~1
-    dpx = (betax * gammax) / (beta0 * gamma0)
-    dpy = (betay * gammay) / (beta0 * gamma0)
-    dpt = (dgamma) / (beta0 * gamma0)
-
-    return np.stack([dx, dpx, dy, dpy, dt, dpt], axis=-1)
\ No newline at end of file
+    beta0 = math.sqrt(gamma0 * gamma0 - 1.0) / gamma0
+    return (beta0, gamma0)
+
+
+def _prepare(particles: np.ndarray, out: np.ndarray, dtype) -> np.ndarray:
+    if out is None:
+        out = np.empty(particles.shape, dtype=(dtype or particles.dtype))
+    if out.shape != particles.shape:
+        raise ValueError(f"Output shape {out.shape} does not match input shape {particles.shape}")
+    return out
+
+
+def _iter_blocks(size: int, chunk_size: int):
+    chunk_size = chunk_size or max(size, 1)
+    for start in range(0, size, chunk_size):
+        yield slice(start, min(start + chunk_size, size))
+
+
+def pyorbit_to_impactx(
+    particles: np.ndarray,
+    kin_energy: float,
+    mass: float,
+    out: np.ndarray = None,
+    dtype=None,
+    chunk_size: int = None,
+) -> np.ndarray:
+    """Convert PyORBIT to ImpactX phase space coordinates.
+
+    Args:
+        particles: (n, 6) PyORBIT coordinates. Not modified unless `out is particles`.
+        kin_energy: kinetic energy of the reference particle.
+        mass: rest mass (same units as `kin_energy` and dE).
+        out: (n, 6) output buffer. Pass `particles` to convert in place.
+        dtype: output dtype if `out` is not given, e.g. np.float32.
+        chunk_size: number of rows converted at a time (default: all).
+    """
+    out = _prepare(particles, out, dtype)
+    beta0, gamma0 = get_beta_gamma(kin_energy, mass)
+    scratch = np.empty(min(chunk_size or particles.shape[0], particles.shape[0]), dtype=out.dtype)
+
+    for block in _iter_blocks(particles.shape[0], chunk_size):
+        src = particles[block]
+        dst = out[block]
+        tmp = scratch[: dst.shape[0]]
+
+        # x -> x, y -> y, z -> ct
+        dst[:, 0] = src[:, 0]
+        dst[:, 2] = src[:, 2]
+        np.multiply(src[:, 4], 1.0 / beta0, out=dst[:, 4])
+
+        # x' -> px = (betax * gammax) / (beta0 * gamma0), with betax = beta0 * x'
+        for i in (1, 3):
+            np.multiply(src[:, i], src[:, i], out=tmp)
+            tmp *= -(beta0**2)
+            tmp += 1.0
+            np.sqrt(tmp, out=tmp)
+            np.divide(src[:, i], tmp, out=dst[:, i])
+            dst[:, i] *= 1.0 / gamma0
+
+        # dE -> pt = dgamma / (beta0 * gamma0)
+        np.multiply(src[:, 5], 1.0 / (mass * beta0 * gamma0), out=dst[:, 5])
+    return out
+
+
+def impactx_to_pyorbit(
+    particles: np.ndarray,
+    kin_energy: float,
+    mass: float,
+    out: np.ndarray = None,
+    dtype=None,
+    chunk_size: int = None,
+) -> np.ndarray:
+    """Convert ImpactX to PyORBIT phase space coordinates (inverse of `pyorbit_to_impactx`).
+
+    Args:
+        particles: (n, 6) ImpactX coordinates. Not modified unless `out is particles`.
+        kin_energy: kinetic energy of the reference particle.
+        mass: rest mass (same units as `kin_energy`; dE is returned in these units).
+        out: (n, 6) output buffer. Pass `particles` to convert in place.
+        dtype: output dtype if `out` is not given, e.g. np.float32.
+        chunk_size: number of rows converted at a time (default: all).
+    """
+    out = _prepare(particles, out, dtype)
+    beta0, gamma0 = get_beta_gamma(kin_energy, mass)
+    scratch = np.empty(min(chunk_size or particles.shape[0], particles.shape[0]), dtype=out.dtype)
+
+    for block in _iter_blocks(particles.shape[0], chunk_size):
+        src = particles[block]
+        dst = out[block]
+        tmp = scratch[: dst.shape[0]]
+
+        dst[:, 0] = src[:, 0]
+        dst[:, 2] = src[:, 2]
+        np.multiply(src[:, 4], beta0, out=dst[:, 4])
+
+        # px -> x' = px * gamma0 / sqrt(1 + (px * beta0 * gamma0)^2)
+        for i in (1, 3):
+            np.multiply(src[:, i], src[:, i], out=tmp)
+            tmp *= (beta0 * gamma0) ** 2
+            tmp += 1.0
+            np.sqrt(tmp, out=tmp)
+            np.divide(src[:, i], tmp, out=dst[:, i])
+            dst[:, i] *= gamma0
+
+        np.multiply(src[:, 5], mass * beta0 * gamma0, out=dst[:, 5])
+    return out
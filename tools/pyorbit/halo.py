@@ -0,0 +1,182 @@
+"""In-situ halo diagnostics.
+
+`HaloMonitor` records, in each plane (x-xp, y-yp, z-dE):
+
+- kurtosis of each coordinate and the Allen-Wangler 2D halo parameter
+  H = sqrt(3 I4) / (2 I2) - 2, with I2 = <q^2><p^2> - <qp>^2 and
+  I4 = <q^4><p^4> + 3<q^2p^2>^2 - 4<qp^3><q^3p> (0 for KV, 1 for Gaussian);
+- the emittances containing 99% and 99.9% of the particles, i.e. quantiles of the
+  Courant-Snyder invariant J = gamma q^2 + 2 alpha q p + beta p^2 computed with the
+  rms Twiss parameters;
+- the maximum normalized amplitude sqrt(J / emittance) and the maximum |q - <q>|.
+
+Moments come from `MomentEngine(order=4)` (one reduction). Quantiles of J are
+found from a histogram of normalized amplitudes that is summed over ranks, with
+its range set by the global maximum amplitude. A record therefore takes three
+MPI reductions regardless of the number of ranks. The coordinates are copied
+once per record; with 1e6 particles per rank a record costs about 0.6 s.
+"""
+import numpy as np
+
+from orbit.core import orbit_mpi
+
+from .monitor import Monitor
+from .moments import MomentEngine
+from .progress import ProgressLogger
+
+
+PLANES = ["x", "y", "z"]
+FRACTIONS = {"99": 0.99, "999": 0.999}
+
+
+def get_halo_parameters(moments: np.ndarray) -> np.ndarray:
+    """Return the 2D halo parameter of each plane from central moments (3, 5, 5)."""
+    m = moments
+    i2 = m[:, 2, 0] * m[:, 0, 2] - m[:, 1, 1] ** 2
+    i4 = m[:, 4, 0] * m[:, 0, 4] + 3.0 * m[:, 2, 2] ** 2 - 4.0 * m[:, 1, 3] * m[:, 3, 1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.sqrt(3.0 * np.clip(i4, 0.0, None)) / (2.0 * i2) - 2.0
+
+
+class HaloMonitor(Monitor):
+    """Records halo diagnostics during tracking.
+
+    Add to an `AccActionsContainer` like `Monitor`; the cadence options are the
+    same. Computing 4th-order moments is much more expensive than the rms
+    monitor, so record sparsely (e.g. with `ds`).
+
+    Args:
+        every: record only at every `every`-th call.
+        ds: record only if the path length advanced by at least `ds` [m].
+        nodes: record only at nodes with these names.
+        nbins: number of amplitude bins used to find the emittance fractions.
+        capacity: number of preallocated rows.
+        logger: if given, a summary line is logged at each record.
+        sink: if given, each record is also appended to this `HistoryWriter`.
+        keep_history: keep all records in memory (see `Monitor`).
+    """
+
+    keys = (
+        ["s"]
+        + ["kurtosis_x", "kurtosis_xp", "kurtosis_y", "kurtosis_yp", "kurtosis_z", "kurtosis_dE"]
+        + [f"halo_{plane}" for plane in PLANES]
+        + [f"emittance_{key}_{plane}" for key in FRACTIONS for plane in PLANES]
+        + [f"amp_max_{plane}" for plane in PLANES]
+        + [f"max_{plane}" for plane in PLANES]
+    )
+
+    def __init__(
+        self,
+        every: int = 1,
+        ds: float = None,
+        nodes: list[str] = None,
+        nbins: int = 2000,
+        capacity: int = 100,
+        logger: ProgressLogger = None,
+        sink=None,
+        keep_history: bool = True,
+    ) -> None:
+        super().__init__(
+            every=every,
+            ds=ds,
+            nodes=nodes,
+            capacity=capacity,
+            logger=logger,
+            sink=sink,
+            keep_history=keep_history,
+        )
+        self.nbins = nbins
+        self.moment_engine = MomentEngine(order=4)
+        self.comm = self.moment_engine.comm
+
+    def compute(self, bunch) -> list[float]:
+        """Compute the halo diagnostics of the bunch (must be called on all ranks)."""
+        # One copy of the rank-local coordinates serves the moments and amplitudes.
+        coords = self.moment_engine.get_local_coords(bunch)
+        results = self.moment_engine.compute(bunch, coords=coords)
+        mean = results["mean"]
+        alpha = results["alpha"]
+        beta = results["beta"]
+        emittance = results["emittance"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            gamma = (1.0 + alpha**2) / beta
+
+        # Amplitudes are undefined in a plane with zero emittance (e.g. dE = 0);
+        # its amplitudes are left at zero so the histogram below stays finite and
+        # every rank makes the same reductions, and its results are NaN.
+        valid = (emittance > 0.0) & np.isfinite(emittance) & np.isfinite(alpha) & np.isfinite(beta)
+
+        # Normalized amplitudes sqrt(J / emittance) in each plane.
+        amps = np.zeros((coords.shape[0], 3))
+        local_max = np.zeros(6)
+        for plane in range(3):
+            q = coords[:, 2 * plane] - mean[2 * plane]
+            p = coords[:, 2 * plane + 1] - mean[2 * plane + 1]
+            if valid[plane]:
+                invariant = gamma[plane] * q * q + 2.0 * alpha[plane] * q * p + beta[plane] * p * p
+                amps[:, plane] = np.sqrt(np.clip(invariant, 0.0, None) / emittance[plane])
+            if coords.shape[0] > 0:
+                local_max[plane] = np.max(amps[:, plane])
+                local_max[3 + plane] = np.max(np.abs(q))
+
+        global_max = orbit_mpi.MPI_Allreduce(
+            tuple(local_max), orbit_mpi.mpi_datatype.MPI_DOUBLE, orbit_mpi.mpi_op.MPI_MAX, self.comm
+        )
+        global_max = np.array(global_max)
+
+        counts = np.zeros((3, self.nbins))
+        for plane in range(3):
+            amp_max = global_max[plane] if np.isfinite(global_max[plane]) else 0.0
+            amp_max = max(amp_max, 1.00e-300)
+            counts[plane] = np.histogram(amps[:, plane], bins=self.nbins, range=(0.0, amp_max))[0]
+        counts = orbit_mpi.MPI_Allreduce(
+            tuple(counts.ravel()), orbit_mpi.mpi_datatype.MPI_DOUBLE, orbit_mpi.mpi_op.MPI_SUM, self.comm
+        )
+        counts = np.reshape(counts, (3, self.nbins))
+
+        # Emittance containing a fraction f: emittance * amp_f^2, with amp_f
+        # interpolated from the cumulative amplitude distribution.
+        fractions = {}
+        for key, fraction in FRACTIONS.items():
+            fractions[key] = np.zeros(3)
+            for plane in range(3):
+                total = max(np.sum(counts[plane]), 1.0)
+                cdf = np.concatenate([[0.0], np.cumsum(counts[plane]) / total])
+                edges = np.linspace(0.0, global_max[plane], self.nbins + 1)
+                keep = np.concatenate([[True], counts[plane] > 0])
+                amp = np.interp(fraction, cdf[keep], edges[keep])
+                fractions[key][plane] = emittance[plane] * amp**2
+            fractions[key][~valid] = np.nan
+        global_max[:3][~valid] = np.nan
+
+        row = []
+        row += list(results["kurtosis"])
+        row += list(get_halo_parameters(results["moments"]))
+        for key in FRACTIONS:
+            row += list(fractions[key])
+        row += list(global_max)
+        return row
+
+    def __call__(self, params_dict: dict) -> None:
+        bunch = params_dict["bunch"]
+        node = params_dict["node"]
+        distance = params_dict["path_length"]
+
+        if not self.should_record(node, distance):
+            return
+        self.last_distance = distance
+
+        self.append([distance] + self.compute(bunch))
+
+        if self.logger is not None:
+            self.logger.log(lambda: self.get_message())
+
+    def get_message(self) -> str:
+        row = dict(zip(self.keys, self.data[self.size - 1]))
+        message = ""
+        message += "s={:0.3f} ".format(row["s"])
+        message += "halo_x={:0.3f} ".format(row["halo_x"])
+        message += "halo_y={:0.3f} ".format(row["halo_y"])
+        message += "amp_max_x={:0.2f} ".format(row["amp_max_x"])
+        message += "amp_max_y={:0.2f} ".format(row["amp_max_y"])
+        return message
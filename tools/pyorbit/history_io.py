@@ -0,0 +1,168 @@
+"""Streaming HDF5 history files.
+
+`HistoryWriter` appends monitor rows to an HDF5 file with one typed, resizable
+dataset per column. Rows are buffered and written in blocks when `block_size`
+rows are buffered or `flush_interval` seconds have passed, so a crashed run
+keeps everything up to the last flush. The file is in SWMR mode while it is
+being written, so `load_history` (or any reader opening it with `swmr=True`)
+can read it during tracking.
+
+Only one process should write a file; with MPI, create the writer on rank 0 and
+pass `sink=None` to the monitors on other ranks.
+"""
+import os
+import time
+
+import h5py
+import numpy as np
+import pandas as pd
+
+
+class HistoryWriter:
+    """Appends rows of named columns to an HDF5 file.
+
+    Args:
+        filename: output file (.h5).
+        keys: column names.
+        dtypes: {key: dtype} for columns that are not float64.
+        block_size: number of buffered rows written at once (also the HDF5 chunk size).
+        flush_interval: also write buffered rows if this many seconds passed since
+            the last write (None to disable).
+        resume: keep the rows of an existing file and append to them (see
+            `truncate`) instead of overwriting it. A file left open by a crashed
+            writer is copied to a new file first.
+        compression: HDF5 compression filter (e.g. "lzf", "gzip") or None.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        keys: list[str],
+        dtypes: dict = None,
+        block_size: int = 1000,
+        flush_interval: float = 10.0,
+        resume: bool = False,
+        compression: str = None,
+    ) -> None:
+        self.filename = filename
+        self.keys = list(keys)
+        self.dtypes = {key: np.dtype((dtypes or {}).get(key, np.float64)) for key in self.keys}
+        self.block_size = block_size
+        self.flush_interval = flush_interval
+
+        self.buffer = np.zeros((block_size, len(self.keys)))
+        self.nbuffered = 0
+        self.last_flush = time.perf_counter()
+
+        if resume and os.path.exists(filename):
+            try:
+                self.file = h5py.File(filename, "a", libver="latest")
+            except OSError:
+                self.file = self._recover(filename, compression)
+        else:
+            self.file = self._create(filename, compression)
+        self.datasets = [self.file[key] for key in self.keys]
+        self.file.swmr_mode = True
+
+    def _create(self, filename: str, compression: str, rows: pd.DataFrame = None) -> h5py.File:
+        file = h5py.File(filename, "w", libver="latest")
+        for key in self.keys:
+            file.create_dataset(
+                key,
+                shape=(0 if rows is None else len(rows),),
+                maxshape=(None,),
+                dtype=self.dtypes[key],
+                chunks=(self.block_size,),
+                compression=compression,
+            )
+            if rows is not None:
+                file[key][:] = rows[key].values
+        file.attrs["columns"] = self.keys
+        return file
+
+    def _recover(self, filename: str, compression: str) -> h5py.File:
+        # A file left by a crashed writer still has its SWMR write flags set and
+        # cannot be opened for writing, but it can be read. Its rows are copied
+        # into a new file that replaces it.
+        filename_tmp = filename + ".tmp"
+        try:
+            self._create(filename_tmp, compression, rows=load_history(filename)).close()
+            os.replace(filename_tmp, filename)
+        finally:
+            if os.path.exists(filename_tmp):
+                os.remove(filename_tmp)
+        return h5py.File(filename, "a", libver="latest")
+
+    @property
+    def size(self) -> int:
+        """Number of rows appended (written or buffered)."""
+        return self.datasets[0].shape[0] + self.nbuffered
+
+    def append(self, row: list[float]) -> None:
+        self.buffer[self.nbuffered] = row
+        self.nbuffered += 1
+        if self.nbuffered == self.block_size:
+            self.flush()
+        elif self.flush_interval is not None and (time.perf_counter() - self.last_flush) >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write buffered rows and make them visible to readers."""
+        if self.nbuffered > 0:
+            start = self.datasets[0].shape[0]
+            stop = start + self.nbuffered
+            for i, dataset in enumerate(self.datasets):
+                dataset.resize((stop,))
+                dataset[start:stop] = self.buffer[: self.nbuffered, i]
+            self.nbuffered = 0
+        for dataset in self.datasets:
+            dataset.flush()
+        self.last_flush = time.perf_counter()
+
+    def truncate(self, size: int) -> None:
+        """Drop rows after the first `size` (e.g. rows recorded after a checkpoint)."""
+        self.flush()
+        if size < self.datasets[0].shape[0]:
+            for dataset in self.datasets:
+                dataset.resize((size,))
+            self.flush()
+
+    def close(self) -> None:
+        if self.file.id.valid:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self) -> "HistoryWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def find_history(prefix: str) -> str:
+    """Return `<prefix>.h5` or `<prefix>.csv`, whichever was written last.
+
+    Runs write one or the other depending on `history.format`; a file left by an
+    earlier run with the other format in the same directory is older. Returns the
+    .csv name if neither exists.
+    """
+    filenames = [f"{prefix}.{ext}" for ext in ["csv", "h5"] if os.path.exists(f"{prefix}.{ext}")]
+    if not filenames:
+        return f"{prefix}.csv"
+    return max(filenames, key=os.path.getmtime)
+
+
+def load_history(filename: str) -> pd.DataFrame:
+    """Load a history file written by `HistoryWriter` (.h5) or pandas (.csv).
+
+    HDF5 files can be read while they are being written; rows not yet flushed
+    are not included.
+    """
+    if not filename.endswith((".h5", ".hdf5")):
+        return pd.read_csv(filename, index_col=0)
+
+    with h5py.File(filename, "r", libver="latest", swmr=True) as file:
+        keys = [str(key) for key in file.attrs["columns"]]
+        # Columns are resized one after another; use the length all of them have.
+        size = min(file[key].shape[0] for key in keys)
+        return pd.DataFrame({key: file[key][:size] for key in keys})
@@ -0,0 +1,97 @@
+import resource
+import sys
+
+import numpy as np
+
+
+def get_memory_usage() -> dict[str, float]:
+    """Return current and peak resident set size of this process [bytes].
+
+    Reads VmRSS/VmHWM from /proc/self/status on Linux; elsewhere only the
+    peak is available (from getrusage) and is also returned as "rss".
+    """
+    usage = {}
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    usage["rss"] = float(line.split()[1]) * 1024.0
+                elif line.startswith("VmHWM:"):
+                    usage["peak"] = float(line.split()[1]) * 1024.0
+    except OSError:
+        pass
+
+    if "peak" not in usage:
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+        peak = float(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+        usage["peak"] = peak if sys.platform == "darwin" else peak * 1024.0
+    usage.setdefault("rss", usage["peak"])
+    return usage
+
+
+class MemoryTracker:
+    """Samples the resident set size of each MPI rank at labeled points.
+
+    Call `sample(label)` at phase boundaries, or add the tracker to an
+    `AccActionsContainer` to sample during tracking (label "tracking", at every
+    `every`-th call). Repeated samples with the same label keep the maximum.
+
+    Args:
+        every: sample at every `every`-th action call.
+    """
+
+    def __init__(self, every: int = 1) -> None:
+        from orbit.core import orbit_mpi
+
+        self.every = every
+        self.ncalls = 0
+        self.rss = {}
+        self.orbit_mpi = orbit_mpi
+        self.comm = orbit_mpi.mpi_comm.MPI_COMM_WORLD
+
+    def sample(self, label: str) -> float:
+        rss = get_memory_usage()["rss"]
+        self.rss[label] = max(rss, self.rss.get(label, 0.0))
+        return rss
+
+    def __call__(self, params_dict: dict) -> None:
+        self.ncalls += 1
+        if (self.ncalls - 1) % self.every == 0:
+            self.sample("tracking")
+
+    def reduce(self, local_size: int, bunch_label: str = "bunch") -> dict:
+        """Gather per-rank memory usage on all ranks (call on all ranks).
+
+        Returns a dict with per-rank lists:
+            "rss": {label: RSS [bytes]} for each label, in sampling order.
+            "peak": peak RSS of the process [bytes].
+            "local_size": number of macroparticles.
+            "bytes_per_particle": RSS increase at `bunch_label` (relative to the
+                previous label) per macroparticle.
+        All ranks must sample the same labels.
+        """
+        orbit_mpi = self.orbit_mpi
+        rank = orbit_mpi.MPI_Comm_rank(self.comm)
+        nprocs = orbit_mpi.MPI_Comm_size(self.comm)
+
+        labels = list(self.rss)
+        local = [self.rss[label] for label in labels]
+        local += [get_memory_usage()["peak"], float(local_size)]
+
+        # Each rank fills its own row; the sum gathers all rows on every rank.
+        values = np.zeros((nprocs, len(local)))
+        values[rank] = local
+        values = orbit_mpi.MPI_Allreduce(
+            tuple(values.ravel()), orbit_mpi.mpi_datatype.MPI_DOUBLE, orbit_mpi.mpi_op.MPI_SUM, self.comm
+        )
+        values = np.reshape(values, (nprocs, len(local)))
+
+        memory = {}
+        memory["rss"] = {label: values[:, i].tolist() for i, label in enumerate(labels)}
+        memory["peak"] = values[:, -2].tolist()
+        memory["local_size"] = values[:, -1].astype(int).tolist()
+        if bunch_label in labels:
+            i = labels.index(bunch_label)
+            delta = values[:, i] - (values[:, i - 1] if i > 0 else 0.0)
+            memory["bytes_per_particle"] = (delta / np.maximum(values[:, -1], 1.0)).tolist()
+        return memory
@@ -0,0 +1,153 @@
+"""Distributed beam moments.
+
+`MomentEngine` computes the means and full 6x6 covariance matrix of a bunch in one
+pass over the rank-local particles followed by a single MPI reduction, and derives
+rms sizes, emittances and Twiss parameters from them in one batched step.
+
+The rank-local coordinates are copied into a reused NumPy buffer (see
+`get_bunch_coords`; the copy dominates the cost of a record) and the power sums
+are accumulated in blocks with matrix products. With `order=4`, the in-plane
+3rd/4th-order sums are accumulated and reduced together with the 2nd-order ones;
+central moments and kurtosis are then recovered from the raw sums. Callers that
+already copied the coordinates for the same record can pass them to `compute`.
+"""
+from math import comb
+
+import numpy as np
+
+from orbit.core import orbit_mpi
+from orbit.core.bunch import Bunch
+
+from .bunch_io import get_bunch_coords
+
+
+# In-plane monomials q^i p^j with i + j <= 4.
+POWERS = [(i, j) for i in range(5) for j in range(5) if i + j <= 4]
+
+
+class MomentEngine:
+    """Computes bunch moments and derived beam parameters.
+
+    Args:
+        order: 2 for means/covariance only, 4 to also compute 4th-order moments.
+        chunk_size: number of particles processed at a time in the NumPy path.
+
+    The arrays in the returned dict are owned by the engine and overwritten by
+    the next call to `compute`; copy them if they must be kept.
+    """
+
+    def __init__(self, order: int = 2, chunk_size: int = 100_000) -> None:
+        if order not in [2, 4]:
+            raise ValueError(f"Invalid order {order}; must be 2 or 4")
+        self.order = order
+        self.chunk_size = chunk_size
+        self.comm = orbit_mpi.mpi_comm.MPI_COMM_WORLD
+
+        self.coords = np.zeros((0, 6))
+        self.sums = np.zeros(1 + 6 + 36 + (3 * len(POWERS) if order == 4 else 0))
+
+        self.results = {}
+        self.results["mean"] = np.zeros(6)
+        self.results["cov"] = np.zeros((6, 6))
+        self.results["rms"] = np.zeros(6)
+        self.results["emittance"] = np.zeros(3)
+        self.results["alpha"] = np.zeros(3)
+        self.results["beta"] = np.zeros(3)
+        self.results["size"] = 0
+        if order == 4:
+            self.results["moments"] = np.zeros((3, 5, 5))
+            self.results["kurtosis"] = np.zeros(6)
+
+    def compute(self, bunch: Bunch, coords: np.ndarray = None) -> dict:
+        """Compute moments of the bunch (must be called on all ranks).
+
+        Args:
+            bunch: the bunch.
+            coords: rank-local (n, 6) coordinates of the bunch, if already copied
+                with `get_local_coords`.
+        """
+        if coords is None:
+            coords = self.get_local_coords(bunch)
+        self._compute_sums(coords)
+        self._compute_moments()
+        self._compute_derived()
+        return self.results
+
+    def get_local_coords(self, bunch: Bunch) -> np.ndarray:
+        """Copy the rank-local coordinates into the reused buffer and return them."""
+        size = bunch.getSize()
+        if size > self.coords.shape[0]:
+            self.coords = np.zeros((size, 6))
+        return get_bunch_coords(bunch, out=self.coords[:size])
+
+    def _compute_sums(self, coords: np.ndarray) -> None:
+        sums = self.sums
+        sums[:] = 0.0
+        sums[0] = coords.shape[0]
+        for start in range(0, coords.shape[0], self.chunk_size):
+            block = coords[start : start + self.chunk_size]
+            sums[1:7] += np.sum(block, axis=0)
+            sums[7:43] += np.dot(block.T, block).ravel()
+            if self.order == 2:
+                continue
+            offset = 43
+            for plane in range(3):
+                q = block[:, 2 * plane]
+                p = block[:, 2 * plane + 1]
+                q_pow = [np.ones_like(q), q, q * q]
+                q_pow += [q_pow[2] * q, q_pow[2] * q_pow[2]]
+                p_pow = [np.ones_like(p), p, p * p]
+                p_pow += [p_pow[2] * p, p_pow[2] * p_pow[2]]
+                for k, (i, j) in enumerate(POWERS):
+                    sums[offset + k] += np.dot(q_pow[i], p_pow[j])
+                offset += len(POWERS)
+
+        sums[:] = orbit_mpi.MPI_Allreduce(
+            tuple(sums), orbit_mpi.mpi_datatype.MPI_DOUBLE, orbit_mpi.mpi_op.MPI_SUM, self.comm
+        )
+
+    def _compute_moments(self) -> None:
+        sums = self.sums
+        size = max(sums[0], 1.0)
+        mean = self.results["mean"]
+        cov = self.results["cov"]
+        mean[:] = sums[1:7] / size
+        cov[:] = sums[7:43].reshape(6, 6) / size - np.outer(mean, mean)
+        self.results["size"] = int(sums[0])
+        if self.order == 2:
+            return
+
+        # Central in-plane moments from raw moments by binomial expansion.
+        moments = self.results["moments"]
+        moments[:] = 0.0
+        for plane in range(3):
+            raw = np.zeros((5, 5))
+            offset = 43 + plane * len(POWERS)
+            for k, (i, j) in enumerate(POWERS):
+                raw[i, j] = sums[offset + k] / size
+            mq = mean[2 * plane]
+            mp = mean[2 * plane + 1]
+            for a, b in POWERS:
+                value = 0.0
+                for i in range(a + 1):
+                    for j in range(b + 1):
+                        value += comb(a, i) * comb(b, j) * raw[i, j] * (-mq) ** (a - i) * (-mp) ** (b - j)
+                moments[plane, a, b] = value
+
+        kurtosis = self.results["kurtosis"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            kurtosis[0::2] = moments[:, 4, 0] / moments[:, 2, 0] ** 2
+            kurtosis[1::2] = moments[:, 0, 4] / moments[:, 0, 2] ** 2
+
+    def _compute_derived(self) -> None:
+        cov = self.results["cov"]
+        diag = np.diagonal(cov)
+        uu = diag[0::2]
+        pp = diag[1::2]
+        up = np.array([cov[0, 1], cov[2, 3], cov[4, 5]])
+        emittance = self.results["emittance"]
+        emittance[:] = np.sqrt(np.clip(uu * pp - up * up, 0.0, None))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.results["beta"][:] = uu / emittance
+            self.results["alpha"][:] = -up / emittance
+        self.results["rms"][:] = np.sqrt(np.clip(diag, 0.0, None))
@@ -0,0 +1,158 @@
+"""Per-node tracking profiler.
+
+`TrackingProfiler` hooks the ENTRANCE and EXIT actions of an `AccActionsContainer`
+and keeps a stack of the nodes currently being tracked. At every event, the wall
+time since the previous event is charged to the node at the top of the stack, so
+each node accumulates its exclusive time (child nodes such as space charge kicks
+are charged separately from the drift or quad that contains them). Time spent in
+other actions can be excluded by wrapping them with `wrap_action`.
+"""
+import time
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from orbit.core import orbit_mpi
+from orbit.lattice import AccActionsContainer
+
+
+class TrackingProfiler:
+    """Accumulates exclusive tracking time per node, per node class and per s bin.
+
+    Add to the action container before any other action:
+
+        profiler = TrackingProfiler(length=lattice.getLength(), ds=0.05)
+        profiler.add_to(action_container)
+        action_container.addAction(profiler.wrap_action(monitor), AccActionsContainer.EXIT)
+
+    Args:
+        length: lattice length [m]; the s profile covers [0, length].
+        ds: s bin width [m].
+    """
+
+    def __init__(self, length: float, ds: float = 0.01) -> None:
+        self.ds = ds
+        self.nbins = max(1, int(np.ceil(length / ds)))
+        self.comm = orbit_mpi.mpi_comm.MPI_COMM_WORLD
+
+        self.nodes = []
+        self.index = {}
+        self.times = np.zeros(0)
+        self.calls = np.zeros(0)
+        self.positions = np.zeros(0)
+        self.s_times = np.zeros(self.nbins)
+        self.action_time = 0.0
+
+        self.stack = []
+        self.last_time = None
+        self.last_distance = 0.0
+
+    def add_to(self, action_container: AccActionsContainer) -> None:
+        action_container.addAction(self.entrance, AccActionsContainer.ENTRANCE)
+        action_container.addAction(self.exit, AccActionsContainer.EXIT)
+
+    def _get_index(self, node, distance: float) -> int:
+        key = id(node)
+        if key not in self.index:
+            self.index[key] = len(self.nodes)
+            self.nodes.append(node)
+            self.times = np.append(self.times, 0.0)
+            self.calls = np.append(self.calls, 0.0)
+            self.positions = np.append(self.positions, distance)
+        return self.index[key]
+
+    def _charge(self, now: float) -> None:
+        if self.stack and self.last_time is not None:
+            seconds = now - self.last_time
+            self.times[self.stack[-1]] += seconds
+            ibin = min(int(self.last_distance / self.ds), self.nbins - 1)
+            self.s_times[max(ibin, 0)] += seconds
+        self.last_time = now
+
+    def entrance(self, params_dict: dict) -> None:
+        now = time.perf_counter()
+        self._charge(now)
+        distance = params_dict["path_length"]
+        index = self._get_index(params_dict["node"], distance)
+        self.calls[index] += 1
+        self.stack.append(index)
+        self.last_distance = distance
+
+    def exit(self, params_dict: dict) -> None:
+        now = time.perf_counter()
+        self._charge(now)
+        index = self.index.get(id(params_dict["node"]))
+        while self.stack:
+            if self.stack.pop() == index:
+                break
+        self.last_distance = params_dict["path_length"]
+        if not self.stack:
+            self.last_time = None
+
+    def wrap_action(self, action: Callable) -> Callable:
+        """Return `action` wrapped so that its run time is excluded from node times."""
+
+        def wrapper(params_dict: dict) -> None:
+            self._charge(time.perf_counter())
+            start_time = time.perf_counter()
+            action(params_dict)
+            now = time.perf_counter()
+            self.action_time += now - start_time
+            if self.last_time is not None:
+                self.last_time = now
+
+        return wrapper
+
+    def _reduce(self, values: np.ndarray, op) -> np.ndarray:
+        if values.size == 0:
+            return values
+        values = orbit_mpi.MPI_Allreduce(tuple(values), orbit_mpi.mpi_datatype.MPI_DOUBLE, op, self.comm)
+        return np.atleast_1d(np.array(values, dtype=float))
+
+    def reduce(self) -> dict[str, pd.DataFrame]:
+        """Aggregate over MPI ranks (call on all ranks).
+
+        Returns a dict with three tables:
+            "nodes": per node, sorted by mean exclusive time.
+            "classes": per node class, sorted by mean exclusive time, plus an
+                "(actions)" row for the time spent in wrapped actions.
+            "s": mean time per s bin.
+        Times are means over ranks; "time_max" is the slowest rank.
+        """
+        nprocs = orbit_mpi.MPI_Comm_size(self.comm)
+        op_sum = orbit_mpi.mpi_op.MPI_SUM
+        op_max = orbit_mpi.mpi_op.MPI_MAX
+
+        time_mean = self._reduce(self.times, op_sum) / nprocs
+        time_max = self._reduce(self.times, op_max)
+        s_times = self._reduce(self.s_times, op_sum) / nprocs
+        action_time = self._reduce(np.array([self.action_time]), op_sum)[0] / nprocs
+        total = max(np.sum(time_mean), 1.00e-12)
+
+        nodes = pd.DataFrame(
+            {
+                "name": [node.getName() for node in self.nodes],
+                "class": [type(node).__name__ for node in self.nodes],
+                "s": self.positions,
+                "calls": self.calls.astype(int),
+                "time": time_mean,
+                "time_max": time_max,
+                "time_per_call": time_mean / np.maximum(self.calls, 1),
+                "fraction": time_mean / total,
+            }
+        )
+
+        classes = nodes.groupby("class")[["calls", "time", "fraction"]].sum()
+        classes.loc["(actions)"] = [0, action_time, action_time / total]
+        classes["calls"] = classes["calls"].astype(int)
+        classes = classes.sort_values("time", ascending=False)
+
+        s = pd.DataFrame(
+            {
+                "s": (np.arange(self.nbins) + 0.5) * self.ds,
+                "time": s_times,
+            }
+        )
+        nodes = nodes.sort_values("time", ascending=False).reset_index(drop=True)
+        return {"nodes": nodes, "classes": classes, "s": s}
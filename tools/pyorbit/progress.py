@@ -0,0 +1,80 @@
+import queue
+import sys
+import threading
+import time
+from typing import Callable
+from typing import TextIO
+
+
+class ProgressLogger:
+    """Rate-limited progress logger with a background writer thread.
+
+    Messages are handed to a writer thread through a queue, so tracking never
+    waits on terminal or filesystem I/O, and the stream is flushed once per batch
+    of messages instead of once per line. Messages arriving less than `interval`
+    seconds after the previous one are dropped. A message may be given as a
+    callable returning a string, so that dropped messages are never formatted.
+
+    Args:
+        rank: MPI rank; only rank 0 writes.
+        interval: minimum time between messages [s]. Zero disables rate limiting.
+        quiet: discard all messages (e.g. for timed runs).
+        stream: output stream (default: sys.stdout).
+    """
+
+    def __init__(
+        self,
+        rank: int = 0,
+        interval: float = 0.0,
+        quiet: bool = False,
+        stream: TextIO = None,
+    ) -> None:
+        self.active = (rank == 0) and not quiet
+        self.interval = interval
+        self.stream = stream or sys.stdout
+        self.last_time = -float("inf")
+
+        self.queue = queue.SimpleQueue()
+        self.thread = None
+        if self.active:
+            self.thread = threading.Thread(target=self._write_loop, daemon=True)
+            self.thread.start()
+
+    def log(self, message: str | Callable[[], str], force: bool = False) -> None:
+        """Queue a message for writing. `force` bypasses the rate limit."""
+        if not self.active:
+            return
+        now = time.perf_counter()
+        if not force and (now - self.last_time) < self.interval:
+            return
+        self.last_time = now
+        if callable(message):
+            message = message()
+        self.queue.put(message)
+
+    def close(self) -> None:
+        """Write all pending messages and stop the writer thread."""
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        self.active = False
+
+    def _write_loop(self) -> None:
+        while True:
+            message = self.queue.get()
+            while message is not None:
+                self.stream.write(message + "\n")
+                try:
+                    message = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            self.stream.flush()
+            if message is None:
+                return
+
+    def __enter__(self) -> "ProgressLogger":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
@@ -0,0 +1,75 @@
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+import numpy as np
+
+from orbit.core import orbit_mpi
+
+
+class PhaseTimer:
+    """Accumulates wall time per named phase and reduces it across MPI ranks.
+
+    Phases are timed with `start`/`stop`, the `phase` context manager, or by
+    wrapping a callable with `wrap` (e.g. a node's `track` method or a lattice
+    action). All ranks must time the same set of phases.
+    """
+
+    def __init__(self) -> None:
+        self.times = {}
+        self.start_times = {}
+        self.comm = orbit_mpi.mpi_comm.MPI_COMM_WORLD
+
+    def add(self, name: str, seconds: float) -> None:
+        self.times[name] = self.times.get(name, 0.0) + seconds
+
+    def start(self, name: str) -> None:
+        self.start_times[name] = time.perf_counter()
+
+    def stop(self, name: str) -> float:
+        seconds = time.perf_counter() - self.start_times.pop(name)
+        self.add(name, seconds)
+        return seconds
+
+    @contextmanager
+    def phase(self, name: str):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start_time)
+
+    def wrap(self, name: str, func: Callable) -> Callable:
+        """Return `func` wrapped so that its run time is added to phase `name`."""
+        self.times.setdefault(name, 0.0)
+
+        def wrapper(*args, **kwargs):
+            start_time = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(name, time.perf_counter() - start_time)
+
+        return wrapper
+
+    def reduce(self) -> dict[str, dict[str, float]]:
+        """Return {phase: {"min", "mean", "max"}} over all ranks (call on all ranks)."""
+        names = list(self.times)
+        values = tuple(self.times[name] for name in names)
+        if not values:
+            return {}
+        datatype = orbit_mpi.mpi_datatype.MPI_DOUBLE
+        nprocs = orbit_mpi.MPI_Comm_size(self.comm)
+        t_min = orbit_mpi.MPI_Allreduce(values, datatype, orbit_mpi.mpi_op.MPI_MIN, self.comm)
+        t_max = orbit_mpi.MPI_Allreduce(values, datatype, orbit_mpi.mpi_op.MPI_MAX, self.comm)
+        t_sum = orbit_mpi.MPI_Allreduce(values, datatype, orbit_mpi.mpi_op.MPI_SUM, self.comm)
+        t_min, t_max, t_sum = (np.atleast_1d(t) for t in (t_min, t_max, t_sum))
+
+        timings = {}
+        for i, name in enumerate(names):
+            timings[name] = {
+                "min": float(t_min[i]),
+                "mean": float(t_sum[i]) / nprocs,
+                "max": float(t_max[i]),
+            }
+        return timings
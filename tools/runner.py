@@ -0,0 +1,86 @@
+"""Launch benchmark scripts as subprocesses.
+
+Each benchmark script loads `../config.yaml` and merges OmegaConf dot-list
+overrides from the command line, so a run is fully described by its directory,
+script name, overrides and number of MPI processes.
+"""
+import os
+import shlex
+import subprocess
+import sys
+import time
+
+
+DEFAULT_LAUNCHER = "mpirun -n {nprocs}"
+
+
+def format_overrides(overrides: dict) -> list[str]:
+    """Format a dict of config overrides as OmegaConf dot-list arguments."""
+    args = []
+    for key, value in overrides.items():
+        if value is None:
+            value = "null"
+        elif isinstance(value, bool):
+            value = str(value).lower()
+        elif isinstance(value, (list, tuple)):
+            value = "[" + ",".join(str(item) for item in value) + "]"
+        args.append(f"{key}={value}")
+    return args
+
+
+def parse_overrides(args: list[str], exclude: list[str] = None) -> dict:
+    """Return OmegaConf dot-list arguments as a dict of overrides.
+
+    Keys equal to or under one of the `exclude` prefixes (e.g. "scaling") are
+    skipped, so a driver script can forward its own command line to the runs it
+    launches without its private settings.
+    """
+    overrides = {}
+    for arg in args:
+        key, value = arg.split("=", 1)
+        if any(key == prefix or key.startswith(prefix + ".") for prefix in (exclude or [])):
+            continue
+        overrides[key] = value
+    return overrides
+
+
+def get_command(script: str, overrides: dict = None, nprocs: int = 1, launcher: str = None) -> list[str]:
+    """Return the command line that runs `script` on `nprocs` MPI processes.
+
+    `launcher` is a template such as "mpirun -n {nprocs}" or "srun -n {nprocs}".
+    If it is None, serial runs are started with plain python.
+    """
+    command = [sys.executable, script] + format_overrides(overrides or {})
+    if launcher is None and nprocs > 1:
+        launcher = DEFAULT_LAUNCHER
+    if launcher is not None:
+        command = shlex.split(launcher.format(nprocs=nprocs)) + command
+    return command
+
+
+def run_script(
+    directory: str,
+    script: str = "run.py",
+    overrides: dict = None,
+    nprocs: int = 1,
+    launcher: str = None,
+    env: dict = None,
+    log_filename: str = None,
+) -> float:
+    """Run a benchmark script in `directory` and return its wall time [s].
+
+    Output is written to `log_filename` if given (otherwise inherited). Raises
+    `subprocess.CalledProcessError` if the run fails.
+    """
+    command = get_command(script, overrides, nprocs, launcher)
+    run_env = os.environ.copy()
+    run_env.update(env or {})
+
+    start_time = time.perf_counter()
+    if log_filename is None:
+        subprocess.run(command, cwd=directory, env=run_env, check=True)
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(log_filename)), exist_ok=True)
+        with open(log_filename, "w") as file:
+            subprocess.run(command, cwd=directory, env=run_env, check=True, stdout=file, stderr=subprocess.STDOUT)
+    return time.perf_counter() - start_time
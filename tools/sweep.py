@@ -0,0 +1,186 @@
+"""Parameter sweeps over benchmark configs.
+
+A sweep is described by a YAML file:
+
+    directory: fodo/pyorbit   # relative to the repository root
+    script: run.py
+    nprocs: 1                 # MPI processes per run
+    cores: 8                  # total core budget
+    launcher: null            # e.g. "srun -n {nprocs} --exclusive" inside an allocation
+    output_dir: outputs/sweeps/quad_gradient
+    overrides:                # applied to every run
+      log.quiet: true
+    grid:                     # Cartesian product
+      lattice.quad_gradient: [0.55, 0.60, 0.65]
+      lattice.ds: [0.01, 0.02]
+    list:                     # explicit override sets (added after the grid)
+      - {spacecharge.grid.x: 128, spacecharge.grid.y: 128}
+
+Each run writes to `<output_dir>/run_<index>` through the script's `output_dir`
+override. Runs are started as soon as enough of the core budget is free, and
+finished runs are skipped when a sweep is restarted. At the end, the parameters,
+status, wall time and `info.pkl` scalars of all runs are collected in
+`summary.csv`, and all `history.csv` (or streamed `history.h5`) files in
+`history.csv` indexed by run.
+
+Run from the repository root with `python -m tools.sweep <sweep.yaml> [overrides]`.
+ImpactX scripts run in their `output_dir`, so each run keeps its own `diags/`.
+"""
+import itertools
+import os
+import pickle
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from omegaconf import OmegaConf
+
+from .pyorbit.history_io import find_history
+from .pyorbit.history_io import load_history
+from .runner import run_script
+
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def expand_grid(grid: dict) -> list[dict]:
+    """Return the Cartesian product of {key: values} as a list of override dicts."""
+    if not grid:
+        return []
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*[grid[key] for key in keys])]
+
+
+def expand_sweep(cfg) -> list[dict]:
+    """Return the list of override dicts described by a sweep config."""
+    grid = OmegaConf.to_container(cfg.get("grid") or {})
+    runs = expand_grid(grid)
+    runs += [dict(item) for item in OmegaConf.to_container(cfg.get("list") or [])]
+    return runs or [{}]
+
+
+class CoreBudget:
+    """Blocks until the requested number of cores is free."""
+
+    def __init__(self, cores: int) -> None:
+        self.free = cores
+        self.condition = threading.Condition()
+
+    def acquire(self, cores: int) -> None:
+        with self.condition:
+            self.condition.wait_for(lambda: self.free >= cores)
+            self.free -= cores
+
+    def release(self, cores: int) -> None:
+        with self.condition:
+            self.free += cores
+            self.condition.notify_all()
+
+
+def flatten_info(info: dict, prefix: str = "") -> dict:
+    """Flatten nested scalar values of an info dict into {"a.b": value}."""
+    flat = {}
+    for key, value in info.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten_info(value, prefix=f"{name}."))
+        elif isinstance(value, (int, float, str, bool)):
+            flat[name] = value
+    return flat
+
+
+def run_sweep(cfg) -> pd.DataFrame:
+    """Run all runs of a sweep config and return the summary table."""
+    directory = os.path.join(ROOT, cfg.directory)
+    script = cfg.get("script", "run.py")
+    nprocs = cfg.get("nprocs", 1)
+    cores = max(cfg.get("cores") or os.cpu_count(), nprocs)
+    output_dir = os.path.abspath(cfg.output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+
+    runs = expand_sweep(cfg)
+    base_overrides = OmegaConf.to_container(cfg.get("overrides") or {})
+    pd.DataFrame(runs).rename_axis("run").to_csv(os.path.join(output_dir, "runs.csv"))
+
+    budget = CoreBudget(cores)
+
+    def run(index: int) -> dict:
+        run_dir = os.path.join(output_dir, f"run_{index:04d}")
+        result = {"run": index, **runs[index]}
+        done_filename = os.path.join(run_dir, "done")
+        if os.path.exists(done_filename):
+            with open(done_filename) as file:
+                result["wall_time"] = float(file.read())
+            result["status"] = "done"
+            return result
+
+        overrides = {**base_overrides, **runs[index], "output_dir": run_dir}
+        budget.acquire(nprocs)
+        try:
+            wall_time = run_script(
+                directory,
+                script,
+                overrides=overrides,
+                nprocs=nprocs,
+                launcher=cfg.get("launcher"),
+                log_filename=os.path.join(run_dir, "log.txt"),
+            )
+            result["wall_time"] = wall_time
+            result["status"] = "done"
+            with open(done_filename, "w") as file:
+                file.write(str(wall_time))
+        except subprocess.CalledProcessError as error:
+            result["status"] = f"failed ({error.returncode})"
+        finally:
+            budget.release(nprocs)
+
+        print("run {:04d} {}: {}".format(index, result["status"], runs[index]))
+        sys.stdout.flush()
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, cores // nprocs)) as executor:
+        results = list(executor.map(run, range(len(runs))))
+
+    return collect_results(output_dir, results)
+
+
+def collect_results(output_dir: str, results: list[dict]) -> pd.DataFrame:
+    """Combine run parameters, info.pkl scalars and history files into tables."""
+    rows = []
+    histories = []
+    for result in results:
+        run_dir = os.path.join(output_dir, "run_{:04d}".format(result["run"]))
+        row = dict(result)
+        filename = os.path.join(run_dir, "info.pkl")
+        if os.path.exists(filename):
+            with open(filename, "rb") as file:
+                row.update(flatten_info(pickle.load(file)))
+        rows.append(row)
+
+        filename = find_history(os.path.join(run_dir, "history"))
+        if os.path.exists(filename):
+            history = load_history(filename)
+            history.insert(0, "run", result["run"])
+            histories.append(history)
+
+    summary = pd.DataFrame(rows).set_index("run")
+    summary.to_csv(os.path.join(output_dir, "summary.csv"))
+    if histories:
+        history = pd.concat(histories).rename_axis("step").set_index("run", append=True)
+        history = history.reorder_levels(["run", "step"])
+        history.to_csv(os.path.join(output_dir, "history.csv"))
+    return summary
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a parameter sweep over a benchmark config.")
+    parser.add_argument("filename", help="sweep YAML file")
+    args, cli_overrides = parser.parse_known_args()
+
+    cfg = OmegaConf.merge(OmegaConf.load(args.filename), OmegaConf.from_cli(cli_overrides))
+    summary = run_sweep(cfg)
+    print(summary.to_string())